@@ -0,0 +1,457 @@
+"""
+Headless HTTP API for the chat graphs: JSON endpoints plus server-sent events.
+
+The Streamlit frontends rerun their script on every interaction and hold a
+thread per session. This ASGI app (Starlette, served by uvicorn) drives one
+compiled graph directly, so API workers can be scaled on their own and a UI
+only has to be a thin client:
+
+    POST /threads                          -> {"thread_id": ...}
+    GET  /threads                          -> {"threads": [...]}
+    GET  /threads/{thread_id}/messages     -> {"messages": [...], "interrupts": [...]}
+    POST /threads/{thread_id}/messages     {"message": str, "user_id"?: str, "state"?: {...}} -> SSE
+    POST /threads/{thread_id}/resume       {"resume": any} -> SSE
+    POST /threads/{thread_id}/documents    multipart "file" (PDF) -> ingest summary
+    GET  /health
+
+`state` sets extra graph input for the turn; only the keys in API_INPUT_KEYS
+are accepted (by default the voice app's settings), anything else is a 400.
+
+A turn streams as SSE events: `token` ({"content"}, coalesced like the
+frontends), `tool` ({"name", "content"}), `interrupt` ({"value"}, the graph
+is paused, e.g. the voice app's human review with HUMAN_REVIEW_MODE=interrupt;
+answer with /resume), then `done` or `error`.
+
+Graphs whose backend runs its own event loops (the MCP backend) are streamed
+with `astream` on the conversation's loop; the others run `stream` in a
+worker thread. Thread listing and PDF upload use the backend's
+`retrieve_all_threads` / `ingest_pdf` when it has them.
+
+Limits: at most API_MAX_STREAMS turns stream at once (more get 429 with
+Retry-After), uvicorn answers 503 above API_MAX_CONNECTIONS, and on shutdown
+running streams get API_SHUTDOWN_SECONDS to finish.
+
+Usage:
+    python api_server.py
+    API_GRAPH=langgraph_mcp_backend:chatbot python api_server.py
+    API_GRAPH=app:app API_GRAPH_PATH=../voice-chatbot-hitl API_STREAM_NODES=chat \\
+        HUMAN_REVIEW_MODE=interrupt python api_server.py
+
+Environment Variables:
+    API_GRAPH: "module:attribute" of the compiled graph (default langgraph_tool_backend:chatbot)
+    API_GRAPH_PATH: directory to import API_GRAPH from, searched first (default none)
+    API_STREAM_NODES: comma-separated nodes whose tokens are streamed (default all)
+    API_INPUT_KEYS: comma-separated state keys a client may set with "state"
+        (default voice_enabled,selected_voice,user_preferences)
+    API_HOST: bind address (default 127.0.0.1)
+    API_PORT: port (default 8000)
+    API_MAX_STREAMS: turns streaming at once (default 32)
+    API_MAX_CONNECTIONS: open connections before 503 (default 256)
+    API_SHUTDOWN_SECONDS: grace period for running streams on shutdown (default 30)
+    API_MAX_UPLOAD_MB: PDF upload limit (default 20)
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import importlib
+import json
+import os
+import sys
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterable, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+_GRAPH_PATH = os.getenv("API_GRAPH_PATH", "")
+if _GRAPH_PATH:
+    # Before anything else is imported: the graph's project may reuse module names
+    sys.path.insert(0, os.path.abspath(_GRAPH_PATH))
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langgraph.types import Command
+from starlette.applications import Starlette
+from starlette.background import BackgroundTask
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from loop_executor import on_loop
+from stream_coalescing import acoalesce_messages, coalesce_messages
+
+_ITEM, _ERROR, _DONE = "item", "error", "done"
+# Items a sync graph's worker thread may run ahead of the client
+_BUFFERED = 64
+
+
+# -------------------
+# Graph host
+# -------------------
+class GraphHost:
+    """One compiled graph and the helpers its backend module offers."""
+
+    def __init__(self, spec: str, max_streams: int = 32, stream_nodes: Optional[List[str]] = None):
+        module_name, _, attribute = spec.partition(":")
+        self.module_name = module_name
+        self.attribute = attribute or "chatbot"
+        self.module: Any = None
+        self.graph: Any = None
+        self.stream_nodes = set(stream_nodes or [])
+        self.max_streams = max_streams
+        self.active_streams = 0
+        # Sync graphs stream in these threads, one per running turn
+        self.pool = ThreadPoolExecutor(max_workers=max_streams, thread_name_prefix="api-stream")
+
+    @classmethod
+    def from_env(cls) -> "GraphHost":
+        nodes = [node.strip() for node in os.getenv("API_STREAM_NODES", "").split(",") if node.strip()]
+        return cls(
+            os.getenv("API_GRAPH", "langgraph_tool_backend:chatbot"),
+            max_streams=int(os.getenv("API_MAX_STREAMS", "32")),
+            stream_nodes=nodes,
+        )
+
+    def load(self) -> None:
+        """Import the module and build the graph (blocking; run off the event loop)."""
+        self.module = importlib.import_module(self.module_name)
+        self.graph = getattr(self.module, self.attribute)
+
+    def claim_stream(self) -> Optional[Callable[[], None]]:
+        """Reserve a stream slot; returns its (idempotent) release, or None when all are taken."""
+        if self.active_streams >= self.max_streams:
+            return None
+        self.active_streams += 1
+        released = False
+
+        def release() -> None:
+            nonlocal released
+            if not released:
+                released = True
+                self.active_streams -= 1
+
+        return release
+
+    def backend_loop(self, thread_id: str) -> Optional[asyncio.AbstractEventLoop]:
+        """The loop the backend runs this conversation on, for backends with their own loops."""
+        get_executor = getattr(self.module, "get_executor", None)
+        return get_executor().loop_for(thread_id) if get_executor is not None else None
+
+    async def list_threads(self) -> List[str]:
+        retrieve = getattr(self.module, "retrieve_all_threads", None)
+        if retrieve is not None:
+            threads = await asyncio.to_thread(retrieve)
+        else:
+            threads = await asyncio.to_thread(
+                lambda: {c.config["configurable"]["thread_id"] for c in self.graph.checkpointer.list(None)}
+            )
+        return [str(thread) for thread in threads]
+
+    async def get_state(self, config: Dict[str, Any]) -> Any:
+        loop = self.backend_loop(config["configurable"]["thread_id"])
+        if loop is not None:
+            return await on_loop(loop, self.graph.aget_state(config))
+        return await asyncio.to_thread(self.graph.get_state, config)
+
+    async def stream(self, graph_input: Any, config: Dict[str, Any]) -> AsyncIterator[tuple]:
+        """`stream_mode="messages"` events of one turn, coalesced."""
+        thread_id = config["configurable"]["thread_id"]
+        loop = self.backend_loop(thread_id)
+        if loop is not None:
+            events = acoalesce_messages(
+                self.graph.astream(graph_input, config=config, stream_mode="messages"), thread_id=thread_id,
+            )
+            iterator = _iterate_on_loop(events, loop)
+        else:
+            events = coalesce_messages(
+                self.graph.stream(graph_input, config=config, stream_mode="messages"), thread_id=thread_id,
+            )
+            iterator = _iterate_in_thread(events, self.pool)
+        async for message, metadata in iterator:
+            if self.stream_nodes and metadata.get("langgraph_node") not in self.stream_nodes:
+                continue
+            yield message, metadata
+
+    def close(self) -> None:
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def _iterate_on_loop(aiterable: AsyncIterable[Any], loop: asyncio.AbstractEventLoop) -> AsyncIterator[Any]:
+    """Iterate an async iterable as a task on another event loop, at most _BUFFERED items ahead."""
+    server_loop = asyncio.get_running_loop()
+    items: asyncio.Queue = asyncio.Queue()
+    credits = asyncio.Semaphore(_BUFFERED)
+
+    def hand_over(kind: str, value: Any) -> None:
+        with contextlib.suppress(RuntimeError):  # the server loop is gone
+            server_loop.call_soon_threadsafe(items.put_nowait, (kind, value))
+
+    async def produce() -> None:
+        try:
+            async for item in aiterable:
+                hand_over(_ITEM, item)
+                await credits.acquire()
+        except asyncio.CancelledError:
+            raise
+        except BaseException as e:
+            hand_over(_ERROR, e)
+        finally:
+            try:
+                # Cancelling this task does not close the source; stop the graph run now, not at GC
+                aclose = getattr(aiterable, "aclose", None)
+                if aclose is not None:
+                    await aclose()
+            finally:
+                hand_over(_DONE, None)
+
+    future = asyncio.run_coroutine_threadsafe(produce(), loop)
+    try:
+        while True:
+            kind, value = await items.get()
+            if kind == _DONE:
+                return
+            if kind == _ERROR:
+                raise value
+            loop.call_soon_threadsafe(credits.release)
+            yield value
+    finally:
+        # The client left: cancel the turn on its own loop
+        future.cancel()
+
+
+async def _iterate_in_thread(iterator: Iterator[Any], pool: ThreadPoolExecutor) -> AsyncIterator[Any]:
+    """Iterate a blocking iterator in one worker thread, at most _BUFFERED items ahead."""
+    loop = asyncio.get_running_loop()
+    items: asyncio.Queue = asyncio.Queue()
+    credits = threading.Semaphore(_BUFFERED)
+    stopped = threading.Event()
+
+    def hand_over(kind: str, value: Any) -> None:
+        with contextlib.suppress(RuntimeError):  # the server loop is gone
+            loop.call_soon_threadsafe(items.put_nowait, (kind, value))
+
+    def produce() -> None:
+        try:
+            for item in iterator:
+                hand_over(_ITEM, item)
+                credits.acquire()
+                if stopped.is_set():
+                    break
+        except BaseException as e:
+            hand_over(_ERROR, e)
+        finally:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+            hand_over(_DONE, None)
+
+    pool.submit(produce)
+    try:
+        while True:
+            kind, value = await items.get()
+            if kind == _DONE:
+                return
+            if kind == _ERROR:
+                raise value
+            credits.release()
+            yield value
+    finally:
+        # The client left: the worker stops after its current item
+        stopped.set()
+        credits.release()
+
+
+# -------------------
+# Serialization
+# -------------------
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def _message_dict(message: Any) -> Dict[str, Any]:
+    if isinstance(message, dict):
+        return {"role": message.get("role"), "content": message.get("content")}
+    role = {"human": "user", "ai": "assistant"}.get(message.type, message.type)
+    data = {"role": role, "content": message.content}
+    if isinstance(message, ToolMessage):
+        data["name"] = message.name
+    return data
+
+
+def _interrupts(state: Any) -> List[Any]:
+    return [interrupt.value for interrupt in getattr(state, "interrupts", ()) or ()]
+
+
+def _config(thread_id: str, user_id: Optional[str] = None) -> Dict[str, Any]:
+    configurable = {"thread_id": thread_id}
+    if user_id:
+        configurable["user_id"] = user_id
+    return {
+        "configurable": configurable,
+        "metadata": {"thread_id": thread_id},
+        "run_name": "chat_turn",
+    }
+
+
+# -------------------
+# Endpoints
+# -------------------
+host = GraphHost.from_env()
+
+
+async def health(request: Request) -> Response:
+    return JSONResponse({
+        "status": "ok",
+        "graph": f"{host.module_name}:{host.attribute}",
+        "active_streams": host.active_streams,
+    })
+
+
+async def create_thread(request: Request) -> Response:
+    return JSONResponse({"thread_id": str(uuid.uuid4())}, status_code=201)
+
+
+async def list_threads(request: Request) -> Response:
+    return JSONResponse({"threads": await host.list_threads()})
+
+
+async def get_history(request: Request) -> Response:
+    state = await host.get_state(_config(request.path_params["thread_id"]))
+    messages = state.values.get("messages", []) if state.values else []
+    # Interrupt values and tool contents may hold anything; str() what JSON cannot
+    body = json.dumps({
+        "messages": [_message_dict(message) for message in messages],
+        "interrupts": _interrupts(state),
+    }, default=str)
+    return Response(body, media_type="application/json")
+
+
+async def _turn(thread_id: str, graph_input: Any, config: Dict[str, Any], release: Callable[[], None]) -> AsyncIterator[str]:
+    try:
+        async for message, _ in host.stream(graph_input, config):
+            if isinstance(message, ToolMessage):
+                yield _sse("tool", {"name": message.name, "content": message.content})
+            # Token chunks, or the whole answer of a call tagged nostream (router tiers)
+            elif isinstance(message, AIMessage) and message.content:
+                yield _sse("token", {"content": message.content})
+        interrupts = _interrupts(await host.get_state(config))
+        for value in interrupts:
+            yield _sse("interrupt", {"value": value})
+        yield _sse("done", {"thread_id": thread_id, "interrupted": bool(interrupts)})
+    except Exception as e:
+        print(f"⚠️ Turn failed for thread {thread_id}: {str(e)}")
+        yield _sse("error", {"message": str(e)})
+    finally:
+        release()
+
+
+def _stream_response(thread_id: str, graph_input: Any, config: Dict[str, Any]) -> Response:
+    release = host.claim_stream()
+    if release is None:
+        return JSONResponse({"error": "Too many streams in progress"}, status_code=429, headers={"Retry-After": "1"})
+    return StreamingResponse(
+        _turn(thread_id, graph_input, config, release),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Also runs when the client left before the stream started
+        background=BackgroundTask(release),
+    )
+
+
+async def _json_body(request: Request) -> Dict[str, Any]:
+    try:
+        body = await request.json()
+    except ValueError:
+        body = None
+    return body if isinstance(body, dict) else {}
+
+
+def _input_keys() -> frozenset:
+    keys = os.getenv("API_INPUT_KEYS", "voice_enabled,selected_voice,user_preferences")
+    return frozenset(key.strip() for key in keys.split(",") if key.strip())
+
+
+async def send_message(request: Request) -> Response:
+    thread_id = request.path_params["thread_id"]
+    body = await _json_body(request)
+    message = body.get("message")
+    if not isinstance(message, str) or not message.strip():
+        return JSONResponse({"error": '"message" must be a non-empty string'}, status_code=400)
+    state = body.get("state") or {}
+    if not isinstance(state, dict):
+        return JSONResponse({"error": '"state" must be an object'}, status_code=400)
+    # Client JSON only reaches graph state through the allow-list
+    rejected = sorted(set(state) - _input_keys())
+    if rejected:
+        return JSONResponse({"error": f'"state" keys not accepted: {", ".join(rejected)}'}, status_code=400)
+    graph_input = {**state, "messages": [HumanMessage(content=message)]}
+    return _stream_response(thread_id, graph_input, _config(thread_id, body.get("user_id")))
+
+
+async def resume(request: Request) -> Response:
+    thread_id = request.path_params["thread_id"]
+    body = await _json_body(request)
+    if "resume" not in body:
+        return JSONResponse({"error": '"resume" is required'}, status_code=400)
+    return _stream_response(thread_id, Command(resume=body["resume"]), _config(thread_id, body.get("user_id")))
+
+
+async def upload_document(request: Request) -> Response:
+    ingest_pdf = getattr(host.module, "ingest_pdf", None)
+    if ingest_pdf is None:
+        return JSONResponse({"error": f"{host.module_name} does not accept documents"}, status_code=404)
+    max_bytes = int(float(os.getenv("API_MAX_UPLOAD_MB", "20")) * 1024 * 1024)
+    if int(request.headers.get("content-length") or 0) > max_bytes:
+        return JSONResponse({"error": "File too large"}, status_code=413)
+
+    form = await request.form(max_files=1)
+    upload = form.get("file")
+    if upload is None or isinstance(upload, str):
+        return JSONResponse({"error": 'Expected a multipart "file" field'}, status_code=400)
+    data = await upload.read()
+    if len(data) > max_bytes:
+        return JSONResponse({"error": "File too large"}, status_code=413)
+    summary = await asyncio.to_thread(ingest_pdf, data, request.path_params["thread_id"], upload.filename)
+    return JSONResponse(summary, status_code=201)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: Starlette):
+    # Build the graph before the first request instead of during it
+    await asyncio.to_thread(host.load)
+    print(f"✅ Serving {host.module_name}:{host.attribute}")
+    yield
+    host.close()
+
+
+api = Starlette(
+    routes=[
+        Route("/health", health),
+        Route("/threads", create_thread, methods=["POST"]),
+        Route("/threads", list_threads, methods=["GET"]),
+        Route("/threads/{thread_id}/messages", get_history, methods=["GET"]),
+        Route("/threads/{thread_id}/messages", send_message, methods=["POST"]),
+        Route("/threads/{thread_id}/resume", resume, methods=["POST"]),
+        Route("/threads/{thread_id}/documents", upload_document, methods=["POST"]),
+    ],
+    lifespan=lifespan,
+)
+
+
+def main():
+    import uvicorn
+
+    uvicorn.run(
+        api,
+        host=os.getenv("API_HOST", "127.0.0.1"),
+        port=int(os.getenv("API_PORT", "8000")),
+        limit_concurrency=int(os.getenv("API_MAX_CONNECTIONS", "256")),
+        timeout_graceful_shutdown=float(os.getenv("API_SHUTDOWN_SECONDS", "30")),
+    )
+
+
+if __name__ == "__main__":
+    main()
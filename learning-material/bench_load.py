@@ -0,0 +1,548 @@
+"""
+Concurrent-session load test for the chat backends.
+
+Simulates N users, each holding one conversation and sending turns with
+think time in between, against one backend in this process. The chat model
+is a fake with realistic timing (time to first token, tokens per second,
+jitter) and network tools are replaced by stubs with a fixed latency, so the
+numbers show what the process itself sustains. Everything else (checkpointer,
+tool node, caches, LLM scheduler, hedging) is the real code path.
+
+Scenarios:
+    chat:  langgraph_database_backend, plain answers (`chatbot.stream`)
+    tools: langgraph_tool_backend, --tool-rounds rounds of calculator +
+           stock price calls before the answer (`chatbot.stream`)
+    rag:   langgraph_rag_backend, rag_tool over a stub retriever (`chatbot.stream`)
+    async: langgraph_mcp_backend without MCP servers, stock price calls
+           (`chatbot.astream` on the backend loops, one task per user)
+    voice: voice-chatbot-hitl `app.invoke`, review approved through
+           HUMAN_REVIEW_MODE=interrupt (runs in its own process: the voice
+           project reuses module names)
+
+Reported: turns/s and tokens/s, time to first token and turn latency
+(p50/p95/p99), waits for the SQLite saver's connection lock and RSS growth.
+
+Usage:
+    python bench_load.py --scenario chat --users 20 --turns 5
+    python bench_load.py --scenario tools --users 50 --ttft-ms 400 --tokens-per-second 40 --tool-ms 200
+    python bench_load.py --scenario voice --users 10 --json voice.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import sys
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+os.environ.setdefault("CHECKPOINT_SQLITE_PATH", "bench_checkpoints.db")
+os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+from langchain_core.messages.tool import tool_call_chunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.tools import StructuredTool
+
+VOICE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "voice-chatbot-hitl")
+
+SCENARIOS: Dict[str, Dict[str, Any]] = {
+    "chat": {"backend": "langgraph_database_backend", "tools": []},
+    "tools": {"backend": "langgraph_tool_backend", "tools": ["calculator", "get_stock_price"]},
+    "rag": {"backend": "langgraph_rag_backend", "tools": ["rag_tool"]},
+    "async": {"backend": "langgraph_mcp_backend", "tools": ["get_stock_price"]},
+    "voice": {"backend": "app", "tools": []},
+}
+
+_WORDS = (
+    "the answer depends on the data you have and on how the question is framed so "
+    "here is a short explanation with a few details and an example"
+).split()
+_SYMBOLS = ["AAPL", "MSFT", "NVDA", "TSLA", "AMZN"]
+
+
+def _percentile(ordered: List[float], pct: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+# -------------------
+# Fake chat model
+# -------------------
+class LoadTestChatModel(BaseChatModel):
+    """Streams a canned answer with LLM-like timing; calls `tools` for `tool_rounds` rounds first."""
+
+    ttft: float = 0.3
+    tokens_per_second: float = 50.0
+    answer_tokens: int = 120
+    jitter: float = 0.2
+    tools: List[str] = []
+    tool_rounds: int = 1
+
+    @property
+    def _llm_type(self) -> str:
+        return "load-test"
+
+    def bind_tools(self, tools, **kwargs):
+        # Answers come from `tools` above; a binding keeps the scheduler/hedging wrappers working
+        return self.bind(**kwargs)
+
+    def _rounds_done(self, messages) -> int:
+        rounds = 0
+        for message in reversed(messages):
+            if isinstance(message, HumanMessage):
+                break
+            if isinstance(message, AIMessage) and message.tool_calls:
+                rounds += 1
+        return rounds
+
+    def _tool_args(self, name: str, question: str) -> dict:
+        if name == "calculator":
+            return {"first_num": random.randint(1, 10_000), "second_num": random.randint(1, 100), "operation": "mul"}
+        if name == "get_stock_price":
+            return {"symbol": random.choice(_SYMBOLS)}
+        return {"query": question}
+
+    def _plan(self, messages) -> List[AIMessageChunk]:
+        if self.tools and self._rounds_done(messages) < self.tool_rounds:
+            question = next((m.content for m in reversed(messages) if isinstance(m, HumanMessage)), "")
+            return [AIMessageChunk(content="", tool_call_chunks=[
+                tool_call_chunk(
+                    name=name,
+                    args=json.dumps(self._tool_args(name, question)),
+                    id=f"call_{uuid.uuid4().hex[:12]}",
+                    index=index,
+                )
+                for index, name in enumerate(self.tools)
+            ])]
+        count = max(1, int(random.gauss(self.answer_tokens, self.answer_tokens * self.jitter)))
+        return [AIMessageChunk(content=random.choice(_WORDS) + " ") for _ in range(count)]
+
+    def _delay(self, index: int) -> float:
+        base = self.ttft if index == 0 else 1 / self.tokens_per_second
+        return max(0.0, random.gauss(base, base * self.jitter))
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        for index, chunk in enumerate(self._plan(messages)):
+            time.sleep(self._delay(index))
+            if run_manager and chunk.content:
+                run_manager.on_llm_new_token(chunk.content, chunk=ChatGenerationChunk(message=chunk))
+            yield ChatGenerationChunk(message=chunk)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        for index, chunk in enumerate(self._plan(messages)):
+            await asyncio.sleep(self._delay(index))
+            if run_manager and chunk.content:
+                await run_manager.on_llm_new_token(chunk.content, chunk=ChatGenerationChunk(message=chunk))
+            yield ChatGenerationChunk(message=chunk)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        chunks = [generation.message for generation in self._stream(messages, run_manager=run_manager)]
+        message = chunks[0] + chunks[1:] if len(chunks) > 1 else chunks[0]
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(
+            content=message.content, tool_calls=message.tool_calls, id=message.id,
+        ))])
+
+
+# -------------------
+# Stub tools and retriever
+# -------------------
+def _stub_tool(name: str, description: str, argument: str, latency: float, result: Any) -> StructuredTool:
+    # Named like the real tool, so timeouts and cache policies keyed by name still apply
+    def run(**kwargs: Any) -> Any:
+        time.sleep(latency)
+        return result
+
+    async def arun(**kwargs: Any) -> Any:
+        await asyncio.sleep(latency)
+        return result
+
+    return StructuredTool.from_function(
+        func=run,
+        coroutine=arun,
+        name=name,
+        description=description,
+        args_schema={"type": "object", "properties": {argument: {"type": "string"}}, "required": [argument]},
+    )
+
+
+class StubRetriever:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def invoke(self, query: str):
+        from langchain_core.documents import Document
+
+        time.sleep(self.latency)
+        return [Document(page_content=f"Passage about {query}", metadata={"page": 1})]
+
+
+# -------------------
+# SQLite lock waits
+# -------------------
+class TimedLock:
+    """Stands in for the saver's connection lock and records how long each acquire waited."""
+
+    def __init__(self, lock: Any):
+        self._lock = lock
+        self._guard = threading.Lock()
+        self.waits: List[float] = []
+
+    def _record(self, start: float) -> None:
+        with self._guard:
+            self.waits.append(time.perf_counter() - start)
+
+    # threading.Lock (SqliteSaver)
+    def acquire(self, *args: Any, **kwargs: Any) -> bool:
+        start = time.perf_counter()
+        acquired = self._lock.acquire(*args, **kwargs)
+        self._record(start)
+        return acquired
+
+    def release(self) -> None:
+        self._lock.release()
+
+    def __enter__(self) -> "TimedLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.release()
+
+    # asyncio.Lock (AsyncSqliteSaver)
+    async def __aenter__(self) -> "TimedLock":
+        start = time.perf_counter()
+        await self._lock.acquire()
+        self._record(start)
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        self._lock.release()
+
+
+def time_saver_lock(saver: Any) -> Optional[TimedLock]:
+    """Wrap the connection lock of the SQLite saver under the backend's wrappers (None for others)."""
+    while hasattr(saver, "saver"):
+        saver = saver.saver
+    if type(saver).__name__ not in ("SqliteSaver", "AsyncSqliteSaver"):
+        return None
+    saver.lock = TimedLock(saver.lock)
+    return saver.lock
+
+
+# -------------------
+# RSS
+# -------------------
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError):
+        # Peak rather than current outside Linux
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+class RssSampler:
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self.start = rss_mb()
+        self.peak = self.start
+        self._stopped = threading.Event()
+        threading.Thread(target=self._run, name="rss-sampler", daemon=True).start()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self.peak = max(self.peak, rss_mb())
+
+    def stop(self) -> Dict[str, float]:
+        self._stopped.set()
+        end = rss_mb()
+        self.peak = max(self.peak, end)
+        return {"rss_start_mb": self.start, "rss_peak_mb": self.peak, "rss_end_mb": end, "rss_growth_mb": end - self.start}
+
+
+# -------------------
+# Users
+# -------------------
+class Results:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.turns: List[Dict[str, Any]] = []
+
+    def add(self, turn: Dict[str, Any]) -> None:
+        with self._lock:
+            self.turns.append(turn)
+
+
+def _question(user: int, turn: int) -> str:
+    return f"User {user}, question {turn}: what should I know about {random.choice(_SYMBOLS)} today?"
+
+
+def _visible(message: Any) -> bool:
+    return isinstance(message, AIMessageChunk) and isinstance(message.content, str) and bool(message.content)
+
+
+def _think(seconds: float) -> float:
+    return random.uniform(0.5, 1.5) * seconds
+
+
+def run_sync_user(backend: Any, user: int, args, results: Results, prepare=None) -> None:
+    thread_id = f"load-{args.scenario}-{uuid.uuid4()}"
+    if prepare:
+        prepare(thread_id)
+    config = {"configurable": {"thread_id": thread_id}}
+    for turn in range(args.turns):
+        start = time.perf_counter()
+        first, tokens, error = None, 0, None
+        try:
+            for message, _ in backend.chatbot.stream(
+                {"messages": [HumanMessage(content=_question(user, turn))]}, config=config, stream_mode="messages",
+            ):
+                if _visible(message):
+                    first = first if first is not None else time.perf_counter() - start
+                    tokens += 1
+        except Exception as e:
+            error = str(e)
+        results.add({"latency": time.perf_counter() - start, "ttft": first, "tokens": tokens, "error": error})
+        time.sleep(_think(args.think_ms / 1000))
+
+
+async def run_async_user(backend: Any, user: int, thread_id: str, args, results: Results) -> None:
+    config = {"configurable": {"thread_id": thread_id}}
+    for turn in range(args.turns):
+        start = time.perf_counter()
+        first, tokens, error = None, 0, None
+        try:
+            async for message, _ in backend.chatbot.astream(
+                {"messages": [HumanMessage(content=_question(user, turn))]}, config=config, stream_mode="messages",
+            ):
+                if _visible(message):
+                    first = first if first is not None else time.perf_counter() - start
+                    tokens += 1
+        except Exception as e:
+            error = str(e)
+        results.add({"latency": time.perf_counter() - start, "ttft": first, "tokens": tokens, "error": error})
+        await asyncio.sleep(_think(args.think_ms / 1000))
+
+
+def run_voice_user(app: Any, user: int, args, results: Results) -> None:
+    from langgraph.types import Command
+
+    thread_id = f"load-voice-{uuid.uuid4()}"
+    config = {"configurable": {"thread_id": thread_id, "user_id": f"load-user-{user}"}}
+    for turn in range(args.turns):
+        start = time.perf_counter()
+        error = None
+        try:
+            result = app.invoke({
+                "messages": [{"role": "user", "content": _question(user, turn)}],
+                "voice_enabled": False,
+                "thread_id": thread_id,
+            }, config=config)
+            if "__interrupt__" in result:
+                app.invoke(Command(resume={"approved": True}), config=config)
+        except Exception as e:
+            error = str(e)
+        results.add({"latency": time.perf_counter() - start, "ttft": None, "tokens": 0, "error": error})
+        time.sleep(_think(args.think_ms / 1000))
+
+
+# -------------------
+# Scenarios
+# -------------------
+def _model(args, tools: List[str]) -> LoadTestChatModel:
+    return LoadTestChatModel(
+        ttft=args.ttft_ms / 1000,
+        tokens_per_second=args.tokens_per_second,
+        answer_tokens=args.answer_tokens,
+        tools=tools,
+        tool_rounds=args.tool_rounds,
+    )
+
+
+def _stub_network_tools(args) -> Dict[str, StructuredTool]:
+    latency = args.tool_ms / 1000
+    return {
+        "get_stock_price": _stub_tool(
+            "get_stock_price", "Fetch latest stock price for a given symbol.", "symbol", latency, {"price": 123.45},
+        ),
+        "duckduckgo_search": _stub_tool(
+            "duckduckgo_search", "Search the web.", "query", latency, "Stub search result.",
+        ),
+    }
+
+
+def load_backend(args):
+    """Import the scenario's backend and swap in the fake model and stub tools before the graph is built."""
+    scenario = SCENARIOS[args.scenario]
+    backend = __import__(scenario["backend"])
+    model = _model(args, scenario["tools"])
+    # Keep the production wrappers (LLM scheduler, hedging) around the fake
+    wrapped = backend.hedge(backend.schedule(model))
+    backend.get_llm = lambda: wrapped
+    stubs = _stub_network_tools(args)
+    prepare = None
+
+    if args.scenario == "tools":
+        from tool_cache import cached_tools
+
+        backend.tools = cached_tools([stubs["duckduckgo_search"], stubs["get_stock_price"], backend.calculator])
+    elif args.scenario == "rag":
+        retriever = StubRetriever(args.tool_ms / 1000)
+
+        def attach_document(thread_id: str) -> None:
+            backend._THREAD_RETRIEVERS[thread_id] = retriever
+            backend._THREAD_METADATA[thread_id] = {"filename": "load-test.pdf"}
+
+        prepare = attach_document
+    elif args.scenario == "async":
+        backend.search_tool = stubs["duckduckgo_search"]
+        backend.get_stock_price = stubs["get_stock_price"]
+        # No MCP servers: no adapter sessions and no background schema refresh
+        backend.load_mcp_tools = lambda fetch_missing=True: []
+        backend._refresher = backend.Lazy(lambda: None)
+    return backend, prepare
+
+
+def load_voice(args):
+    sys.path.insert(0, os.path.abspath(VOICE_DIR))
+    os.environ["HUMAN_REVIEW_MODE"] = "interrupt"
+    import nodes
+    from nodes import MemoryDecision
+
+    class _NoMemories:
+        def invoke(self, *args, **kwargs):
+            return MemoryDecision(should_write=False, memories=[])
+
+    nodes.llm = _model(args, [])
+    nodes.memory_extractor = _NoMemories()
+    from app import app
+
+    return app
+
+
+def run(args) -> Dict[str, Any]:
+    results = Results()
+    lock_timer = None
+    if args.scenario == "voice":
+        app = load_voice(args)
+        targets = [lambda user=user: run_voice_user(app, user, args, results) for user in range(args.users)]
+    else:
+        backend, prepare = load_backend(args)
+        backend.chatbot  # build the graph before the clock starts
+        lock_timer = time_saver_lock(backend.get_checkpointer())
+        if args.scenario == "async":
+            targets = None
+        else:
+            targets = [
+                lambda user=user: run_sync_user(backend, user, args, results, prepare)
+                for user in range(args.users)
+            ]
+
+    sampler = RssSampler()
+    start = time.perf_counter()
+    ramp = args.ramp_seconds / max(1, args.users)
+    if targets is None:
+        futures = []
+        for user in range(args.users):
+            thread_id = f"load-async-{uuid.uuid4()}"
+            futures.append(backend.submit_async_task(
+                run_async_user(backend, user, thread_id, args, results), thread_id=thread_id,
+            ))
+            time.sleep(ramp)
+        for future in futures:
+            future.result()
+    else:
+        threads = []
+        for target in targets:
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            threads.append(thread)
+            time.sleep(ramp)
+        for thread in threads:
+            thread.join()
+    wall = time.perf_counter() - start
+    memory = sampler.stop()
+
+    turns = results.turns
+    ok = [t for t in turns if t["error"] is None]
+    latencies = sorted(t["latency"] for t in ok)
+    ttfts = sorted(t["ttft"] for t in ok if t["ttft"] is not None)
+    errors = [t["error"] for t in turns if t["error"] is not None]
+    report = {
+        "scenario": args.scenario,
+        "users": args.users,
+        "turns": len(turns),
+        "errors": len(errors),
+        "sqlite_locked_errors": sum("locked" in e.lower() for e in errors),
+        "wall_s": wall,
+        "turns_per_s": len(ok) / wall if wall else 0.0,
+        "tokens_per_s": sum(t["tokens"] for t in ok) / wall if wall else 0.0,
+        **{f"latency_p{p}_ms": _percentile(latencies, p) * 1000 for p in (50, 95, 99)},
+        **{f"ttft_p{p}_ms": _percentile(ttfts, p) * 1000 for p in (50, 95, 99)},
+        **memory,
+    }
+    if lock_timer is not None:
+        waits = sorted(lock_timer.waits)
+        report.update({
+            "sqlite_lock_acquires": len(waits),
+            "sqlite_lock_wait_total_ms": sum(waits) * 1000,
+            "sqlite_lock_wait_p95_ms": _percentile(waits, 95) * 1000,
+            "sqlite_lock_wait_max_ms": (waits[-1] if waits else 0.0) * 1000,
+        })
+    if errors:
+        report["first_error"] = errors[0]
+    return report
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"\nScenario {report['scenario']}: {report['users']} users, {report['turns']} turns "
+          f"in {report['wall_s']:.1f}s, {report['errors']} errors")
+    print(f"  throughput      {report['turns_per_s']:8.2f} turns/s {report['tokens_per_s']:10.1f} tokens/s")
+    print(f"  turn latency    p50 {report['latency_p50_ms']:8.0f}  p95 {report['latency_p95_ms']:8.0f}  "
+          f"p99 {report['latency_p99_ms']:8.0f} ms")
+    if report["ttft_p50_ms"]:
+        print(f"  first token     p50 {report['ttft_p50_ms']:8.0f}  p95 {report['ttft_p95_ms']:8.0f}  "
+              f"p99 {report['ttft_p99_ms']:8.0f} ms")
+    if "sqlite_lock_acquires" in report:
+        print(f"  sqlite lock     {report['sqlite_lock_acquires']} acquires, "
+              f"{report['sqlite_lock_wait_total_ms']:.0f} ms waited, p95 {report['sqlite_lock_wait_p95_ms']:.1f} ms, "
+              f"max {report['sqlite_lock_wait_max_ms']:.1f} ms, {report['sqlite_locked_errors']} 'database is locked'")
+    print(f"  rss             {report['rss_start_mb']:.0f} -> {report['rss_end_mb']:.0f} MB "
+          f"(peak {report['rss_peak_mb']:.0f}, growth {report['rss_growth_mb']:+.1f} MB)")
+    if "first_error" in report:
+        print(f"  first error     {report['first_error'][:200]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent-session load test")
+    parser.add_argument("--scenario", choices=list(SCENARIOS), default="chat")
+    parser.add_argument("--users", type=int, default=10, help="Concurrent simulated users")
+    parser.add_argument("--turns", type=int, default=5, help="Turns per user")
+    parser.add_argument("--think-ms", type=float, default=500, help="Mean pause between a user's turns")
+    parser.add_argument("--ramp-seconds", type=float, default=2, help="Spread user start-up over this long")
+    parser.add_argument("--ttft-ms", type=float, default=300, help="Fake model time to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=50, help="Fake model streaming speed")
+    parser.add_argument("--answer-tokens", type=int, default=120, help="Mean answer length in tokens")
+    parser.add_argument("--tool-rounds", type=int, default=1, help="Tool-calling rounds per turn (tool scenarios)")
+    parser.add_argument("--tool-ms", type=float, default=150, help="Stub tool / retriever latency")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    report = run(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
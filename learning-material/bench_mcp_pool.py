@@ -0,0 +1,108 @@
+"""
+Per-call overhead benchmark for MCP tool calls.
+
+Starts a local stub MCP server (this file with --serve: one `add` tool,
+stdio transport, optional simulated startup time) and calls its tool:
+
+    per_call: the adapter default, a new session (and stdio process) per call
+    pooled:   through MCPSessionPool, sessions opened once and reused
+
+Calls run sequentially, then with --concurrency calls in flight at a time.
+
+Usage:
+    python bench_mcp_pool.py
+    python bench_mcp_pool.py --calls 50 --concurrency 8 --pool-size 4 --startup-ms 300
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+
+def serve(startup_ms: float) -> None:
+    from mcp.server.fastmcp import FastMCP
+
+    time.sleep(startup_ms / 1000)  # stands in for imports / model loading in a real server
+    server = FastMCP("bench")
+
+    @server.tool()
+    def add(a: float, b: float) -> float:
+        """Add two numbers."""
+        return a + b
+
+    server.run(transport="stdio")
+
+
+async def _timed_calls(call, calls: int, concurrency: int) -> list:
+    latencies = []
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with gate:
+            start = time.perf_counter()
+            await call(i)
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one(i) for i in range(calls)))
+    return sorted(latencies)
+
+
+def _report(name: str, latencies: list, wall: float) -> None:
+    p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+    print(f"{name:<22}{statistics.median(latencies) * 1000:>10.1f}{p95 * 1000:>10.1f}{len(latencies) / wall:>10.1f}")
+
+
+async def run(args) -> None:
+    from langchain_mcp_adapters.client import MultiServerMCPClient
+    from langchain_mcp_adapters.tools import convert_mcp_tool_to_langchain_tool
+
+    from mcp_session_pool import MCPSessionPool
+
+    connection = {
+        "transport": "stdio",
+        "command": sys.executable,
+        "args": [os.path.abspath(__file__), "--serve", "--startup-ms", str(args.startup_ms)],
+    }
+    client = MultiServerMCPClient({"bench": connection})
+    async with client.session("bench") as session:
+        mcp_tool = (await session.list_tools()).tools[0]
+
+    pool = MCPSessionPool(client.session, ["bench"], size=args.pool_size)
+    pool.start(asyncio.get_running_loop())
+    # Warm-up is startup cost, not per-call overhead
+    await pool.call_tool("bench", "add", {"a": 0, "b": 0})
+
+    tools = {
+        "per_call": convert_mcp_tool_to_langchain_tool(None, mcp_tool, connection=connection),
+        "pooled": convert_mcp_tool_to_langchain_tool(pool.session_for("bench"), mcp_tool),
+    }
+
+    print(f"{'mode':<22}{'p50 ms':>10}{'p95 ms':>10}{'calls/s':>10}")
+    for concurrency in (1, args.concurrency):
+        for name, tool in tools.items():
+            start = time.perf_counter()
+            latencies = await _timed_calls(lambda i: tool.ainvoke({"a": i, "b": 1}), args.calls, concurrency)
+            _report(f"{name} x{concurrency}", latencies, time.perf_counter() - start)
+    print(f"pool: {pool.stats()['bench']}")
+    await pool.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MCP session pool benchmark")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--startup-ms", type=float, default=0, help="Simulated stub server startup time")
+    parser.add_argument("--calls", type=int, default=20, help="Tool calls per mode")
+    parser.add_argument("--concurrency", type=int, default=4, help="Calls in flight in the concurrent run")
+    parser.add_argument("--pool-size", type=int, default=2, help="Pooled sessions")
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.startup_ms)
+    else:
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Turn-latency benchmark for speculative RAG retrieval.
+
+Runs document questions through the RAG graph with a fake chat model and a
+fake retriever, both with fixed latencies, once per RAG_SPECULATIVE_MODE:
+
+    off:      LLM call -> rag_tool retrieval -> LLM call (all serial)
+    prefetch: retrieval overlaps the first LLM call, rag_tool reuses it
+    inject:   excerpts are in the first prompt, the model answers directly
+
+Usage:
+    python bench_rag_prefetch.py
+    python bench_rag_prefetch.py --llm-ms 800 --retrieval-ms 400 --turns 10
+"""
+import argparse
+import os
+import statistics
+import time
+import uuid
+
+os.environ.setdefault("CHECKPOINT_SQLITE_PATH", "bench_checkpoints.db")
+os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+
+from langchain_core.documents import Document
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+import langgraph_rag_backend as backend
+from tool_cache import clear_tool_cache
+
+MODES = ["off", "prefetch", "inject"]
+
+
+class FakeRagModel(BaseChatModel):
+    """Calls rag_tool with the user's question unless excerpts are already in the prompt."""
+
+    latency: float = 0.5
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-rag"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.latency)
+        last = messages[-1]
+        injected = isinstance(last, SystemMessage) and last.content.startswith("Excerpts")
+        if injected or isinstance(last, ToolMessage):
+            message = AIMessage(content="Answer based on the document.")
+        else:
+            message = AIMessage(
+                content="",
+                tool_calls=[{
+                    "name": "rag_tool",
+                    "args": {"query": last.content},
+                    "id": f"call_{uuid.uuid4().hex[:8]}",
+                }],
+            )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+class FakeRetriever:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def invoke(self, query: str):
+        time.sleep(self.latency)
+        return [Document(page_content=f"Passage about {query}", metadata={"page": 1})]
+
+
+def run_mode(mode: str, retrieval_s: float, turns: int) -> list:
+    os.environ["RAG_SPECULATIVE_MODE"] = mode
+    latencies = []
+    for i in range(turns):
+        thread_id = f"bench-{mode}-{uuid.uuid4()}"
+        backend._THREAD_RETRIEVERS[thread_id] = FakeRetriever(retrieval_s)
+        backend._THREAD_METADATA[thread_id] = {"filename": "bench.pdf"}
+        clear_tool_cache("rag_tool")
+
+        config = {"configurable": {"thread_id": thread_id}}
+        start = time.perf_counter()
+        backend.chatbot.invoke({"messages": [HumanMessage(content=f"What does section {i} say?")]}, config=config)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Speculative RAG retrieval benchmark")
+    parser.add_argument("--llm-ms", type=float, default=500, help="Fake LLM latency per call")
+    parser.add_argument("--retrieval-ms", type=float, default=300, help="Fake retrieval latency")
+    parser.add_argument("--turns", type=int, default=5, help="Turns per mode")
+    args = parser.parse_args()
+
+    model = FakeRagModel(latency=args.llm_ms / 1000)
+    backend.get_llm = lambda: model
+
+    print(f"{'mode':<10}{'median':>10}{'p95':>10}   (turn latency, seconds)")
+    for mode in MODES:
+        latencies = sorted(run_mode(mode, args.retrieval_ms / 1000, args.turns))
+        p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+        print(f"{mode:<10}{statistics.median(latencies):>10.3f}{p95:>10.3f}")
+    print(f"prefetcher: {backend.speculative_retrieval_stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Startup benchmark for the backends.
+
+Each measurement runs in a fresh interpreter so nothing is already imported:
+    import_s:        `import <backend>` (should stay cheap, everything is lazy)
+    build_s:         first access to `chatbot` (LLM client, checkpointer, graph)
+    first_request_s: first full turn through the graph
+
+Usage:
+    python bench_startup.py                      # all backends, real LLM
+    python bench_startup.py --fake-llm --runs 5  # no API calls, startup cost only
+    python bench_startup.py --backend langgraph_tool_backend
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+
+BACKENDS = [
+    "langgraph_backend",
+    "langgraph_database_backend",
+    "langgraph_tool_backend",
+    "langgraph_rag_backend",
+    "langgraph_mcp_backend",
+]
+
+
+def _fake_llm():
+    from langchain_core.language_models.fake_chat_models import FakeMessagesListChatModel
+    from langchain_core.messages import AIMessage
+
+    class FakeChatModel(FakeMessagesListChatModel):
+        def bind_tools(self, tools, **kwargs):
+            return self
+
+    return FakeChatModel(responses=[AIMessage(content="Hello! How can I help?")])
+
+
+def measure(module_name: str, fake_llm: bool) -> dict:
+    """Runs inside the child interpreter."""
+    start = time.perf_counter()
+    backend = __import__(module_name)
+    import_s = time.perf_counter() - start
+
+    if fake_llm:
+        fake = _fake_llm()
+        backend.get_llm = lambda: fake
+
+    start = time.perf_counter()
+    chatbot = backend.chatbot
+    build_s = time.perf_counter() - start
+
+    from langchain_core.messages import HumanMessage
+
+    payload = {"messages": [HumanMessage(content="hi")]}
+    config = {"configurable": {"thread_id": f"bench-{uuid.uuid4()}"}}
+    start = time.perf_counter()
+    if hasattr(backend, "run_async"):
+        backend.run_async(chatbot.ainvoke(payload, config=config))
+    else:
+        chatbot.invoke(payload, config=config)
+    first_request_s = time.perf_counter() - start
+
+    return {"import_s": import_s, "build_s": build_s, "first_request_s": first_request_s}
+
+
+def run_child(module_name: str, fake_llm: bool) -> dict:
+    args = [sys.executable, os.path.abspath(__file__), "--child", module_name]
+    if fake_llm:
+        args.append("--fake-llm")
+    result = subprocess.run(args, capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    for line in reversed(result.stdout.splitlines()):
+        if line.startswith("{"):
+            return json.loads(line)
+    raise RuntimeError(f"{module_name} failed:\n{result.stderr[-2000:]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backend import / first-request benchmark")
+    parser.add_argument("--backend", action="append", help="Backend module (repeatable, default: all)")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh interpreters per backend")
+    parser.add_argument("--fake-llm", action="store_true", help="Replace the chat model with a canned reply")
+    parser.add_argument("--sqlite-path", default="bench_checkpoints.db",
+                        help="Scratch SQLite file, keeps benchmark threads out of chatbot.db")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    os.environ.setdefault("CHECKPOINT_SQLITE_PATH", args.sqlite_path)
+
+    if args.child:
+        print(json.dumps(measure(args.child, args.fake_llm)))
+        return
+
+    print(f"{'backend':<30}{'import':>10}{'build':>10}{'first req':>12}   (median of {args.runs}, seconds)")
+    for module_name in args.backend or BACKENDS:
+        try:
+            runs = [run_child(module_name, args.fake_llm) for _ in range(args.runs)]
+        except RuntimeError as e:
+            print(f"{module_name:<30}failed: {str(e).strip().splitlines()[-1]}")
+            continue
+        medians = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+        print(f"{module_name:<30}{medians['import_s']:>10.3f}{medians['build_s']:>10.3f}"
+              f"{medians['first_request_s']:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Frontend cost of streaming an answer token by token vs. coalesced.
+
+Streams a fake answer (one AIMessageChunk per word, a fixed delay between
+tokens, optionally with a tool call in the middle) into a consumer that
+does what `st.write_stream` does for every string it receives: re-render
+the whole answer so far and serialize it as one websocket delta. Runs once
+per coalescing window (0 = raw per-token chunks) and reports per response:
+
+    deltas:    websocket messages sent
+    kB sent:   total delta payload
+    cpu ms:    CPU time of the consuming thread (rendering included)
+    first ms:  time to the first visible text
+    total ms:  time to the last delta
+
+Usage:
+    python bench_stream_coalescing.py
+    python bench_stream_coalescing.py --tokens 800 --token-ms 5 --windows 0 25 50 100 --tool-call
+"""
+import argparse
+import json
+import re
+import statistics
+import time
+
+from langchain_core.messages import AIMessageChunk, ToolMessage
+
+from stream_coalescing import coalesce_messages
+
+_WORDS = "the quick brown fox jumps over a lazy dog while **markdown** renders `code` and lists".split()
+_MARKDOWN = re.compile(r"(\*\*[^*]+\*\*|`[^`]+`|\n[-*] |\n#+ |\w+)")
+
+
+def fake_stream(tokens: int, token_s: float, tool_call: bool):
+    """`stream_mode="messages"` events for one answer, paced like an LLM."""
+    # Built up front: in the app the graph builds them on another thread
+    metadata = {"langgraph_node": "chat_node"}
+    halves = [("run-1", tokens // 2), ("run-2", tokens - tokens // 2)] if tool_call else [("run-1", tokens)]
+    events = []
+    for index, (message_id, count) in enumerate(halves):
+        events += [
+            (AIMessageChunk(content=_WORDS[i % len(_WORDS)] + " ", id=message_id), metadata)
+            for i in range(count)
+        ]
+        if tool_call and index == 0:
+            events.append((AIMessageChunk(
+                content="",
+                id=message_id,
+                tool_call_chunks=[{"name": "calculator", "args": "{}", "id": "call_1", "index": 0}],
+            ), metadata))
+            events.append((
+                ToolMessage(content="42", name="calculator", tool_call_id="call_1"),
+                {"langgraph_node": "tools"},
+            ))
+
+    def paced():
+        for message_chunk, event_metadata in events:
+            # Tool execution takes a while; tokens arrive every token_s
+            time.sleep(token_s * 20 if isinstance(message_chunk, ToolMessage) else token_s)
+            yield message_chunk, event_metadata
+
+    return paced()
+
+
+def render(events) -> dict:
+    """Consume events like the frontends + st.write_stream; returns what it cost."""
+    start, cpu_start = time.perf_counter(), time.thread_time()
+    first = None
+    deltas = sent = 0
+    text = ""
+    for message_chunk, _ in events:
+        if not isinstance(message_chunk, AIMessageChunk) or not message_chunk.content:
+            continue
+        if first is None:
+            first = time.perf_counter() - start
+        text += message_chunk.content
+        # write_stream re-renders the accumulated answer: markdown pass + one delta
+        _MARKDOWN.findall(text)
+        payload = json.dumps({"delta": {"newElement": {"markdown": {"body": text}}}}).encode("utf-8")
+        deltas += 1
+        sent += len(payload)
+    return {
+        "deltas": deltas,
+        "kb": sent / 1024,
+        "cpu_ms": (time.thread_time() - cpu_start) * 1000,
+        "first_ms": (first or 0.0) * 1000,
+        "total_ms": (time.perf_counter() - start) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream coalescing benchmark")
+    parser.add_argument("--tokens", type=int, default=500, help="Tokens per answer")
+    parser.add_argument("--token-ms", type=float, default=5, help="Delay between tokens")
+    parser.add_argument("--responses", type=int, default=3, help="Answers per window")
+    parser.add_argument("--windows", type=float, nargs="+", default=[0, 50, 100], help="Coalescing windows in ms")
+    parser.add_argument("--max-chars", type=int, default=64, help="Flush once this much text is waiting")
+    parser.add_argument("--tool-call", action="store_true", help="Put a tool call in the middle of the answer")
+    args = parser.parse_args()
+
+    print(f"{'window':<10}{'deltas':>8}{'kB sent':>10}{'cpu ms':>10}{'first ms':>10}{'total ms':>10}")
+    for window in args.windows:
+        runs = [
+            render(coalesce_messages(
+                fake_stream(args.tokens, args.token_ms / 1000, args.tool_call),
+                window_ms=window,
+                max_chars=args.max_chars,
+            ))
+            for _ in range(args.responses)
+        ]
+        row = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+        name = "raw" if window <= 0 else f"{window:g} ms"
+        print(
+            f"{name:<10}{row['deltas']:>8.0f}{row['kb']:>10.1f}{row['cpu_ms']:>10.1f}"
+            f"{row['first_ms']:>10.1f}{row['total_ms']:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+"""
+Read cache for the latest checkpoint of each thread.
+
+`chatbot.get_state` (every thread switch in the frontends) and the start of
+every graph run ask the checkpointer for a thread's latest checkpoint. Without
+a cache each call hits the database and deserializes the whole history even
+when nothing changed.
+
+`CachedCheckpointSaver` wraps any saver and keeps the latest CheckpointTuple
+per (thread_id, checkpoint_ns) in a size-bounded LRU:
+    - put() is write-through: the new checkpoint replaces the cached entry
+    - put_writes() on the cached checkpoint and delete_thread() invalidate it
+    - reads of older checkpoints (history, time travel) go straight to the saver
+
+The cache is per process and never sees writes made by another process, so
+it is off by default and only safe when one process owns the database. With
+several processes on one database (Streamlit apps and api_server sharing
+chatbot.db, replicas sharing Postgres) leave it off (see checkpointer_config.py).
+"""
+from __future__ import annotations
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, Sequence, Tuple
+
+from langchain_core.messages import BaseMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+
+
+class DelegatingCheckpointSaver(BaseCheckpointSaver):
+    """Checkpointer that forwards every call to a wrapped saver."""
+
+    def __init__(self, saver: BaseCheckpointSaver):
+        super().__init__(serde=saver.serde)
+        self.saver = saver
+
+    def __getattr__(self, name: str) -> Any:
+        # Saver-specific attributes such as `conn` or `setup()`
+        if name == "saver":
+            raise AttributeError(name)
+        return getattr(self.saver, name)
+
+    @property
+    def config_specs(self) -> list:
+        return self.saver.config_specs
+
+    def get_next_version(self, current, channel):
+        return self.saver.get_next_version(current, channel)
+
+    # Sync API
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return self.saver.get_tuple(config)
+
+    def list(self, config: Optional[RunnableConfig], **kwargs) -> Iterator[CheckpointTuple]:
+        return self.saver.list(config, **kwargs)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return self.saver.put(config, checkpoint, metadata, new_versions)
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        return self.saver.put_writes(config, writes, task_id, task_path)
+
+    def delete_thread(self, thread_id: str) -> None:
+        return self.saver.delete_thread(thread_id)
+
+    # Async API
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await self.saver.aget_tuple(config)
+
+    async def alist(self, config: Optional[RunnableConfig], **kwargs) -> AsyncIterator[CheckpointTuple]:
+        async for item in self.saver.alist(config, **kwargs):
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await self.saver.aput(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        return await self.saver.aput_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        return await self.saver.adelete_thread(thread_id)
+
+
+def approx_size(value: Any) -> int:
+    """Cheap estimate of the memory held by a checkpoint value."""
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if isinstance(value, BaseMessage):
+        return 200 + approx_size(value.content) + approx_size(value.additional_kwargs)
+    if isinstance(value, dict):
+        return sum(approx_size(k) + approx_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return sum(approx_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+def _copy_checkpoint(checkpoint: Checkpoint) -> Checkpoint:
+    """Copy the mutable parts of a checkpoint without adding or dropping keys."""
+    return {
+        **checkpoint,
+        "channel_values": checkpoint["channel_values"].copy(),
+        "channel_versions": checkpoint["channel_versions"].copy(),
+        "versions_seen": {k: v.copy() for k, v in checkpoint["versions_seen"].items()},
+    }
+
+
+def _cache_key(config: RunnableConfig) -> Tuple[str, str]:
+    configurable = config.get("configurable", {})
+    return str(configurable.get("thread_id")), configurable.get("checkpoint_ns", "")
+
+
+class CachedCheckpointSaver(DelegatingCheckpointSaver):
+    """Write-through LRU cache of each thread's latest checkpoint."""
+
+    def __init__(
+        self,
+        saver: BaseCheckpointSaver,
+        max_entries: int = 256,
+        max_bytes: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+    ):
+        super().__init__(saver)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        # key -> (tuple, approx_bytes, stored_at)
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[CheckpointTuple, int, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    # -------------------
+    # Cache bookkeeping
+    # -------------------
+    def _lookup(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        key = _cache_key(config)
+        requested_id = get_checkpoint_id(config)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl_seconds is not None:
+                if time.monotonic() - entry[2] > self.ttl_seconds:
+                    self._drop(key)
+                    entry = None
+            if entry is None:
+                self._misses += 1
+                return None
+
+            cached = entry[0]
+            if requested_id and requested_id != cached.config["configurable"]["checkpoint_id"]:
+                # Explicit request for an older checkpoint: not ours to answer
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+        # The Pregel loop mutates channel_versions/versions_seen of the
+        # checkpoint it loads, so hand out a copy and keep ours pristine.
+        return cached._replace(
+            checkpoint=_copy_checkpoint(cached.checkpoint),
+            pending_writes=list(cached.pending_writes or []),
+        )
+
+    def _store(self, checkpoint_tuple: CheckpointTuple) -> None:
+        key = _cache_key(checkpoint_tuple.config)
+        new_id = checkpoint_tuple.config["configurable"]["checkpoint_id"]
+        size = approx_size(checkpoint_tuple.checkpoint["channel_values"])
+        with self._lock:
+            current = self._entries.get(key)
+            # Checkpoint ids are time-ordered; never let a slow read replace a newer write
+            if current is not None and current[0].config["configurable"]["checkpoint_id"] > new_id:
+                return
+            if current is not None:
+                self._drop(key)
+            self._entries[key] = (checkpoint_tuple, size, time.monotonic())
+            self._bytes += size
+            while self._entries and (
+                len(self._entries) > self.max_entries
+                or (self.max_bytes is not None and self._bytes > self.max_bytes)
+            ):
+                self._drop(next(iter(self._entries)))
+                self._evictions += 1
+
+    def _drop(self, key: Tuple[str, str]) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def _invalidate(self, config: RunnableConfig) -> None:
+        key = _cache_key(config)
+        checkpoint_id = get_checkpoint_id(config)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0].config["configurable"]["checkpoint_id"] == checkpoint_id:
+                self._drop(key)
+
+    def _invalidate_thread(self, thread_id: str) -> None:
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == str(thread_id)]:
+                self._drop(key)
+
+    def _tuple_from_put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_config: RunnableConfig,
+    ) -> CheckpointTuple:
+        configurable = config["configurable"]
+        parent_id = configurable.get("checkpoint_id")
+        parent_config = None
+        if parent_id:
+            parent_config = {
+                "configurable": {
+                    "thread_id": configurable["thread_id"],
+                    "checkpoint_ns": configurable.get("checkpoint_ns", ""),
+                    "checkpoint_id": parent_id,
+                }
+            }
+        return CheckpointTuple(
+            config=new_config,
+            checkpoint=_copy_checkpoint(checkpoint),
+            metadata=get_checkpoint_metadata(config, metadata),
+            parent_config=parent_config,
+            pending_writes=[],
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": self._hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "approx_bytes": self._bytes,
+                "evictions": self._evictions,
+            }
+
+    # -------------------
+    # Sync API
+    # -------------------
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        cached = self._lookup(config)
+        if cached is not None:
+            return cached
+        checkpoint_tuple = self.saver.get_tuple(config)
+        if checkpoint_tuple is not None and not get_checkpoint_id(config):
+            self._store(checkpoint_tuple)
+        return checkpoint_tuple
+
+    def put(self, config, checkpoint, metadata, new_versions) -> RunnableConfig:
+        new_config = self.saver.put(config, checkpoint, metadata, new_versions)
+        self._store(self._tuple_from_put(config, checkpoint, metadata, new_config))
+        return new_config
+
+    def put_writes(self, config, writes, task_id, task_path: str = "") -> None:
+        self.saver.put_writes(config, writes, task_id, task_path)
+        self._invalidate(config)
+
+    def delete_thread(self, thread_id: str) -> None:
+        self.saver.delete_thread(thread_id)
+        self._invalidate_thread(thread_id)
+
+    # -------------------
+    # Async API
+    # -------------------
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        cached = self._lookup(config)
+        if cached is not None:
+            return cached
+        checkpoint_tuple = await self.saver.aget_tuple(config)
+        if checkpoint_tuple is not None and not get_checkpoint_id(config):
+            self._store(checkpoint_tuple)
+        return checkpoint_tuple
+
+    async def aput(self, config, checkpoint, metadata, new_versions) -> RunnableConfig:
+        new_config = await self.saver.aput(config, checkpoint, metadata, new_versions)
+        self._store(self._tuple_from_put(config, checkpoint, metadata, new_config))
+        return new_config
+
+    async def aput_writes(self, config, writes, task_id, task_path: str = "") -> None:
+        await self.saver.aput_writes(config, writes, task_id, task_path)
+        self._invalidate(config)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await self.saver.adelete_thread(thread_id)
+        self._invalidate_thread(thread_id)
@@ -0,0 +1,237 @@
+"""
+Circuit breakers for tools backed by a remote service.
+
+A hung or failing MCP server otherwise costs every turn that touches it the
+full tool timeout. One `CircuitBreaker` per server tracks consecutive
+failures and timeouts of its tool calls:
+
+    closed:    calls pass through; BREAKER_FAILURES failures in a row open it
+    open:      calls fail immediately with a ToolException for
+               BREAKER_RESET_SECONDS
+    half_open: one probe call is let through; success closes the breaker,
+               failure opens it again
+
+A ToolException raised by the tool itself (the server answered with an
+error) counts as a success: the server is reachable. Each call is bounded by
+`tool_executor.remaining_time()`, so the turn's deadline reaches the tool.
+
+`breaker_tools(tools, breaker)` wraps function tools, like `cached_tools`,
+and notes an open breaker in the tool description so the model knows the
+tool is unavailable. Listeners passed to `on_change` run on every state
+change (e.g. to rebind the tools), transitions are recorded as `circuit`
+metric events and `breaker_stats()` returns the state of every breaker.
+
+Environment Variables:
+    BREAKER_FAILURES: consecutive failures that open a breaker (default 3)
+    BREAKER_RESET_SECONDS: seconds an open breaker waits before a probe (default 30)
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Sequence
+
+from dotenv import load_dotenv
+from langchain_core.tools import BaseTool, StructuredTool, ToolException
+
+from instrumentation import get_recorder
+from tool_executor import remaining_time
+
+load_dotenv()
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitBreaker:
+    """Failure-counting breaker for one service."""
+
+    def __init__(self, name: str, failure_threshold: int = 3, reset_seconds: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._state = CLOSED
+        self._failures = 0
+        self._changed_at = time.monotonic()
+        self._probing = False
+        self._counts = {"calls": 0, "failures": 0, "timeouts": 0, "rejected": 0, "opened": 0}
+        self._listeners: List[Callable[["CircuitBreaker"], None]] = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, name: str) -> "CircuitBreaker":
+        return cls(
+            name,
+            failure_threshold=int(os.getenv("BREAKER_FAILURES", "3")),
+            reset_seconds=float(os.getenv("BREAKER_RESET_SECONDS", "30")),
+        )
+
+    def on_change(self, listener: Callable[["CircuitBreaker"], None]) -> None:
+        self._listeners.append(listener)
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def retry_in(self) -> float:
+        """Seconds until an open breaker lets a probe through."""
+        with self._lock:
+            if self._state != OPEN:
+                return 0.0
+            return max(0.0, self._changed_at + self.reset_seconds - time.monotonic())
+
+    # -------------------
+    # State changes
+    # -------------------
+    def _set_state(self, state: str) -> Callable[[], None]:
+        """Switch state under the lock; returns the notification to run after releasing it."""
+        previous, held = self._state, time.monotonic() - self._changed_at
+        self._state = state
+        self._changed_at = time.monotonic()
+        if state == OPEN:
+            self._counts["opened"] += 1
+
+        def notify() -> None:
+            icon = "⚠️" if state == OPEN else "✅"
+            print(f"{icon} Circuit for {self.name}: {previous} -> {state}")
+            recorder = get_recorder()
+            if recorder is not None:
+                recorder.record({
+                    "kind": "circuit",
+                    "name": self.name,
+                    "duration_ms": round(held * 1000, 2),
+                    "state": state,
+                    "previous": previous,
+                    "error": state == OPEN,
+                })
+            for listener in self._listeners:
+                listener(self)
+
+        return notify
+
+    def before_call(self) -> None:
+        """Raise ToolException if the breaker rejects the call."""
+        notify = None
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._changed_at >= self.reset_seconds:
+                notify = self._set_state(HALF_OPEN)
+            if self._state == OPEN or (self._state == HALF_OPEN and self._probing):
+                self._counts["rejected"] += 1
+                retry_in = max(0.0, self._changed_at + self.reset_seconds - time.monotonic())
+                rejected = True
+            else:
+                self._probing = self._state == HALF_OPEN
+                self._counts["calls"] += 1
+                rejected = False
+        if notify:
+            notify()
+        if rejected:
+            raise ToolException(
+                f"{self.name} is unavailable after repeated failures; "
+                f"not retrying for another {max(1, round(retry_in))}s. Answer without it."
+            )
+
+    def record_success(self) -> None:
+        notify = None
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            if self._state != CLOSED:
+                notify = self._set_state(CLOSED)
+        if notify:
+            notify()
+
+    def record_failure(self, timeout: bool = False) -> None:
+        notify = None
+        with self._lock:
+            self._failures += 1
+            self._counts["timeouts" if timeout else "failures"] += 1
+            was_probe, self._probing = self._probing, False
+            if self._state == HALF_OPEN and was_probe:
+                notify = self._set_state(OPEN)
+            elif self._state == CLOSED and self._failures >= self.failure_threshold:
+                notify = self._set_state(OPEN)
+        if notify:
+            notify()
+
+    # -------------------
+    # Tool wrapping
+    # -------------------
+    def awrap(self, coroutine: Callable[..., Any]) -> Callable[..., Any]:
+        async def guarded_coroutine(*args: Any, **kwargs: Any) -> Any:
+            self.before_call()
+            timeout = remaining_time()
+            try:
+                result = await asyncio.wait_for(coroutine(*args, **kwargs), timeout)
+            except ToolException:
+                self.record_success()
+                raise
+            except asyncio.TimeoutError:
+                self.record_failure(timeout=True)
+                raise ToolException(f"{self.name} did not respond within {timeout:.3g}s.") from None
+            except asyncio.CancelledError:
+                # The tool node gave up on the call at its deadline, or the turn was cancelled
+                left = remaining_time()
+                if left is not None and left <= 0.05:
+                    self.record_failure(timeout=True)
+                else:
+                    with self._lock:
+                        self._probing = False
+                raise
+            except Exception:
+                self.record_failure()
+                raise
+            self.record_success()
+            return result
+
+        return guarded_coroutine
+
+    def describe(self, description: str) -> str:
+        if self.state != OPEN:
+            return description
+        return f"[Currently unavailable: {self.name} is not responding.] {description}"
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "in_state_s": round(time.monotonic() - self._changed_at, 1),
+                **self._counts,
+            }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Process-wide breaker for one service, created on first use."""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker.from_env(name)
+        return breaker
+
+
+def breaker_tools(tools: Sequence[BaseTool], breaker: CircuitBreaker) -> List[BaseTool]:
+    """Return the tools guarded by `breaker`, with its state in their descriptions."""
+    result = []
+    for tool in tools:
+        if isinstance(tool, StructuredTool) and tool.coroutine is not None:
+            result.append(tool.model_copy(update={
+                "coroutine": breaker.awrap(tool.coroutine),
+                "description": breaker.describe(tool.description),
+            }))
+        else:
+            print(f"⚠️ Circuit breaker supports async function tools only; {tool.name} runs unguarded")
+            result.append(tool)
+    return result
+
+
+def breaker_stats() -> Dict[str, Dict[str, Any]]:
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.stats() for breaker in breakers}
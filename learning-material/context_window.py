@@ -0,0 +1,186 @@
+"""
+Token-budgeted history window for the chat nodes.
+
+Instead of sending the full `state["messages"]` on every call, `ContextWindow`
+keeps the most recent turns verbatim (up to CONTEXT_MAX_TURNS and within
+CONTEXT_TOKEN_BUDGET) and folds everything older into a rolling summary that
+lives in graph state. Tool results in the kept turns, other than the current
+one, are truncated because the model has already used them.
+
+A turn starts at a HumanMessage and includes the AI/tool messages after it,
+so an AI tool call is never separated from its ToolMessage.
+
+State keys used:
+    summary: the rolling summary of everything before the window
+    summary_until: id of the last message folded into the summary
+
+Environment Variables:
+    CONTEXT_MAX_TURNS: recent turns kept verbatim (default 6)
+    CONTEXT_TOKEN_BUDGET: approximate token budget for those turns (default 3000)
+    CONTEXT_TOOL_OUTPUT_CHARS: truncate older tool results to this many characters (default 500)
+"""
+from __future__ import annotations
+
+import os
+from typing import List, Optional, Sequence, Tuple
+
+from dotenv import load_dotenv
+from langchain_core.messages import (
+    BaseMessage,
+    HumanMessage,
+    SystemMessage,
+    ToolMessage,
+    get_buffer_string,
+)
+from langchain_core.messages.utils import count_tokens_approximately
+
+load_dotenv()
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a user and an AI assistant.
+
+CURRENT SUMMARY:
+{summary}
+
+NEW MESSAGES TO FOLD IN:
+{new_lines}
+
+Write the updated summary. Keep facts, decisions, user preferences, open questions
+and any numbers or names that may matter later. Drop greetings and filler.
+Be concise."""
+
+
+# Keeps summarizer tokens out of `stream_mode="messages"` output
+_SUMMARY_CONFIG = {"tags": ["nostream"], "run_name": "summarize_history"}
+
+
+def split_turns(messages: Sequence[BaseMessage]) -> List[List[BaseMessage]]:
+    """Group messages into turns that each start at a user message."""
+    turns: List[List[BaseMessage]] = []
+    for message in messages:
+        if isinstance(message, HumanMessage) or not turns:
+            turns.append([message])
+        else:
+            turns[-1].append(message)
+    return turns
+
+
+def summary_message(summary: str) -> SystemMessage:
+    return SystemMessage(content=f"Summary of the earlier conversation:\n{summary}")
+
+
+class ContextWindow:
+    """Builds the message list for one LLM call plus the state updates it implies."""
+
+    def __init__(
+        self,
+        summarizer=None,
+        max_turns: int = 6,
+        token_budget: int = 3000,
+        tool_output_chars: int = 500,
+    ):
+        self.summarizer = summarizer
+        self.max_turns = max_turns
+        self.token_budget = token_budget
+        self.tool_output_chars = tool_output_chars
+
+    @classmethod
+    def from_env(cls, summarizer=None) -> "ContextWindow":
+        return cls(
+            summarizer=summarizer,
+            max_turns=int(os.getenv("CONTEXT_MAX_TURNS", "6")),
+            token_budget=int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000")),
+            tool_output_chars=int(os.getenv("CONTEXT_TOOL_OUTPUT_CHARS", "500")),
+        )
+
+    # -------------------
+    # Window selection
+    # -------------------
+    def _unsummarized(self, messages: Sequence[BaseMessage], summary_until: Optional[str]) -> Sequence[BaseMessage]:
+        if summary_until:
+            for index, message in enumerate(messages):
+                if message.id == summary_until:
+                    return messages[index + 1:]
+        return messages
+
+    def _truncate_tool_output(self, message: BaseMessage) -> BaseMessage:
+        if not isinstance(message, ToolMessage) or not isinstance(message.content, str):
+            return message
+        if len(message.content) <= self.tool_output_chars:
+            return message
+        cut = len(message.content) - self.tool_output_chars
+        return message.model_copy(
+            update={"content": f"{message.content[:self.tool_output_chars]}… [{cut} characters truncated]"}
+        )
+
+    def select(self, state: dict) -> Tuple[List[List[BaseMessage]], List[List[BaseMessage]]]:
+        """Return (turns to fold into the summary, turns to send verbatim)."""
+        pending = self._unsummarized(state["messages"], state.get("summary_until"))
+        turns = split_turns(pending)
+        if not turns:
+            return [], []
+
+        # The current turn is always sent, even when it alone exceeds the budget
+        window = [turns[-1]]
+        used = count_tokens_approximately(turns[-1])
+        for turn in reversed(turns[:-1]):
+            if len(window) >= self.max_turns:
+                break
+            cost = count_tokens_approximately([self._truncate_tool_output(m) for m in turn])
+            if used + cost > self.token_budget:
+                break
+            window.insert(0, turn)
+            used += cost
+
+        return turns[: len(turns) - len(window)], window
+
+    def _render(self, summary: str, window: List[List[BaseMessage]]) -> List[BaseMessage]:
+        messages: List[BaseMessage] = [summary_message(summary)] if summary else []
+        for turn in window[:-1]:
+            messages.extend(self._truncate_tool_output(m) for m in turn)
+        messages.extend(window[-1])
+        return messages
+
+    def _summary_input(self, summary: str, dropped: List[List[BaseMessage]]) -> List[BaseMessage]:
+        new_lines = get_buffer_string([m for turn in dropped for m in turn])
+        return [HumanMessage(content=SUMMARY_PROMPT.format(summary=summary or "(empty)", new_lines=new_lines))]
+
+    # -------------------
+    # Public API
+    # -------------------
+    def prepare(self, state: dict) -> Tuple[List[BaseMessage], dict]:
+        """
+        Returns:
+            (messages to send to the LLM, state updates for the node to return)
+        """
+        summary = state.get("summary", "")
+        dropped, window = self.select(state)
+        updates: dict = {}
+
+        if dropped and self.summarizer is not None:
+            try:
+                summary = self.summarizer.invoke(
+                    self._summary_input(summary, dropped), config=_SUMMARY_CONFIG
+                ).content
+                updates = {"summary": summary, "summary_until": dropped[-1][-1].id}
+            except Exception as e:
+                # Keep the old summary; the dropped turns are retried next call
+                print(f"⚠️ Summary update failed: {str(e)}")
+
+        return self._render(summary, window), updates
+
+    async def aprepare(self, state: dict) -> Tuple[List[BaseMessage], dict]:
+        summary = state.get("summary", "")
+        dropped, window = self.select(state)
+        updates: dict = {}
+
+        if dropped and self.summarizer is not None:
+            try:
+                response = await self.summarizer.ainvoke(
+                    self._summary_input(summary, dropped), config=_SUMMARY_CONFIG
+                )
+                summary = response.content
+                updates = {"summary": summary, "summary_until": dropped[-1][-1].id}
+            except Exception as e:
+                print(f"⚠️ Summary update failed: {str(e)}")
+
+        return self._render(summary, window), updates
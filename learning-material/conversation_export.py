@@ -0,0 +1,360 @@
+"""
+Stream conversations out of a checkpointer database and back into a fresh one.
+
+Checkpoints are read in batches from a cursor (a server-side named cursor on
+PostgreSQL), so memory stays flat no matter how large the database gets. Every exported record carries the serialized
+checkpoint, its metadata and pending writes (enough for a lossless import) plus
+a readable `messages` list for analytics.
+
+Usage:
+    python conversation_export.py export --db chatbot.db --out threads.jsonl
+    python conversation_export.py export --db chatbot.db --out threads.parquet --latest-only
+    python conversation_export.py export --db chatbot.db --out one.jsonl --thread <thread_id>
+    python conversation_export.py import --src threads.jsonl --db migrated.db
+    python conversation_export.py import --src threads.jsonl --target-url postgresql://...
+    python conversation_export.py export --url postgresql://... --out threads.jsonl
+"""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import json
+import os
+import sqlite3
+import sys
+from itertools import groupby
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from langchain_core.messages import messages_to_dict
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+from checkpointer_config import postgres_connection_kwargs
+
+DEFAULT_BATCH_SIZE = 500
+
+PARQUET_COLUMNS = [
+    "thread_id",
+    "checkpoint_ns",
+    "checkpoint_id",
+    "parent_checkpoint_id",
+    "checkpoint",
+    "metadata",
+    "writes",
+    "messages",
+]
+# Nested fields are stored as JSON strings in Parquet to keep the schema flat.
+_JSON_COLUMNS = ("checkpoint", "metadata", "writes", "messages")
+
+
+# -------------------
+# 1. Encoding helpers
+# -------------------
+def _encode(serde, value: Any) -> dict:
+    type_, data = serde.dumps_typed(value)
+    return {"type": type_, "data": base64.b64encode(data).decode("ascii")}
+
+
+def _decode(serde, payload: dict) -> Any:
+    return serde.loads_typed((payload["type"], base64.b64decode(payload["data"])))
+
+
+def tuple_to_record(saver: BaseCheckpointSaver, checkpoint_tuple) -> dict:
+    """Turn a CheckpointTuple into a JSON-safe export record."""
+    configurable = checkpoint_tuple.config["configurable"]
+    parent_config = checkpoint_tuple.parent_config or {}
+    channel_values = checkpoint_tuple.checkpoint.get("channel_values", {})
+
+    return {
+        "thread_id": str(configurable["thread_id"]),
+        "checkpoint_ns": configurable.get("checkpoint_ns", ""),
+        "checkpoint_id": configurable["checkpoint_id"],
+        "parent_checkpoint_id": parent_config.get("configurable", {}).get("checkpoint_id"),
+        "checkpoint": _encode(saver.serde, checkpoint_tuple.checkpoint),
+        "metadata": _encode(saver.serde, checkpoint_tuple.metadata),
+        "writes": [
+            {"task_id": task_id, "channel": channel, "value": _encode(saver.serde, value)}
+            for task_id, channel, value in checkpoint_tuple.pending_writes or []
+        ],
+        "messages": messages_to_dict(channel_values.get("messages", [])),
+    }
+
+
+# -------------------
+# 2. Batched reads
+# -------------------
+def iter_checkpoint_keys(
+    conn: sqlite3.Connection,
+    thread_ids: Optional[Sequence[str]] = None,
+    latest_only: bool = False,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> Iterator[tuple]:
+    """
+    Yield (thread_id, checkpoint_ns, checkpoint_id) keys in batches.
+
+    Keys come back oldest-first within a thread so an import always sees a
+    parent checkpoint before its children.
+    """
+    checkpoint_col = "MAX(checkpoint_id)" if latest_only else "checkpoint_id"
+    query = f"SELECT thread_id, checkpoint_ns, {checkpoint_col} FROM checkpoints"
+    params: List[str] = []
+    if thread_ids:
+        query += f" WHERE thread_id IN ({','.join('?' * len(thread_ids))})"
+        params.extend(str(t) for t in thread_ids)
+    if latest_only:
+        query += " GROUP BY thread_id, checkpoint_ns"
+    query += " ORDER BY thread_id, checkpoint_ns, 3"
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        cursor.close()
+
+
+def iter_postgres_checkpoint_keys(
+    conn,
+    thread_ids: Optional[Sequence[str]] = None,
+    latest_only: bool = False,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> Iterator[tuple]:
+    """Same as `iter_checkpoint_keys`, streamed through a server-side cursor."""
+    checkpoint_col = "MAX(checkpoint_id)" if latest_only else "checkpoint_id"
+    query = f"SELECT thread_id, checkpoint_ns, {checkpoint_col} FROM checkpoints"
+    params: List[Any] = []
+    if thread_ids:
+        query += " WHERE thread_id = ANY(%s)"
+        params.append([str(t) for t in thread_ids])
+    if latest_only:
+        query += " GROUP BY thread_id, checkpoint_ns"
+    query += " ORDER BY thread_id, checkpoint_ns, 3"
+
+    # Named cursors live on the server and need a transaction, so `conn`
+    # must not be in autocommit mode.
+    with conn.cursor(name="conversation_export_keys") as cursor:
+        cursor.itersize = batch_size
+        cursor.execute(query, params)
+        yield from cursor
+
+
+def iter_records(
+    db_path: Optional[str] = None,
+    thread_ids: Optional[Sequence[str]] = None,
+    latest_only: bool = False,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    database_url: Optional[str] = None,
+) -> Iterator[dict]:
+    """Stream export records for every (or the selected) thread in a SQLite or Postgres db."""
+    if database_url:
+        import psycopg
+        from langgraph.checkpoint.postgres import PostgresSaver
+
+        key_conn = psycopg.connect(database_url)
+        saver = PostgresSaver(psycopg.connect(database_url, **postgres_connection_kwargs()))
+        keys = iter_postgres_checkpoint_keys(key_conn, thread_ids, latest_only, batch_size)
+    else:
+        key_conn = sqlite3.connect(database=db_path)
+        saver = SqliteSaver(sqlite3.connect(database=db_path))
+        keys = iter_checkpoint_keys(key_conn, thread_ids, latest_only, batch_size)
+
+    try:
+        for thread_id, checkpoint_ns, checkpoint_id in keys:
+            checkpoint_tuple = saver.get_tuple(
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": checkpoint_id,
+                    }
+                }
+            )
+            if checkpoint_tuple is not None:
+                yield tuple_to_record(saver, checkpoint_tuple)
+    finally:
+        key_conn.close()
+        saver.conn.close()
+
+
+# -------------------
+# 3. Writers / readers
+# -------------------
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise SystemExit("Parquet support needs pyarrow. Install with: pip install pyarrow")
+    return pyarrow, pyarrow.parquet
+
+
+def write_jsonl(records: Iterable[dict], path: str) -> int:
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False))
+            f.write("\n")
+            count += 1
+    return count
+
+
+def write_parquet(records: Iterable[dict], path: str, batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    pa, pq = _require_pyarrow()
+    schema = pa.schema([(name, pa.string()) for name in PARQUET_COLUMNS])
+
+    def flatten(record: dict) -> dict:
+        return {
+            name: json.dumps(record[name], ensure_ascii=False) if name in _JSON_COLUMNS else record[name]
+            for name in PARQUET_COLUMNS
+        }
+
+    count = 0
+    batch: List[dict] = []
+    with pq.ParquetWriter(path, schema) as writer:
+        for record in records:
+            batch.append(flatten(record))
+            if len(batch) >= batch_size:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                count += len(batch)
+                batch = []
+        if batch:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            count += len(batch)
+    return count
+
+
+def read_jsonl(path: str) -> Iterator[dict]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def read_parquet(path: str, batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[dict]:
+    _, pq = _require_pyarrow()
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+        for row in batch.to_pylist():
+            for name in _JSON_COLUMNS:
+                row[name] = json.loads(row[name])
+            yield row
+
+
+# -------------------
+# 4. Import
+# -------------------
+def import_records(records: Iterable[dict], saver: BaseCheckpointSaver) -> int:
+    """Replay export records into `saver` through the public checkpointer API."""
+    count = 0
+    for record in records:
+        checkpoint = _decode(saver.serde, record["checkpoint"])
+        metadata = _decode(saver.serde, record["metadata"])
+
+        configurable: Dict[str, Any] = {
+            "thread_id": record["thread_id"],
+            "checkpoint_ns": record["checkpoint_ns"],
+        }
+        if record.get("parent_checkpoint_id"):
+            configurable["checkpoint_id"] = record["parent_checkpoint_id"]
+
+        new_config = saver.put(
+            {"configurable": configurable},
+            checkpoint,
+            metadata,
+            checkpoint.get("channel_versions", {}),
+        )
+
+        for task_id, writes in groupby(record.get("writes", []), key=lambda w: w["task_id"]):
+            saver.put_writes(
+                new_config,
+                [(w["channel"], _decode(saver.serde, w["value"])) for w in writes],
+                task_id,
+            )
+        count += 1
+    return count
+
+
+def _open_sqlite_target(db_path: str) -> SqliteSaver:
+    conn = sqlite3.connect(database=db_path, check_same_thread=False)
+    # A fresh migration target does not need a full fsync per checkpoint.
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return SqliteSaver(conn=conn)
+
+
+def _open_postgres_target(database_url: str):
+    import psycopg
+    from langgraph.checkpoint.postgres import PostgresSaver
+
+    saver = PostgresSaver(psycopg.connect(database_url, **postgres_connection_kwargs()))
+    saver.setup()
+    return saver
+
+
+# -------------------
+# 5. CLI
+# -------------------
+def _detect_format(path: str, explicit: Optional[str]) -> str:
+    if explicit:
+        return explicit
+    return "parquet" if path.endswith(".parquet") else "jsonl"
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Bulk export/import LangGraph conversations.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    export_cmd = sub.add_parser("export", help="Stream checkpoints to JSONL or Parquet.")
+    export_cmd.add_argument("--db", default="chatbot.db", help="Source SQLite checkpoint db.")
+    export_cmd.add_argument("--url", help="Source PostgreSQL connection string (instead of --db).")
+    export_cmd.add_argument("--out", required=True, help="Output file (.jsonl or .parquet).")
+    export_cmd.add_argument("--format", choices=["jsonl", "parquet"])
+    export_cmd.add_argument("--thread", action="append", dest="threads", help="Only export this thread (repeatable).")
+    export_cmd.add_argument("--latest-only", action="store_true", help="Only the latest checkpoint per thread.")
+    export_cmd.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+
+    import_cmd = sub.add_parser("import", help="Load an export into a fresh checkpointer.")
+    import_cmd.add_argument("--src", required=True, help="File produced by `export`.")
+    target = import_cmd.add_mutually_exclusive_group(required=True)
+    target.add_argument("--db", help="Target SQLite checkpoint db.")
+    target.add_argument("--target-url", help="Target PostgreSQL connection string.")
+    import_cmd.add_argument("--format", choices=["jsonl", "parquet"])
+    import_cmd.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        # sqlite3.connect would create an empty db and export nothing
+        if not args.url and not os.path.exists(args.db):
+            export_cmd.error(f"source database {args.db} does not exist")
+        records = iter_records(
+            args.db, args.threads, args.latest_only, args.batch_size, database_url=args.url
+        )
+        if _detect_format(args.out, args.format) == "parquet":
+            count = write_parquet(records, args.out, args.batch_size)
+        else:
+            count = write_jsonl(records, args.out)
+        print(f"Exported {count} checkpoints to {args.out}", file=sys.stderr)
+    else:
+        if _detect_format(args.src, args.format) == "parquet":
+            records = read_parquet(args.src, args.batch_size)
+        else:
+            records = read_jsonl(args.src)
+        if args.target_url:
+            saver = _open_postgres_target(args.target_url)
+        else:
+            saver = _open_sqlite_target(args.db)
+        try:
+            count = import_records(records, saver)
+        finally:
+            saver.conn.close()
+        print(f"Imported {count} checkpoints into {args.target_url or args.db}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,453 @@
+"""
+Hedged chat model requests to cut tail latency.
+
+Most calls answer quickly, but a few stall for seconds before the first token
+and dominate p99 turn latency. `HedgedChatModel` waits up to a deadline taken
+from the model's own recent latency (the HEDGE_PERCENTILE of first-token time
+for streams and sync calls, of full response time for async calls). If
+nothing has arrived by then, it sends the same request again and keeps
+whichever answers first:
+
+    - streams race to the first chunk; the winner's stream is relayed and
+      the other one is cancelled and closed
+    - sync non-streaming calls run the same race and return the winner's
+      chunks merged, so the loser is closed rather than left running
+    - async non-streaming calls race to the full response; the loser is
+      cancelled
+
+Every attempt runs on its own thread (or task), so hedging never caps how
+many calls run at once. An async loser is cancelled wherever it is waiting,
+which drops its connection. A sync loser can only stop between chunks: one
+that stalls before its first chunk keeps its thread and connection until the
+provider answers or times out, and then closes its stream. At most
+HEDGE_MAX_ABANDONED of those may be outstanding per model; past that, slow
+calls are not hedged until one returns.
+
+Duplicate requests cost tokens, so hedges are capped by a budget: every
+request earns HEDGE_BUDGET of a hedge (5% by default, with a small burst).
+`hedge_stats()` reports, per model, how often calls were hedged, how often
+the hedge won, how many hedges the budget (or the abandoned cap) refused,
+how many sync losers are still blocked, the current deadlines and an
+estimate of the latency saved (the mean of past latencies beyond the
+deadline, minus the latency actually delivered).
+
+Wrap outside the scheduler, `hedge(schedule(llm))`, so hedges count against
+the same rate limits as any other call.
+
+Environment Variables:
+    HEDGE_ENABLED: "1"/"true" to hedge model calls (default off)
+    HEDGE_PERCENTILE: latency percentile used as the deadline (default 95)
+    HEDGE_MIN_SAMPLES: samples needed before the percentile is used (default 20)
+    HEDGE_INITIAL_DEADLINE: deadline in seconds until then (default 3)
+    HEDGE_MIN_DEADLINE: lower bound on the deadline in seconds (default 0.3)
+    HEDGE_BUDGET: hedges allowed per request (default 0.05)
+    HEDGE_MAX_ABANDONED: sync losers still blocked in the provider before hedging pauses (default 4)
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import os
+import queue
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, Optional
+
+from dotenv import load_dotenv
+from langchain_core.language_models.chat_models import BaseChatModel, generate_from_stream
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableBinding
+
+from instrumentation import percentile, get_recorder
+
+load_dotenv()
+
+_END = object()
+
+
+def _enabled() -> bool:
+    return os.getenv("HEDGE_ENABLED", "").strip().lower() in ("1", "true", "yes")
+
+
+class LatencyTracker:
+    """Recent latencies of one kind (first token or full response) for one model."""
+
+    def __init__(self, percentile: float = 95, min_samples: int = 20, initial_deadline: float = 3.0,
+                 min_deadline: float = 0.3, window: int = 500):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.initial_deadline = initial_deadline
+        self.min_deadline = min_deadline
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def deadline(self) -> float:
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return self.initial_deadline
+            ordered = sorted(self._samples)
+        return max(self.min_deadline, percentile(ordered, self.percentile))
+
+    def tail_mean(self, threshold: float) -> Optional[float]:
+        """Mean of the samples above `threshold` (what a stalled call usually costs)."""
+        with self._lock:
+            tail = [s for s in self._samples if s > threshold]
+        return sum(tail) / len(tail) if tail else None
+
+
+class HedgeBudget:
+    """Each request earns `ratio` of a hedge, up to `burst` banked hedges."""
+
+    def __init__(self, ratio: float = 0.05, burst: float = 5.0):
+        self.ratio = ratio
+        self.burst = burst
+        self._credit = 1.0
+        self._lock = threading.Lock()
+
+    def earn(self) -> None:
+        with self._lock:
+            self._credit = min(self.burst, self._credit + self.ratio)
+
+    def spend(self) -> bool:
+        with self._lock:
+            if self._credit < 1.0:
+                return False
+            self._credit -= 1.0
+            return True
+
+
+class Hedger:
+    """Deadlines, budget and counters for one model."""
+
+    def __init__(self, name: str, **tracker_options: Any):
+        budget = tracker_options.pop("budget", 0.05)
+        self.max_abandoned = tracker_options.pop("max_abandoned", 4)
+        self.name = name
+        self.first_token = LatencyTracker(**tracker_options)
+        self.response = LatencyTracker(**tracker_options)
+        self.budget = HedgeBudget(budget)
+        self._lock = threading.Lock()
+        self._counts = {"requests": 0, "hedged": 0, "hedge_won": 0, "budget_denied": 0, "abandoned_denied": 0}
+        self._saved = 0.0
+        # Sync attempts that lost (or were dropped) but are still blocked in the provider call
+        self._abandoned = 0
+
+    @classmethod
+    def from_env(cls, name: str) -> "Hedger":
+        return cls(
+            name,
+            percentile=float(os.getenv("HEDGE_PERCENTILE", "95")),
+            min_samples=int(os.getenv("HEDGE_MIN_SAMPLES", "20")),
+            initial_deadline=float(os.getenv("HEDGE_INITIAL_DEADLINE", "3")),
+            min_deadline=float(os.getenv("HEDGE_MIN_DEADLINE", "0.3")),
+            budget=float(os.getenv("HEDGE_BUDGET", "0.05")),
+            max_abandoned=int(os.getenv("HEDGE_MAX_ABANDONED", "4")),
+        )
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._counts[key] += 1
+
+    def start(self) -> None:
+        self._count("requests")
+        self.budget.earn()
+
+    def may_hedge(self) -> bool:
+        with self._lock:
+            full = self._abandoned >= self.max_abandoned
+        if full:
+            self._count("abandoned_denied")
+            return False
+        if self.budget.spend():
+            self._count("hedged")
+            return True
+        self._count("budget_denied")
+        return False
+
+    def abandon(self) -> None:
+        with self._lock:
+            self._abandoned += 1
+
+    def release(self) -> None:
+        with self._lock:
+            self._abandoned -= 1
+
+    def finish(self, tracker: LatencyTracker, deadline: float, latency: float, own_latency: float,
+               hedged: bool, hedge_won: bool) -> None:
+        """`latency` is what the caller saw; `own_latency` is the winner's, from its own start."""
+        saved = 0.0
+        if hedge_won:
+            self._count("hedge_won")
+            tail = tracker.tail_mean(deadline)
+            saved = max(0.0, tail - latency) if tail is not None else 0.0
+            with self._lock:
+                self._saved += saved
+        tracker.observe(own_latency)
+
+        recorder = get_recorder()
+        if recorder is not None:
+            recorder.record({
+                "kind": "hedge",
+                "name": self.name,
+                "duration_ms": round(latency * 1000, 2),
+                "deadline_ms": round(deadline * 1000, 2),
+                "hedged": hedged,
+                "hedge_won": hedge_won,
+                "est_saved_ms": round(saved * 1000, 2),
+            })
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._counts)
+            saved = self._saved
+            abandoned = self._abandoned
+        return {
+            **counts,
+            "abandoned": abandoned,
+            "hedge_rate": round(counts["hedged"] / counts["requests"], 4) if counts["requests"] else 0.0,
+            "first_token_deadline_s": round(self.first_token.deadline(), 3),
+            "response_deadline_s": round(self.response.deadline(), 3),
+            "est_latency_saved_s": round(saved, 3),
+        }
+
+
+class HedgedChatModel(BaseChatModel):
+    """Re-sends a slow request once and keeps the first answer."""
+
+    llm: BaseChatModel
+    hedger: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return f"hedged-{self.llm._llm_type}"
+
+    @property
+    def model_name(self) -> Optional[str]:
+        return getattr(self.llm, "model_name", None) or getattr(self.llm, "model", None)
+
+    def _get_ls_params(self, stop=None, **kwargs):
+        return self.llm._get_ls_params(stop=stop, **kwargs)
+
+    def bind_tools(self, tools, **kwargs):
+        bound = self.llm.bind_tools(tools, **kwargs)
+        return RunnableBinding(bound=self, kwargs=bound.kwargs, config=bound.config)
+
+    # -------------------
+    # Full responses
+    # -------------------
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        # A sync call cannot be cancelled mid-response, but a stream can be closed
+        return generate_from_stream(self._stream(messages, stop=stop, run_manager=run_manager, **kwargs))
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        hedger = self.hedger
+        hedger.start()
+        deadline = hedger.response.deadline()
+        start = time.perf_counter()
+        attempt = lambda: asyncio.ensure_future(
+            self.llm._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        )
+
+        tasks = {attempt(): start}
+        hedged = False
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=deadline)
+            if not done and hedger.may_hedge():
+                hedged = True
+                tasks[attempt()] = time.perf_counter()
+            while True:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                task = next(iter(done))
+                started = tasks.pop(task)
+                if task.exception() is not None and tasks:
+                    continue
+                result = task.result()
+                now = time.perf_counter()
+                hedger.finish(hedger.response, deadline, now - start, now - started, hedged, started != start)
+                return result
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    # -------------------
+    # Streams
+    # -------------------
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        hedger = self.hedger
+        hedger.start()
+        deadline = hedger.first_token.deadline()
+        start = time.perf_counter()
+        events: "queue.Queue[tuple]" = queue.Queue()
+        stops: Dict[int, threading.Event] = {}
+        started: Dict[int, float] = {}
+        lock = threading.Lock()
+        finished: set = set()
+        abandoned: set = set()
+
+        def pump(index: int, stop_event: threading.Event) -> None:
+            stream = self.llm._stream(messages, stop=stop, **kwargs)
+            try:
+                for chunk in stream:
+                    if stop_event.is_set():
+                        break
+                    events.put((index, chunk, None))
+            except Exception as e:
+                events.put((index, _END, e))
+                return
+            finally:
+                stream.close()
+                with lock:
+                    finished.add(index)
+                    released = index in abandoned
+                if released:
+                    hedger.release()
+            events.put((index, _END, None))
+
+        def launch(index: int) -> None:
+            stops[index] = threading.Event()
+            started[index] = time.perf_counter()
+            context = contextvars.copy_context()
+            threading.Thread(target=context.run, args=(pump, index, stops[index]), daemon=True).start()
+
+        def abandon(keep: Optional[int]) -> None:
+            # A pump blocked before its next chunk cannot be interrupted from
+            # here; it closes its stream once the provider returns. Until then
+            # it counts against max_abandoned, which stops further hedging.
+            for index, stop_event in stops.items():
+                if index == keep:
+                    continue
+                stop_event.set()
+                with lock:
+                    if index in finished or index in abandoned:
+                        continue
+                    abandoned.add(index)
+                hedger.abandon()
+
+        launch(0)
+        hedged = False
+        can_hedge = True
+        alive = {0}
+        winner: Optional[int] = None
+        try:
+            while True:
+                timeout = max(0.0, start + deadline - time.perf_counter()) if can_hedge else None
+                try:
+                    index, chunk, error = events.get(timeout=timeout)
+                except queue.Empty:
+                    can_hedge = False
+                    hedged = hedger.may_hedge()
+                    if hedged:
+                        launch(1)
+                        alive.add(1)
+                    continue
+
+                if winner is not None and index != winner:
+                    continue
+                if chunk is _END and error is not None:
+                    alive.discard(index)
+                    if winner is None and alive:
+                        continue
+                    raise error
+
+                if winner is None:
+                    winner = index
+                    can_hedge = False
+                    abandon(keep=index)
+                    now = time.perf_counter()
+                    hedger.finish(hedger.first_token, deadline, now - start, now - started[index],
+                                  hedged, index != 0)
+                if chunk is _END:
+                    return
+                yield chunk
+        finally:
+            abandon(keep=None)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        hedger = self.hedger
+        hedger.start()
+        deadline = hedger.first_token.deadline()
+        start = time.perf_counter()
+        streams: Dict[int, Any] = {}
+        started: Dict[int, float] = {}
+
+        def launch(index: int) -> asyncio.Future:
+            streams[index] = self.llm._astream(messages, stop=stop, **kwargs)
+            started[index] = time.perf_counter()
+            return asyncio.ensure_future(streams[index].__anext__())
+
+        tasks = {launch(0): 0}
+        hedged = False
+        winner: Optional[int] = None
+        first: Optional[ChatGenerationChunk] = None
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=deadline)
+            if not done and hedger.may_hedge():
+                hedged = True
+                tasks[launch(1)] = 1
+            while winner is None:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                task = next(iter(done))
+                index = tasks.pop(task)
+                try:
+                    first = task.result()
+                except StopAsyncIteration:
+                    first = None
+                except Exception:
+                    if tasks:
+                        continue
+                    raise
+                winner = index
+        finally:
+            # Cancel the loser's pending read, then close its stream
+            for task in tasks:
+                task.cancel()
+            for task in tasks:
+                try:
+                    await task
+                except BaseException:
+                    pass
+            for index, stream in streams.items():
+                if index != winner:
+                    await stream.aclose()
+
+        now = time.perf_counter()
+        hedger.finish(hedger.first_token, deadline, now - start, now - started[winner], hedged, winner != 0)
+        stream = streams[winner]
+        try:
+            if first is None:
+                return
+            yield first
+            async for chunk in stream:
+                yield chunk
+        finally:
+            await stream.aclose()
+
+
+# -------------------
+# Process-wide hedgers, one per model
+# -------------------
+_hedgers: Dict[str, Hedger] = {}
+_hedgers_lock = threading.Lock()
+
+
+def hedge(llm: BaseChatModel) -> BaseChatModel:
+    """Wrap a chat model so slow calls are hedged (no-op when HEDGE_ENABLED is off)."""
+    if not _enabled():
+        return llm
+    name = getattr(llm, "model_name", None) or getattr(llm, "model", None) or type(llm).__name__
+    with _hedgers_lock:
+        hedger = _hedgers.get(name)
+        if hedger is None:
+            hedger = _hedgers[name] = Hedger.from_env(name)
+    return HedgedChatModel(llm=llm, hedger=hedger)
+
+
+def hedge_stats() -> Dict[str, Any]:
+    with _hedgers_lock:
+        hedgers = dict(_hedgers)
+    return {name: hedger.stats() for name, hedger in hedgers.items()}
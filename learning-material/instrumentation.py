@@ -0,0 +1,466 @@
+"""
+Latency, token and cost instrumentation shared by the learning-material backends.
+
+Two pieces feed one process-wide `MetricsRecorder`:
+    - `MetricsCallbackHandler`, attached to the compiled graph, times every
+      graph node and tool call and records time-to-first-token, prompt /
+      completion tokens and estimated cost of every chat model call
+    - `InstrumentedCheckpointSaver`, wrapped around the saver, times checkpoint
+      reads/writes and tracks the approximate checkpoint size per thread
+
+Every measurement is appended as one JSON line to a rotating file, and the
+aggregated view (count, mean, p50, p95, max per node/tool/model plus per-thread
+token, cost and checkpoint totals, and the share of prompt tokens served from
+the provider's prompt cache) is available from `metrics_snapshot()` or,
+when METRICS_PORT is set, from http://127.0.0.1:<port>/metrics. Components
+with live state (e.g. circuit breakers) add it to the snapshot through
+`add_gauge(name, fn)`.
+
+Recording is off unless METRICS_ENABLED is set; the helpers then return the
+graph and saver untouched.
+
+Environment Variables:
+    METRICS_ENABLED: "1"/"true" to record metrics (default off)
+    METRICS_JSONL_PATH: rotating JSONL event log (default: metrics.jsonl, "" disables)
+    METRICS_JSONL_MAX_MB: size at which the log rotates (default 10)
+    METRICS_JSONL_BACKUPS: rotated files to keep (default 5)
+    METRICS_PORT: serve the aggregated snapshot on 127.0.0.1 (default off)
+    METRICS_MAX_THREADS: per-thread totals kept in memory (default 1000)
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logging.handlers import RotatingFileHandler
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from dotenv import load_dotenv
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import BaseCheckpointSaver
+
+from checkpoint_cache import DelegatingCheckpointSaver, approx_size
+
+load_dotenv()
+
+# USD per 1M (prompt, completion) tokens; unknown models are reported without cost
+MODEL_PRICES: Dict[str, Tuple[float, float]] = {
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+}
+
+# Latency samples kept per (kind, name) for the percentiles
+_SAMPLES = 1000
+
+
+def _enabled() -> bool:
+    return os.getenv("METRICS_ENABLED", "").strip().lower() in ("1", "true", "yes")
+
+
+def estimate_cost(model: Optional[str], prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+    """Estimated USD cost of one call, matching dated model names by prefix."""
+    if not model:
+        return None
+    for name in sorted(MODEL_PRICES, key=len, reverse=True):
+        if model.startswith(name):
+            prompt_price, completion_price = MODEL_PRICES[name]
+            return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+    return None
+
+
+def percentile(ordered: List[float], pct: float) -> float:
+    """`pct` percentile of already sorted values (0.0 when empty)."""
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _cached_share(totals: Dict[str, Any]) -> float:
+    """Fraction of prompt tokens the provider served from its prefix cache."""
+    prompt_tokens = totals.get("prompt_tokens") or 0
+    return round(totals.get("cached_tokens", 0) / prompt_tokens, 4) if prompt_tokens else 0.0
+
+
+def thread_id_of(metadata: Optional[dict]) -> Optional[str]:
+    """thread_id from run metadata or a config's `configurable`, as a string."""
+    thread_id = (metadata or {}).get("thread_id")
+    return str(thread_id) if thread_id is not None else None
+
+
+# -------------------
+# Recorder
+# -------------------
+class MetricsRecorder:
+    """Thread-safe sink: JSONL event log plus in-memory aggregates."""
+
+    def __init__(
+        self,
+        jsonl_path: Optional[str] = "metrics.jsonl",
+        max_bytes: int = 10 * 1024 * 1024,
+        backups: int = 5,
+        max_threads: int = 1000,
+    ):
+        self.max_threads = max_threads
+        self._lock = threading.Lock()
+        # (kind, name) -> {"count", "errors", "total_ms", "max_ms", "samples"}
+        self._timings: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._threads: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._totals = {"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0, "cost_usd": 0.0}
+        self._gauges: Dict[str, Callable[[], Any]] = {}
+        self._server: Optional[ThreadingHTTPServer] = None
+
+        self._log: Optional[logging.Logger] = None
+        if jsonl_path:
+            handler = RotatingFileHandler(jsonl_path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._log = logging.getLogger(f"langgraph_metrics.{os.path.abspath(jsonl_path)}")
+            self._log.setLevel(logging.INFO)
+            self._log.propagate = False
+            self._log.addHandler(handler)
+
+    def _thread_totals(self, thread_id: str) -> Dict[str, Any]:
+        totals = self._threads.get(thread_id)
+        if totals is None:
+            totals = {
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "cached_tokens": 0,
+                "cost_usd": 0.0,
+                "llm_calls": 0,
+                "checkpoint_writes": 0,
+                "checkpoint_bytes": 0,
+                "checkpoint_bytes_written": 0,
+            }
+            self._threads[thread_id] = totals
+            while len(self._threads) > self.max_threads:
+                self._threads.popitem(last=False)
+        else:
+            self._threads.move_to_end(thread_id)
+        return totals
+
+    def record(self, event: Dict[str, Any]) -> None:
+        """Record one measurement. `kind`, `name` and `duration_ms` are required."""
+        event = {"ts": time.time(), **event}
+        with self._lock:
+            timing = self._timings.setdefault(
+                (event["kind"], event["name"]),
+                {"count": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0, "samples": deque(maxlen=_SAMPLES)},
+            )
+            timing["count"] += 1
+            timing["errors"] += 1 if event.get("error") else 0
+            timing["total_ms"] += event["duration_ms"]
+            timing["max_ms"] = max(timing["max_ms"], event["duration_ms"])
+            timing["samples"].append(event["duration_ms"])
+
+            thread_id = event.get("thread_id")
+            if event["kind"] == "llm":
+                for key in ("prompt_tokens", "completion_tokens", "cached_tokens"):
+                    self._totals[key] += event.get(key) or 0
+                self._totals["cost_usd"] += event.get("cost_usd") or 0.0
+                if thread_id:
+                    totals = self._thread_totals(thread_id)
+                    totals["llm_calls"] += 1
+                    totals["prompt_tokens"] += event.get("prompt_tokens") or 0
+                    totals["completion_tokens"] += event.get("completion_tokens") or 0
+                    totals["cached_tokens"] += event.get("cached_tokens") or 0
+                    totals["cost_usd"] += event.get("cost_usd") or 0.0
+            elif event["kind"] == "checkpoint" and event["name"] == "put" and thread_id:
+                totals = self._thread_totals(thread_id)
+                totals["checkpoint_writes"] += 1
+                # Latest state size, plus what the thread has written in total
+                totals["checkpoint_bytes"] = event.get("approx_bytes", 0)
+                totals["checkpoint_bytes_written"] += event.get("approx_bytes", 0)
+
+        if self._log is not None:
+            self._log.info(json.dumps(event, default=str))
+
+    def add_gauge(self, name: str, fn: Callable[[], Any]) -> None:
+        """Include `fn()` under snapshot()["gauges"][name], evaluated on every snapshot."""
+        with self._lock:
+            self._gauges[name] = fn
+
+    def _read_gauges(self) -> Dict[str, Any]:
+        with self._lock:
+            gauges = dict(self._gauges)
+        values = {}
+        for name, fn in gauges.items():
+            try:
+                values[name] = fn()
+            except Exception as e:
+                values[name] = {"error": str(e)}
+        return values
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Aggregated view: latency per node/tool/model/checkpoint op, tokens and cost per thread."""
+        # Outside the lock: gauges may take their own locks
+        gauges = self._read_gauges()
+        with self._lock:
+            timings: Dict[str, Dict[str, Any]] = {}
+            for (kind, name), timing in self._timings.items():
+                ordered = sorted(timing["samples"])
+                timings.setdefault(kind, {})[name] = {
+                    "count": timing["count"],
+                    "errors": timing["errors"],
+                    "mean_ms": round(timing["total_ms"] / timing["count"], 2),
+                    "p50_ms": round(percentile(ordered, 50), 2),
+                    "p95_ms": round(percentile(ordered, 95), 2),
+                    "max_ms": round(timing["max_ms"], 2),
+                }
+            return {
+                "timings": timings,
+                "totals": {**self._totals, "cached_share": _cached_share(self._totals)},
+                "threads": {
+                    thread_id: {**totals, "cached_share": _cached_share(totals)}
+                    for thread_id, totals in self._threads.items()
+                },
+                "gauges": gauges,
+            }
+
+    def serve(self, port: int) -> None:
+        """Expose `snapshot()` as JSON on http://127.0.0.1:<port>/metrics in a daemon thread."""
+        recorder = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") != "/metrics":
+                    self.send_error(404)
+                    return
+                body = json.dumps(recorder.snapshot(), default=str).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+
+
+# -------------------
+# Graph callbacks
+# -------------------
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """Times graph nodes, tools and chat model calls and reports them to a recorder."""
+
+    # Only does dict bookkeeping, so async graphs need not hop to an executor
+    run_inline = True
+
+    def __init__(self, recorder: MetricsRecorder):
+        self.recorder = recorder
+        # run_id -> open measurement
+        self._runs: Dict[UUID, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id: UUID, kind: str, name: str, metadata: Optional[dict], **extra: Any) -> None:
+        with self._lock:
+            self._runs[run_id] = {
+                "kind": kind,
+                "name": name,
+                "thread_id": thread_id_of(metadata),
+                "start": time.perf_counter(),
+                **extra,
+            }
+
+    def _finish(self, run_id: UUID, error: Optional[BaseException] = None, **fields: Any) -> None:
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        start = run.pop("start")
+        first_token = run.pop("first_token", None)
+        event = {**run, "duration_ms": round((time.perf_counter() - start) * 1000, 2), **fields}
+        if first_token is not None:
+            event["ttft_ms"] = round((first_token - start) * 1000, 2)
+        if error is not None:
+            event["error"] = type(error).__name__
+        self.recorder.record(event)
+
+    # Graph nodes: the node's own run is named after it; inner runs share its metadata
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, tags=None, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        if node and kwargs.get("name") == node:
+            self._start(run_id, "node", node, metadata)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._finish(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, error)
+
+    # Tools
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, tags=None, metadata=None, **kwargs):
+        name = kwargs.get("name") or (serialized or {}).get("name") or "tool"
+        self._start(run_id, "tool", name, metadata)
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._finish(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, error)
+
+    # Chat models
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, tags=None, metadata=None, **kwargs):
+        model = (metadata or {}).get("ls_model_name") or kwargs.get("name") or "chat_model"
+        self._start(run_id, "llm", model, metadata, node=(metadata or {}).get("langgraph_node"))
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        run = self._runs.get(run_id)
+        if run is not None and "first_token" not in run:
+            run["first_token"] = time.perf_counter()
+
+    def on_llm_end(self, response: LLMResult, *, run_id, **kwargs):
+        with self._lock:
+            run = self._runs.get(run_id)
+        model = run["name"] if run else None
+
+        prompt_tokens = completion_tokens = cached_tokens = 0
+        found = False
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    found = True
+                    prompt_tokens += usage.get("input_tokens", 0)
+                    completion_tokens += usage.get("output_tokens", 0)
+                    cached_tokens += (usage.get("input_token_details") or {}).get("cache_read", 0) or 0
+        if not found:
+            token_usage = (response.llm_output or {}).get("token_usage") or {}
+            prompt_tokens = token_usage.get("prompt_tokens", 0)
+            completion_tokens = token_usage.get("completion_tokens", 0)
+            cached_tokens = (token_usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0) or 0
+
+        self._finish(
+            run_id,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            cached_tokens=cached_tokens,
+            cost_usd=estimate_cost(model, prompt_tokens, completion_tokens),
+        )
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, error)
+
+
+# -------------------
+# Checkpointer wrapper
+# -------------------
+class InstrumentedCheckpointSaver(DelegatingCheckpointSaver):
+    """Times checkpoint reads and writes and tracks checkpoint size per thread."""
+
+    def __init__(self, saver: BaseCheckpointSaver, recorder: MetricsRecorder):
+        super().__init__(saver)
+        self.recorder = recorder
+
+    def _record(self, name: str, config: Optional[RunnableConfig], start: float, **fields: Any) -> None:
+        thread_id = ((config or {}).get("configurable") or {}).get("thread_id")
+        self.recorder.record({
+            "kind": "checkpoint",
+            "name": name,
+            "thread_id": str(thread_id) if thread_id is not None else None,
+            "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+            **fields,
+        })
+
+    # Sync API
+    def get_tuple(self, config):
+        start = time.perf_counter()
+        checkpoint_tuple = self.saver.get_tuple(config)
+        self._record("get_tuple", config, start, found=checkpoint_tuple is not None)
+        return checkpoint_tuple
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        start = time.perf_counter()
+        new_config = self.saver.put(config, checkpoint, metadata, new_versions)
+        self._record("put", config, start, approx_bytes=approx_size(checkpoint["channel_values"]))
+        return new_config
+
+    def put_writes(self, config, writes, task_id, task_path: str = ""):
+        start = time.perf_counter()
+        self.saver.put_writes(config, writes, task_id, task_path)
+        self._record("put_writes", config, start, writes=len(writes))
+
+    # Async API
+    async def aget_tuple(self, config):
+        start = time.perf_counter()
+        checkpoint_tuple = await self.saver.aget_tuple(config)
+        self._record("get_tuple", config, start, found=checkpoint_tuple is not None)
+        return checkpoint_tuple
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        start = time.perf_counter()
+        new_config = await self.saver.aput(config, checkpoint, metadata, new_versions)
+        self._record("put", config, start, approx_bytes=approx_size(checkpoint["channel_values"]))
+        return new_config
+
+    async def aput_writes(self, config, writes, task_id, task_path: str = ""):
+        start = time.perf_counter()
+        await self.saver.aput_writes(config, writes, task_id, task_path)
+        self._record("put_writes", config, start, writes=len(writes))
+
+
+# -------------------
+# Public helpers
+# -------------------
+_recorder: Optional[MetricsRecorder] = None
+_recorder_lock = threading.Lock()
+
+
+def get_recorder() -> Optional[MetricsRecorder]:
+    """Process-wide recorder, or None when METRICS_ENABLED is off."""
+    global _recorder
+
+    if not _enabled():
+        return None
+    with _recorder_lock:
+        if _recorder is None:
+            _recorder = MetricsRecorder(
+                jsonl_path=os.getenv("METRICS_JSONL_PATH", "metrics.jsonl") or None,
+                max_bytes=int(float(os.getenv("METRICS_JSONL_MAX_MB", "10")) * 1024 * 1024),
+                backups=int(os.getenv("METRICS_JSONL_BACKUPS", "5")),
+                max_threads=int(os.getenv("METRICS_MAX_THREADS", "1000")),
+            )
+            port = os.getenv("METRICS_PORT")
+            if port:
+                try:
+                    _recorder.serve(int(port))
+                    print(f"✅ Metrics available at http://127.0.0.1:{port}/metrics")
+                except OSError as e:
+                    print(f"⚠️ Metrics endpoint not started: {str(e)}")
+        return _recorder
+
+
+def metrics_callbacks() -> list:
+    """Callbacks to attach to a compiled graph (empty when metrics are off)."""
+    recorder = get_recorder()
+    return [MetricsCallbackHandler(recorder)] if recorder is not None else []
+
+
+def instrument_graph(graph: Any) -> Any:
+    """Attach the metrics callbacks to a compiled graph (no-op when metrics are off)."""
+    callbacks = metrics_callbacks()
+    return graph.with_config(callbacks=callbacks) if callbacks else graph
+
+
+def instrument_checkpointer(saver: BaseCheckpointSaver) -> BaseCheckpointSaver:
+    """Wrap a saver so its reads and writes are timed (no-op when metrics are off)."""
+    recorder = get_recorder()
+    return InstrumentedCheckpointSaver(saver, recorder) if recorder is not None else saver
+
+
+def metrics_snapshot() -> Dict[str, Any]:
+    recorder = get_recorder()
+    return recorder.snapshot() if recorder is not None else {}
@@ -1,29 +1,56 @@
 from langgraph.graph import StateGraph, START, END
-from typing import TypedDict, Annotated
+from typing import TypedDict, Annotated, Optional
 from langchain_core.messages import BaseMessage
-from langchain_openai import ChatOpenAI
 from langgraph.checkpoint.memory import InMemorySaver
 from langgraph.graph.message import add_messages
 from dotenv import load_dotenv
+from context_window import ContextWindow
+from instrumentation import instrument_checkpointer, instrument_graph
+from lazy import Lazy, lazy_attributes
+from llm_scheduler import schedule
+from hedging import hedge
 
 load_dotenv()
 
-llm = ChatOpenAI()
+
+def _build_llm():
+    from langchain_openai import ChatOpenAI
+
+    return hedge(schedule(ChatOpenAI(stream_usage=True)))
+
+
+get_llm = Lazy(_build_llm).get
+get_context_window = Lazy(lambda: ContextWindow.from_env(summarizer=get_llm())).get
 
 class ChatState(TypedDict):
     messages: Annotated[list[BaseMessage], add_messages]
+    summary: str
+    summary_until: Optional[str]
 
 def chat_node(state: ChatState):
-    messages = state['messages']
-    response = llm.invoke(messages)
-    return {"messages": [response]}
+    messages, summary_updates = get_context_window().prepare(state)
+    response = get_llm().invoke(messages)
+    return {"messages": [response], **summary_updates}
 
 # Checkpointer
-checkpointer = InMemorySaver()
+get_checkpointer = Lazy(lambda: instrument_checkpointer(InMemorySaver())).get
+
+
+def _build_chatbot():
+    graph = StateGraph(ChatState)
+    graph.add_node("chat_node", chat_node)
+    graph.add_edge(START, "chat_node")
+    graph.add_edge("chat_node", END)
+
+    return instrument_graph(graph.compile(checkpointer=get_checkpointer()))
+
 
-graph = StateGraph(ChatState)
-graph.add_node("chat_node", chat_node)
-graph.add_edge(START, "chat_node")
-graph.add_edge("chat_node", END)
+get_chatbot = Lazy(_build_chatbot).get
 
-chatbot = graph.compile(checkpointer=checkpointer)
+# `from langgraph_backend import chatbot` builds the graph on first access
+__getattr__ = lazy_attributes(__name__, {
+    "llm": get_llm,
+    "context_window": get_context_window,
+    "checkpointer": get_checkpointer,
+    "chatbot": get_chatbot,
+})
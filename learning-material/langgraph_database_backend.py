@@ -1,40 +1,63 @@
 from langgraph.graph import StateGraph, START, END
-from typing import TypedDict, Annotated
+from typing import TypedDict, Annotated, Optional
 from langchain_core.messages import BaseMessage, HumanMessage
-from langchain_openai import ChatOpenAI
-from langgraph.checkpoint.sqlite import SqliteSaver
 from langgraph.graph.message import add_messages
 from dotenv import load_dotenv
-import sqlite3
+from checkpointer_config import get_checkpointer
+from context_window import ContextWindow
+from instrumentation import instrument_graph
+from lazy import Lazy, lazy_attributes
+from llm_scheduler import schedule
+from hedging import hedge
 
 load_dotenv()
 
-llm = ChatOpenAI()
+
+def _build_llm():
+    from langchain_openai import ChatOpenAI
+
+    return hedge(schedule(ChatOpenAI(stream_usage=True)))
+
+
+get_llm = Lazy(_build_llm).get
+get_context_window = Lazy(lambda: ContextWindow.from_env(summarizer=get_llm())).get
 
 class ChatState(TypedDict):
     messages: Annotated[list[BaseMessage], add_messages]
+    summary: str
+    summary_until: Optional[str]
 
 def chat_node(state: ChatState):
-    messages = state['messages']
-    response = llm.invoke(messages)
-    return {"messages": [response]}
+    messages, summary_updates = get_context_window().prepare(state)
+    response = get_llm().invoke(messages)
+    return {"messages": [response], **summary_updates}
+
+# Checkpointer (SQLite by default, pooled Postgres when configured);
+# get_checkpointer() opens it on first use
+
+
+def _build_chatbot():
+    graph = StateGraph(ChatState)
+    graph.add_node("chat_node", chat_node)
+    graph.add_edge(START, "chat_node")
+    graph.add_edge("chat_node", END)
 
-conn = sqlite3.connect(database='chatbot.db', check_same_thread=False)
-# Checkpointer
-checkpointer = SqliteSaver(conn=conn)
+    return instrument_graph(graph.compile(checkpointer=get_checkpointer()))
 
-graph = StateGraph(ChatState)
-graph.add_node("chat_node", chat_node)
-graph.add_edge(START, "chat_node")
-graph.add_edge("chat_node", END)
 
-chatbot = graph.compile(checkpointer=checkpointer)
+get_chatbot = Lazy(_build_chatbot).get
 
 def retrieve_all_threads():
     all_threads = set()
-    for checkpoint in checkpointer.list(None):
+    for checkpoint in get_checkpointer().list(None):
         all_threads.add(checkpoint.config['configurable']['thread_id'])
 
     return list(all_threads)
 
 
+__getattr__ = lazy_attributes(__name__, {
+    "llm": get_llm,
+    "context_window": get_context_window,
+    "checkpointer": get_checkpointer,
+    "chatbot": get_chatbot,
+})
@@ -1,139 +1,373 @@
 from langgraph.graph import StateGraph, START, END
-from typing import TypedDict, Annotated
+from typing import TypedDict, Annotated, Optional
 from langchain_core.messages import BaseMessage, HumanMessage
-from langchain_openai import ChatOpenAI
-from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
 from langgraph.graph.message import add_messages
-from langgraph.prebuilt import ToolNode, tools_condition
-from langchain_community.tools import DuckDuckGoSearchRun
-from langchain_core.tools import tool, BaseTool
-from langchain_mcp_adapters.client import MultiServerMCPClient
+from langgraph.prebuilt import tools_condition
+from langchain_core.tools import BaseTool
 from dotenv import load_dotenv
-import aiosqlite
-import requests
+from checkpointer_config import get_async_checkpointer
+from context_window import ContextWindow
+from tool_executor import ConcurrentToolNode
+from market_data import get_stock_price, get_stock_prices
+from web_search import get_search_tool
+from tool_cache import ToolCachePolicy, cached_tools, register_policy
+from instrumentation import get_recorder, instrument_graph
+from lazy import Lazy, lazy_attributes
+from llm_scheduler import schedule
+from hedging import hedge
+from model_router import ModelRouter
+from prompt_assembly import PromptAssembler
+from mcp_tool_cache import ToolSchemaCache, fetch_tool_schemas
+from mcp_session_pool import MCPSessionPool, pool_enabled
+from stream_bridge import AsyncStreamBridge
+from loop_executor import LoopBoundCheckpointSaver, LoopExecutor, LoopLocalChatModel
+from loop_monitor import InflightCheckpointSaver, LoopMonitor, log_periodically, monitoring_enabled
+from circuit_breaker import CircuitBreaker, breaker_stats, breaker_tools, get_breaker
 import asyncio
-import threading
+import os
+import time
 
 load_dotenv()
 
-# Dedicated async loop for backend tasks
-_ASYNC_LOOP = asyncio.new_event_loop()
-_ASYNC_THREAD = threading.Thread(target=_ASYNC_LOOP.run_forever, daemon=True)
-_ASYNC_THREAD.start()
+# Event loops for backend tasks (ASYNC_LOOPS), started on first use. Each
+# conversation is pinned to one loop; shared resources live on the home loop.
+def _build_executor() -> LoopExecutor:
+    executor = LoopExecutor.from_env()
+    if monitoring_enabled():
+        monitors = [
+            LoopMonitor.from_env(loop, name=str(index), executor=executor)
+            for index, loop in enumerate(executor.loops)
+        ]
+        for monitor in monitors:
+            monitor.start()
+        _loop_monitors.extend(monitors)
+        recorder = get_recorder()
+        if recorder is not None:
+            recorder.add_gauge("event_loops", loop_snapshot)
+        log_seconds = float(os.getenv("LOOP_MONITOR_LOG_SECONDS", "0"))
+        if log_seconds > 0:
+            executor.submit(log_periodically(monitors, log_seconds))
+    return executor
 
 
-def _submit_async(coro):
-    return asyncio.run_coroutine_threadsafe(coro, _ASYNC_LOOP)
+_loop_monitors: list[LoopMonitor] = []
+get_executor = Lazy(_build_executor).get
 
 
-def run_async(coro):
-    return _submit_async(coro).result()
+def loop_snapshot() -> dict:
+    """Lag, slow callbacks, tasks and queue depth per backend loop (empty unless LOOP_MONITOR_ENABLED)."""
+    get_executor()
+    return {monitor.name: monitor.snapshot() for monitor in _loop_monitors}
 
 
-def submit_async_task(coro):
-    """Schedule a coroutine on the backend event loop."""
-    return _submit_async(coro)
+def _get_loop() -> asyncio.AbstractEventLoop:
+    return get_executor().home_loop
+
+
+def run_async(coro, thread_id=None):
+    """Run a coroutine on the backend loop of `thread_id` (the home loop if None) and wait."""
+    return get_executor().run(coro, thread_id=thread_id)
+
+
+def submit_async_task(coro, thread_id=None):
+    """Schedule a coroutine on the backend loop of `thread_id` (the home loop if None)."""
+    return get_executor().submit(coro, thread_id=thread_id)
+
+
+def stream_sync(aiterable, maxsize=None, timeout=None, thread_id=None) -> AsyncStreamBridge:
+    """Iterate an async stream (e.g. `chatbot.astream(...)`) from sync code.
+
+    Runs on the conversation's backend loop with at most `maxsize` items
+    buffered; closing the iterator cancels the stream.
+    """
+    loop = get_executor().loop_for(thread_id)
+    return AsyncStreamBridge(aiterable, loop, maxsize=maxsize, timeout=timeout)
 
 
 # -------------------
 # 1. LLM
 # -------------------
-llm = ChatOpenAI()
+def _build_llm(model: Optional[str] = None):
+    from langchain_openai import ChatOpenAI
+
+    kwargs = {"model": model} if model else {}
+    if len(get_executor().loops) == 1:
+        llm = ChatOpenAI(stream_usage=True, **kwargs)
+    else:
+        import openai
+
+        # ChatOpenAI shares one async HTTP client process-wide; each loop needs its own
+        llm = LoopLocalChatModel(factory=lambda: ChatOpenAI(
+            stream_usage=True, http_async_client=openai.DefaultAsyncHttpxClient(), **kwargs,
+        ))
+    return hedge(schedule(llm))
+
+
+get_llm = Lazy(_build_llm).get
+get_context_window = Lazy(lambda: ContextWindow.from_env(summarizer=get_llm())).get
 
 # -------------------
 # 2. Tools
 # -------------------
-search_tool = DuckDuckGoSearchRun(region="us-en")
+search_tool = get_search_tool()
+
+
+MCP_SERVERS = {
+    "arith": {
+        "transport": "stdio",
+        "command": "python3",
+        "args": ["/Users/nitish/Desktop/mcp-math-server/main.py"],
+    },
+    "expense": {
+        "transport": "streamable_http",  # if this fails, try "sse"
+        "url": "https://splendid-gold-dingo.fastmcp.app/mcp"
+    }
+}
 
 
-@tool
-def get_stock_price(symbol: str) -> dict:
-    """
-    Fetch latest stock price for a given symbol (e.g. 'AAPL', 'TSLA') 
-    using Alpha Vantage with API key in the URL.
-    """
-    url = f"https://www.alphavantage.co/query?function=GLOBAL_QUOTE&symbol={symbol}&apikey=C9PE94QUEW9VWGFM"
-    r = requests.get(url)
-    return r.json()
-
-
-client = MultiServerMCPClient(
-    {
-        "arith": {
-            "transport": "stdio",
-            "command": "python3",
-            "args": ["/Users/nitish/Desktop/mcp-math-server/main.py"],
-        },
-        "expense": {
-            "transport": "streamable_http",  # if this fails, try "sse"
-            "url": "https://splendid-gold-dingo.fastmcp.app/mcp"
-        }
-    }
-)
+def _build_client():
+    from langchain_mcp_adapters.client import MultiServerMCPClient
+
+    return MultiServerMCPClient(MCP_SERVERS)
+
+
+get_client = Lazy(_build_client).get
+
+
+# Servers whose tools are pure functions of their arguments. The expense
+# server writes data and must never be served from the cache.
+CACHEABLE_MCP_SERVERS = {"arith": ToolCachePolicy(ttl_seconds=3600)}
+
+get_schema_cache = Lazy(ToolSchemaCache.from_env).get
+
+
+def _build_session_pool():
+    # Sessions live on the backend loop; they open in the background from here on
+    pool = MCPSessionPool.from_env(get_client().session, MCP_SERVERS)
+    pool.start(_get_loop())
+    return pool
+
+
+get_session_pool = Lazy(_build_session_pool).get
+
 
+def mcp_pool_stats() -> dict:
+    """Per-server session pool counters, empty while the pool is off."""
+    return get_session_pool().stats() if pool_enabled() else {}
 
-def load_mcp_tools() -> list[BaseTool]:
-    try:
-        return run_async(client.get_tools())
-    except Exception:
-        return []
 
+def _build_breakers() -> dict[str, CircuitBreaker]:
+    breakers = {}
+    for server in MCP_SERVERS:
+        breaker = breakers[server] = get_breaker(f"mcp:{server}")
+        # Rebind so the tool descriptions the model sees follow the breaker
+        breaker.on_change(lambda b: _rebuild_tools(f"{b.name} circuit {b.state}"))
+    recorder = get_recorder()
+    if recorder is not None:
+        recorder.add_gauge("circuit_breakers", breaker_stats)
+        recorder.add_gauge("mcp_pool", mcp_pool_stats)
+    return breakers
 
-mcp_tools = load_mcp_tools()
 
-tools = [search_tool, get_stock_price, *mcp_tools]
-llm_with_tools = llm.bind_tools(tools) if tools else llm
+get_breakers = Lazy(_build_breakers).get
+
+
+def _server_tools(server: str, schemas: list[dict]) -> list[BaseTool]:
+    from langchain_mcp_adapters.tools import convert_mcp_tool_to_langchain_tool
+    from mcp.types import Tool as MCPTool
+
+    # Pooled sessions when enabled; otherwise each call opens its own, like client.get_tools()
+    session = get_session_pool().session_for(server) if pool_enabled() else None
+    server_tools = [
+        convert_mcp_tool_to_langchain_tool(session, MCPTool.model_validate(schema), connection=MCP_SERVERS[server])
+        for schema in schemas
+    ]
+    if server in CACHEABLE_MCP_SERVERS:
+        for mcp_tool in server_tools:
+            register_policy(mcp_tool.name, CACHEABLE_MCP_SERVERS[server])
+    # Fail fast while the server is down; the model sees it in the descriptions
+    server_tools = breaker_tools(server_tools, get_breakers()[server])
+    # Stable order keeps the bound tool schemas, and so the prompt prefix, identical
+    return sorted(server_tools, key=lambda t: t.name)
+
+
+async def _fetch_all(client, servers: list[str]) -> list:
+    return await asyncio.gather(*(fetch_tool_schemas(client, s) for s in servers), return_exceptions=True)
+
+
+def load_mcp_tools(fetch_missing: bool = True) -> list[BaseTool]:
+    """MCP tools from the schema cache; servers never seen before are listed now."""
+    client = get_client()
+    cache = get_schema_cache()
+    schemas = {server: cache.get(server, connection) for server, connection in client.connections.items()}
+
+    missing = [server for server, entry in schemas.items() if entry is None]
+    if missing and fetch_missing:
+        for server, result in zip(missing, run_async(_fetch_all(client, missing))):
+            if isinstance(result, BaseException):
+                print(f"⚠️ MCP server {server} unavailable, retrying in the background: {str(result)}")
+                continue
+            cache.put(server, client.connections[server], result)
+            schemas[server] = result
+
+    tools = []
+    for server, entry in schemas.items():
+        if entry is not None:
+            tools.extend(_server_tools(server, entry))
+    return tools
+
+
+async def _refresh_tool_schemas_forever():
+    """Re-list stale or missing servers and rebind the tools when a schema changed."""
+    client = get_client()
+    cache = get_schema_cache()
+    servers = list(client.connections)
+    while True:
+        due = [s for s in servers if cache.is_stale(s) or cache.get(s, client.connections[s]) is None]
+        changed = failed = False
+        for server, result in zip(due, await _fetch_all(client, due)):
+            if isinstance(result, BaseException):
+                failed = True
+                print(f"⚠️ Could not refresh tools of MCP server {server}: {str(result)}")
+                continue
+            changed |= cache.put(server, client.connections[server], result)
+        if changed:
+            # Off the loop: rebuilding may resolve other lazies that use run_async
+            await asyncio.to_thread(_rebuild_tools)
+        delay = cache.next_refresh_in(servers)
+        await asyncio.sleep(max(1.0, min(delay, cache.retry_seconds) if failed else delay))
+
+
+_refresher = Lazy(lambda: submit_async_task(_refresh_tool_schemas_forever()))
+
+
+def _build_tools():
+    # Once the refresher runs it owns listing unreachable servers; don't block on them again
+    tools = cached_tools([
+        search_tool, get_stock_price, get_stock_prices,
+        *load_mcp_tools(fetch_missing=not _refresher.ready),
+    ])
+    _refresher.get()
+    return tools
+
+
+# Bound from the schema cache; MCP servers are only contacted for unknown servers
+_tools = Lazy(_build_tools)
+get_tools = _tools.get
+
+
+def _bind_tools(llm):
+    tools = get_tools()
+    return llm.bind_tools(tools) if tools else llm
+
+
+_llm_with_tools = Lazy(lambda: _bind_tools(get_llm()))
+get_llm_with_tools = _llm_with_tools.get
+_router = Lazy(lambda: ModelRouter.from_env(
+    default=get_llm_with_tools,
+    build=lambda model: _bind_tools(_build_llm(model)),
+))
+get_router = _router.get
+
+
+def _rebuild_tools(reason: str = "MCP tool schemas changed"):
+    """Swap in the current MCP tools (schemas, breaker notes) without restarting the graph."""
+    _tools.reset()
+    _llm_with_tools.reset()
+    if _router.ready:
+        get_router().refresh()
+    if _tool_node.ready and get_tool_node() is not None:
+        get_tool_node().set_tools(get_tools())
+    print(f"✅ {reason}, rebound {len(get_tools())} tools")
+
+
+# Network tools fail fast; everything else uses TOOL_TIMEOUT_SECONDS
+TOOL_TIMEOUTS = {"duckduckgo_search": 15, "get_stock_price": 10, "get_stock_prices": 15}
+# Budget for all tool calls of one turn, propagated into each MCP call
+TURN_DEADLINE_SECONDS = float(os.getenv("TURN_DEADLINE_SECONDS", "60"))
 
 # -------------------
 # 3. State
 # -------------------
 class ChatState(TypedDict):
     messages: Annotated[list[BaseMessage], add_messages]
+    summary: str
+    summary_until: Optional[str]
+    # Epoch seconds by which the current turn should be answered
+    turn_deadline: Optional[float]
 
 # -------------------
 # 4. Nodes
 # -------------------
-async def chat_node(state: ChatState):
-    """LLM node that may answer or request a tool call."""
-    messages = state["messages"]
-    response = await llm_with_tools.ainvoke(messages)
-    return {"messages": [response]}
+# Fixed text ahead of the history keeps the prompt prefix cacheable
+SYSTEM_PROMPT = (
+    "You are a helpful assistant. Use the web search and stock price tools and "
+    "the tools from the connected MCP servers when helpful."
+)
+prompt_assembler = PromptAssembler(SYSTEM_PROMPT)
 
 
-tool_node = ToolNode(tools) if tools else None
+async def chat_node(state: ChatState, config=None):
+    """LLM node that may answer or request a tool call."""
+    updates = {}
+    if isinstance(state["messages"][-1], HumanMessage):
+        # A new turn; the tool node gives each call at most what is left of it
+        updates["turn_deadline"] = time.time() + TURN_DEADLINE_SECONDS
+    history, summary_updates = await get_context_window().aprepare(state)
+    messages = prompt_assembler.assemble(history)
+    response = await get_router().ainvoke(messages, history=state["messages"], config=config)
+    return {"messages": [response], **summary_updates, **updates}
+
 
 # -------------------
 # 5. Checkpointer
 # -------------------
+def _open_checkpointer():
+    # Opened on the home loop, which the async savers are bound to
+    saver = run_async(get_async_checkpointer())
+    executor = get_executor()
+    if monitoring_enabled():
+        saver = InflightCheckpointSaver(saver)
+    return LoopBoundCheckpointSaver(saver, executor.home_loop) if len(executor.loops) > 1 else saver
 
 
-async def _init_checkpointer():
-    conn = await aiosqlite.connect(database="chatbot.db")
-    return AsyncSqliteSaver(conn)
-
-
-checkpointer = run_async(_init_checkpointer())
+get_checkpointer = Lazy(_open_checkpointer).get
 
 # -------------------
 # 6. Graph
 # -------------------
-graph = StateGraph(ChatState)
-graph.add_node("chat_node", chat_node)
-graph.add_edge(START, "chat_node")
+def _build_tool_node():
+    tools = get_tools()
+    return ConcurrentToolNode(tools, timeouts=TOOL_TIMEOUTS, deadline_key="turn_deadline") if tools else None
+
+
+_tool_node = Lazy(_build_tool_node)
+get_tool_node = _tool_node.get
+
+
+def _build_chatbot():
+    tool_node = get_tool_node()
+
+    graph = StateGraph(ChatState)
+    graph.add_node("chat_node", chat_node)
+    graph.add_edge(START, "chat_node")
+
+    if tool_node:
+        graph.add_node("tools", tool_node)
+        graph.add_conditional_edges("chat_node", tools_condition)
+        graph.add_edge("tools", "chat_node")
+    else:
+        graph.add_edge("chat_node", END)
+
+    return instrument_graph(graph.compile(checkpointer=get_checkpointer()))
 
-if tool_node:
-    graph.add_node("tools", tool_node)
-    graph.add_conditional_edges("chat_node", tools_condition)
-    graph.add_edge("tools", "chat_node")
-else:
-    graph.add_edge("chat_node", END)
 
-chatbot = graph.compile(checkpointer=checkpointer)
+get_chatbot = Lazy(_build_chatbot).get
 
 # -------------------
 # 7. Helper
 # -------------------
-async def _alist_threads():
+async def _alist_threads(checkpointer):
     all_threads = set()
     async for checkpoint in checkpointer.alist(None):
         all_threads.add(checkpoint.config["configurable"]["thread_id"])
@@ -141,4 +375,21 @@ async def _alist_threads():
 
 
 def retrieve_all_threads():
-    return run_async(_alist_threads())
+    # Resolve the saver here: opening it from inside the loop would deadlock
+    return run_async(_alist_threads(get_checkpointer()))
+
+
+# `from langgraph_mcp_backend import chatbot` builds the graph on first access
+__getattr__ = lazy_attributes(__name__, {
+    "llm": get_llm,
+    "llm_with_tools": get_llm_with_tools,
+    "router": get_router,
+    "context_window": get_context_window,
+    "client": get_client,
+    "executor": get_executor,
+    "session_pool": get_session_pool,
+    "breakers": get_breakers,
+    "tools": get_tools,
+    "checkpointer": get_checkpointer,
+    "chatbot": get_chatbot,
+})
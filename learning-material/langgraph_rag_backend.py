@@ -1,31 +1,54 @@
 from __future__ import annotations
 
+import hashlib
 import os
-import sqlite3
 import tempfile
+from functools import partial
 from typing import Annotated, Any, Dict, Optional, TypedDict
 
 from dotenv import load_dotenv
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_community.tools import DuckDuckGoSearchRun
-from langchain_community.vectorstores import FAISS
-from langchain_core.messages import BaseMessage, SystemMessage
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from langchain_core.runnables import RunnableConfig
 from langchain_core.tools import tool
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langgraph.checkpoint.sqlite import SqliteSaver
 from langgraph.graph import START, StateGraph
 from langgraph.graph.message import add_messages
-from langgraph.prebuilt import ToolNode, tools_condition
-import requests
+from langgraph.prebuilt import tools_condition
+
+from checkpointer_config import get_checkpointer
+from llm_cache import invoke_with_cache
+from context_window import ContextWindow
+from tool_executor import ConcurrentToolNode
+from market_data import get_stock_price, get_stock_prices
+from web_search import get_search_tool
+from tool_cache import cacheable, cached_tools, clear_tool_cache
+from instrumentation import instrument_graph
+from lazy import Lazy, lazy_attributes
+from llm_scheduler import schedule
+from hedging import hedge
+from model_router import ModelRouter
+from prompt_assembly import PromptAssembler, config_thread_id
+from speculative_retrieval import RetrievalPrefetcher, speculative_mode
 
 load_dotenv()
 
 # -------------------
 # 1. LLM + embeddings
 # -------------------
-llm = ChatOpenAI(model="gpt-4o-mini")
-embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
+def _build_llm(model: Optional[str] = None):
+    from langchain_openai import ChatOpenAI
+
+    return hedge(schedule(ChatOpenAI(model=model or "gpt-4o-mini", stream_usage=True)))
+
+
+def _build_embeddings():
+    from langchain_openai import OpenAIEmbeddings
+
+    return OpenAIEmbeddings(model="text-embedding-3-small")
+
+
+get_llm = Lazy(_build_llm).get
+get_embeddings = Lazy(_build_embeddings).get
+get_context_window = Lazy(lambda: ContextWindow.from_env(summarizer=get_llm())).get
 
 # -------------------
 # 2. PDF retriever store (per thread)
@@ -50,6 +73,11 @@ def ingest_pdf(file_bytes: bytes, thread_id: str, filename: Optional[str] = None
     if not file_bytes:
         raise ValueError("No bytes received for ingestion.")
 
+    # PDF parsing and FAISS are only needed once a document is uploaded
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    from langchain_community.document_loaders import PyPDFLoader
+    from langchain_community.vectorstores import FAISS
+
     with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_file:
         temp_file.write(file_bytes)
         temp_path = temp_file.name
@@ -63,7 +91,7 @@ def ingest_pdf(file_bytes: bytes, thread_id: str, filename: Optional[str] = None
         )
         chunks = splitter.split_documents(docs)
 
-        vector_store = FAISS.from_documents(chunks, embeddings)
+        vector_store = FAISS.from_documents(chunks, get_embeddings())
         retriever = vector_store.as_retriever(
             search_type="similarity", search_kwargs={"k": 4}
         )
@@ -73,7 +101,9 @@ def ingest_pdf(file_bytes: bytes, thread_id: str, filename: Optional[str] = None
             "filename": filename or os.path.basename(temp_path),
             "documents": len(docs),
             "chunks": len(chunks),
+            "sha256": hashlib.sha256(file_bytes).hexdigest(),
         }
+        clear_tool_cache("rag_tool")
 
         return {
             "filename": filename or os.path.basename(temp_path),
@@ -91,9 +121,11 @@ def ingest_pdf(file_bytes: bytes, thread_id: str, filename: Optional[str] = None
 # -------------------
 # 3. Tools
 # -------------------
-search_tool = DuckDuckGoSearchRun(region="us-en")
+search_tool = get_search_tool()
 
 
+# Pure function of its arguments
+@cacheable(ttl_seconds=3600)
 @tool
 def calculator(first_num: float, second_num: float, operation: str) -> dict:
     """
@@ -124,26 +156,8 @@ def calculator(first_num: float, second_num: float, operation: str) -> dict:
         return {"error": str(e)}
 
 
-@tool
-def get_stock_price(symbol: str) -> dict:
-    """
-    Fetch latest stock price for a given symbol (e.g. 'AAPL', 'TSLA') 
-    using Alpha Vantage with API key in the URL.
-    """
-    url = (
-        "https://www.alphavantage.co/query"
-        f"?function=GLOBAL_QUOTE&symbol={symbol}&apikey=C9PE94QUEW9VWGFM"
-    )
-    r = requests.get(url)
-    return r.json()
-
-
-@tool
-def rag_tool(query: str, thread_id: Optional[str] = None) -> dict:
-    """
-    Retrieve relevant information from the uploaded PDF for this chat thread.
-    Always include the thread_id when calling this tool.
-    """
+def retrieve_context(thread_id: Optional[str], query: str) -> dict:
+    """Search the thread's document; shared by rag_tool and speculative retrieval."""
     retriever = _get_retriever(thread_id)
     if retriever is None:
         return {
@@ -163,67 +177,146 @@ def rag_tool(query: str, thread_id: Optional[str] = None) -> dict:
     }
 
 
-tools = [search_tool, get_stock_price, calculator, rag_tool]
-llm_with_tools = llm.bind_tools(tools)
+get_prefetcher = Lazy(lambda: RetrievalPrefetcher(
+    retrieve_context,
+    max_workers=int(os.getenv("RAG_PREFETCH_WORKERS", "4")),
+    wait_seconds=float(os.getenv("RAG_PREFETCH_WAIT", "5")),
+)).get
+
+
+# Cleared on every upload; "no document yet" answers are never cached. The
+# thread comes from the run config, so it has to be part of the cache key.
+@cacheable(
+    ttl_seconds=600,
+    key=lambda kwargs: (config_thread_id(kwargs.get("config")), kwargs["query"]),
+    cache_if=lambda result: "error" not in result,
+)
+@tool
+def rag_tool(query: str, config: RunnableConfig) -> dict:
+    """
+    Retrieve relevant information from the PDF uploaded to this chat.
+    """
+    thread_id = config_thread_id(config)
+    if thread_id and speculative_mode() != "off":
+        prefetched = get_prefetcher().take(str(thread_id), query)
+        if prefetched is not None:
+            return prefetched
+    return retrieve_context(thread_id, query)
+
+
+tools = cached_tools([search_tool, get_stock_price, get_stock_prices, calculator, rag_tool])
+get_llm_with_tools = Lazy(lambda: get_llm().bind_tools(tools)).get
+get_router = Lazy(lambda: ModelRouter.from_env(
+    default=get_llm_with_tools,
+    build=lambda model: _build_llm(model).bind_tools(tools),
+)).get
+# Network tools fail fast; everything else uses TOOL_TIMEOUT_SECONDS
+TOOL_TIMEOUTS = {"duckduckgo_search": 15, "get_stock_price": 10, "get_stock_prices": 15}
 
 # -------------------
 # 4. State
 # -------------------
 class ChatState(TypedDict):
     messages: Annotated[list[BaseMessage], add_messages]
+    summary: str
+    summary_until: Optional[str]
 
 
 # -------------------
 # 5. Nodes
 # -------------------
-def chat_node(state: ChatState, config=None):
-    """LLM node that may answer or request a tool call."""
-    thread_id = None
-    if config and isinstance(config, dict):
-        thread_id = config.get("configurable", {}).get("thread_id")
-
-    system_message = SystemMessage(
+# Identical for every thread so the prompt prefix stays cacheable; rag_tool
+# finds the thread from the run config instead of a thread_id in the prompt
+SYSTEM_PROMPT = (
+    "You are a helpful assistant. For questions about the uploaded PDF, call "
+    "the `rag_tool`. You can also use the web search, stock price, and "
+    "calculator tools when helpful. If no document is available, ask the user "
+    "to upload a PDF."
+)
+prompt_assembler = PromptAssembler(SYSTEM_PROMPT)
+
+
+def _context_message(result: dict) -> SystemMessage:
+    excerpts = "\n\n".join(f"[{i + 1}] {text}" for i, text in enumerate(result["context"]))
+    return SystemMessage(
         content=(
-            "You are a helpful assistant. For questions about the uploaded PDF, call "
-            "the `rag_tool` and include the thread_id "
-            f"`{thread_id}`. You can also use the web search, stock price, and "
-            "calculator tools when helpful. If no document is available, ask the user "
-            "to upload a PDF."
+            f"Excerpts from the uploaded document `{result.get('source_file')}` that may "
+            f"answer the latest question:\n\n{excerpts}\n\n"
+            "Answer from these if they are sufficient; call `rag_tool` only if you need "
+            "other passages."
         )
     )
 
-    messages = [system_message, *state["messages"]]
-    response = llm_with_tools.invoke(messages, config=config)
-    return {"messages": [response]}
 
+def chat_node(state: ChatState, config=None):
+    """LLM node that may answer or request a tool call."""
+    thread_id = config_thread_id(config)
+    # Looked up once per turn: speculation, routing and the cache key all use it
+    document = thread_document_id(thread_id)
+    has_document = document is not None
+
+    # New user question on a thread with a document: start retrieving now
+    # instead of after the model has asked for rag_tool
+    mode = speculative_mode()
+    last = state["messages"][-1] if state["messages"] else None
+    speculate = (
+        mode != "off"
+        and isinstance(last, HumanMessage)
+        and isinstance(last.content, str)
+        and has_document
+    )
+    if speculate:
+        get_prefetcher().start(str(thread_id), last.content)
+
+    history, summary_updates = get_context_window().prepare(state)
+
+    turn_context = []
+    if speculate and mode == "inject":
+        result = get_prefetcher().wait(str(thread_id))
+        if result and result.get("context"):
+            turn_context.append(_context_message(result))
+    messages = prompt_assembler.assemble(history, turn_context=turn_context)
+
+    response = get_router().invoke(
+        messages,
+        history=state["messages"],
+        has_document=has_document,
+        config=config,
+        call=partial(invoke_with_cache, document=document),
+    )
+    return {"messages": [response], **summary_updates}
 
-tool_node = ToolNode(tools)
 
 # -------------------
 # 6. Checkpointer
 # -------------------
-conn = sqlite3.connect(database="chatbot.db", check_same_thread=False)
-checkpointer = SqliteSaver(conn=conn)
+# get_checkpointer() opens the shared saver on first use
 
 # -------------------
 # 7. Graph
 # -------------------
-graph = StateGraph(ChatState)
-graph.add_node("chat_node", chat_node)
-graph.add_node("tools", tool_node)
+def _build_chatbot():
+    tool_node = ConcurrentToolNode(tools, timeouts=TOOL_TIMEOUTS)
 
-graph.add_edge(START, "chat_node")
-graph.add_conditional_edges("chat_node", tools_condition)
-graph.add_edge("tools", "chat_node")
+    graph = StateGraph(ChatState)
+    graph.add_node("chat_node", chat_node)
+    graph.add_node("tools", tool_node)
 
-chatbot = graph.compile(checkpointer=checkpointer)
+    graph.add_edge(START, "chat_node")
+    graph.add_conditional_edges("chat_node", tools_condition)
+    graph.add_edge("tools", "chat_node")
+
+    return instrument_graph(graph.compile(checkpointer=get_checkpointer()))
+
+
+get_chatbot = Lazy(_build_chatbot).get
 
 # -------------------
 # 8. Helpers
 # -------------------
 def retrieve_all_threads():
     all_threads = set()
-    for checkpoint in checkpointer.list(None):
+    for checkpoint in get_checkpointer().list(None):
         all_threads.add(checkpoint.config["configurable"]["thread_id"])
     return list(all_threads)
 
@@ -234,3 +327,27 @@ def thread_has_document(thread_id: str) -> bool:
 
 def thread_document_metadata(thread_id: str) -> dict:
     return _THREAD_METADATA.get(str(thread_id), {})
+
+
+def thread_document_id(thread_id: str) -> Optional[str]:
+    """Content hash of the thread's document (filename if unknown), or None without one."""
+    if not thread_has_document(thread_id):
+        return None
+    metadata = thread_document_metadata(thread_id)
+    return metadata.get("sha256") or metadata.get("filename") or str(thread_id)
+
+
+def speculative_retrieval_stats() -> dict:
+    return get_prefetcher().stats()
+
+
+# `from langgraph_rag_backend import chatbot` builds the graph on first access
+__getattr__ = lazy_attributes(__name__, {
+    "llm": get_llm,
+    "embeddings": get_embeddings,
+    "llm_with_tools": get_llm_with_tools,
+    "router": get_router,
+    "context_window": get_context_window,
+    "checkpointer": get_checkpointer,
+    "chatbot": get_chatbot,
+})
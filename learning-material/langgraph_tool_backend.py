@@ -1,31 +1,49 @@
 # backend.py
 
 from langgraph.graph import StateGraph, START, END
-from typing import TypedDict, Annotated
+from typing import TypedDict, Annotated, Optional
 from langchain_core.messages import BaseMessage, HumanMessage
-from langchain_openai import ChatOpenAI
-from langgraph.checkpoint.sqlite import SqliteSaver
 from langgraph.graph.message import add_messages
-from langgraph.prebuilt import ToolNode, tools_condition
-from langchain_community.tools import DuckDuckGoSearchRun
+from langgraph.prebuilt import tools_condition
 from langchain_core.tools import tool
 from dotenv import load_dotenv
-import sqlite3
-import requests
+from checkpointer_config import get_checkpointer
+from llm_cache import invoke_with_cache
+from context_window import ContextWindow
+from tool_executor import ConcurrentToolNode
+from market_data import get_stock_price, get_stock_prices
+from web_search import get_search_tool
+from tool_cache import cacheable, cached_tools
+from instrumentation import instrument_graph
+from lazy import Lazy, lazy_attributes
+from llm_scheduler import schedule
+from hedging import hedge
+from model_router import ModelRouter
+from prompt_assembly import PromptAssembler
 
 load_dotenv()
 
 # -------------------
 # 1. LLM
 # -------------------
-llm = ChatOpenAI()
+def _build_llm(model: Optional[str] = None):
+    from langchain_openai import ChatOpenAI
+
+    llm = ChatOpenAI(model=model, stream_usage=True) if model else ChatOpenAI(stream_usage=True)
+    return hedge(schedule(llm))
+
+
+get_llm = Lazy(_build_llm).get
+get_context_window = Lazy(lambda: ContextWindow.from_env(summarizer=get_llm())).get
 
 # -------------------
 # 2. Tools
 # -------------------
 # Tools
-search_tool = DuckDuckGoSearchRun(region="us-en")
+search_tool = get_search_tool()
 
+# Pure function of its arguments
+@cacheable(ttl_seconds=3600)
 @tool
 def calculator(first_num: float, second_num: float, operation: str) -> dict:
     """
@@ -53,63 +71,82 @@ def calculator(first_num: float, second_num: float, operation: str) -> dict:
 
 
 
-@tool
-def get_stock_price(symbol: str) -> dict:
-    """
-    Fetch latest stock price for a given symbol (e.g. 'AAPL', 'TSLA') 
-    using Alpha Vantage with API key in the URL.
-    """
-    url = f"https://www.alphavantage.co/query?function=GLOBAL_QUOTE&symbol={symbol}&apikey=C9PE94QUEW9VWGFM"
-    r = requests.get(url)
-    return r.json()
-
-
-
-tools = [search_tool, get_stock_price, calculator]
-llm_with_tools = llm.bind_tools(tools)
+tools = cached_tools([search_tool, get_stock_price, get_stock_prices, calculator])
+get_llm_with_tools = Lazy(lambda: get_llm().bind_tools(tools)).get
+get_router = Lazy(lambda: ModelRouter.from_env(
+    default=get_llm_with_tools,
+    build=lambda model: _build_llm(model).bind_tools(tools),
+)).get
+# Network tools fail fast; everything else uses TOOL_TIMEOUT_SECONDS
+TOOL_TIMEOUTS = {"duckduckgo_search": 15, "get_stock_price": 10, "get_stock_prices": 15}
 
 # -------------------
 # 3. State
 # -------------------
 class ChatState(TypedDict):
     messages: Annotated[list[BaseMessage], add_messages]
+    summary: str
+    summary_until: Optional[str]
 
 # -------------------
 # 4. Nodes
 # -------------------
-def chat_node(state: ChatState):
-    """LLM node that may answer or request a tool call."""
-    messages = state["messages"]
-    response = llm_with_tools.invoke(messages)
-    return {"messages": [response]}
+# Fixed text ahead of the history keeps the prompt prefix cacheable
+SYSTEM_PROMPT = (
+    "You are a helpful assistant. Use the web search, stock price, and "
+    "calculator tools when helpful."
+)
+prompt_assembler = PromptAssembler(SYSTEM_PROMPT)
+
 
-tool_node = ToolNode(tools)
+def chat_node(state: ChatState, config=None):
+    """LLM node that may answer or request a tool call."""
+    history, summary_updates = get_context_window().prepare(state)
+    messages = prompt_assembler.assemble(history)
+    response = get_router().invoke(messages, history=state["messages"], config=config, call=invoke_with_cache)
+    return {"messages": [response], **summary_updates}
 
 # -------------------
 # 5. Checkpointer
 # -------------------
-conn = sqlite3.connect(database="chatbot.db", check_same_thread=False)
-checkpointer = SqliteSaver(conn=conn)
+# get_checkpointer() opens the shared saver on first use
 
 # -------------------
 # 6. Graph
 # -------------------
-graph = StateGraph(ChatState)
-graph.add_node("chat_node", chat_node)
-graph.add_node("tools", tool_node)
+def _build_chatbot():
+    tool_node = ConcurrentToolNode(tools, timeouts=TOOL_TIMEOUTS)
+
+    graph = StateGraph(ChatState)
+    graph.add_node("chat_node", chat_node)
+    graph.add_node("tools", tool_node)
 
-graph.add_edge(START, "chat_node")
+    graph.add_edge(START, "chat_node")
 
-graph.add_conditional_edges("chat_node",tools_condition)
-graph.add_edge('tools', 'chat_node')
+    graph.add_conditional_edges("chat_node",tools_condition)
+    graph.add_edge('tools', 'chat_node')
 
-chatbot = graph.compile(checkpointer=checkpointer)
+    return instrument_graph(graph.compile(checkpointer=get_checkpointer()))
+
+
+get_chatbot = Lazy(_build_chatbot).get
 
 # -------------------
 # 7. Helper
 # -------------------
 def retrieve_all_threads():
     all_threads = set()
-    for checkpoint in checkpointer.list(None):
+    for checkpoint in get_checkpointer().list(None):
         all_threads.add(checkpoint.config["configurable"]["thread_id"])
     return list(all_threads)
+
+
+# `from langgraph_tool_backend import chatbot` builds the graph on first access
+__getattr__ = lazy_attributes(__name__, {
+    "llm": get_llm,
+    "llm_with_tools": get_llm_with_tools,
+    "router": get_router,
+    "context_window": get_context_window,
+    "checkpointer": get_checkpointer,
+    "chatbot": get_chatbot,
+})
@@ -0,0 +1,64 @@
+"""
+Lazy, thread-safe initialization for the backend modules.
+
+Importing a backend should be cheap: model clients, database connections,
+event loops and MCP sessions are created on first use instead of at import
+time. Each expensive object sits behind a `Lazy` factory, and the module keeps
+its old public names (`chatbot`, `llm`, `checkpointer`, ...) through a module
+level `__getattr__`:
+
+    _chatbot = Lazy(_build_chatbot)
+    get_chatbot = _chatbot.get
+
+    __getattr__ = lazy_attributes(__name__, {"chatbot": get_chatbot})
+
+`from langgraph_tool_backend import chatbot` keeps working and builds the
+graph at that moment; `import langgraph_tool_backend` alone builds nothing.
+"""
+from __future__ import annotations
+
+import threading
+from typing import Any, Callable, Dict, Generic, Optional, TypeVar
+
+T = TypeVar("T")
+
+_UNSET = object()
+
+
+class Lazy(Generic[T]):
+    """Runs `factory` once, on first `get()`, even when called from several threads."""
+
+    def __init__(self, factory: Callable[[], T]):
+        self._factory = factory
+        self._value: Any = _UNSET
+        self._lock = threading.Lock()
+
+    def get(self) -> T:
+        value = self._value
+        if value is not _UNSET:
+            return value
+        with self._lock:
+            if self._value is _UNSET:
+                self._value = self._factory()
+            return self._value
+
+    def reset(self) -> None:
+        """Drop the built value so the next `get()` runs the factory again."""
+        with self._lock:
+            self._value = _UNSET
+
+    @property
+    def ready(self) -> bool:
+        return self._value is not _UNSET
+
+
+def lazy_attributes(module_name: str, factories: Dict[str, Callable[[], Any]]) -> Callable[[str], Any]:
+    """Build a module `__getattr__` that resolves the given names through their factories."""
+
+    def __getattr__(name: str) -> Any:
+        factory: Optional[Callable[[], Any]] = factories.get(name)
+        if factory is None:
+            raise AttributeError(f"module {module_name!r} has no attribute {name!r}")
+        return factory()
+
+    return __getattr__
@@ -0,0 +1,423 @@
+"""
+Opt-in response cache for `chat_node`.
+
+FAQ-style prompts ("what can you do?") reach `llm_with_tools.invoke` again and
+again across users. This cache answers them locally:
+
+    1. Exact tier: SHA-256 of the message history (whitespace collapsed, case
+       kept), the bound tool schemas, the model name and the identity of the
+       document attached to the thread (e.g. its content hash), if any.
+    2. Semantic tier (optional): when the turn ends with a fresh user question,
+       compare its embedding with cached questions that share the same earlier
+       context, and reuse the answer above a cosine-similarity threshold.
+
+Entries live in a local SQLite file with TTL and LRU eviction. Turns that
+involve live tools (stock prices, web search) are never read from or written
+to the cache. Hits are replayed through `ReplayChatModel`, so frontends using
+`stream_mode="messages"` still receive the answer token by token.
+
+Environment Variables:
+    LLM_CACHE_ENABLED: "1" to turn the cache on (default off)
+    LLM_CACHE_PATH: SQLite file (default llm_cache.db)
+    LLM_CACHE_TTL: seconds an entry stays valid (default 86400)
+    LLM_CACHE_MAX_ENTRIES: LRU bound on stored responses (default 5000)
+    LLM_CACHE_SEMANTIC_THRESHOLD: cosine similarity for the semantic tier,
+        e.g. 0.95 (unset = exact tier only)
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Iterator, List, Optional, Sequence
+
+import numpy as np
+from dotenv import load_dotenv
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import (
+    AIMessage,
+    AIMessageChunk,
+    BaseMessage,
+    HumanMessage,
+    ToolMessage,
+    message_to_dict,
+    messages_from_dict,
+)
+from langchain_core.messages.tool import tool_call_chunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+load_dotenv()
+
+# Tools whose results go stale within seconds; turns that touch them bypass the cache
+LIVE_TOOLS = {"get_stock_price", "get_stock_prices", "duckduckgo_search"}
+
+_WHITESPACE = re.compile(r"\s+")
+_TOKENS = re.compile(r"\S+\s*|\s+")
+
+
+# -------------------
+# 1. Replay model
+# -------------------
+def message_to_chunks(message: AIMessage) -> List[AIMessageChunk]:
+    """Split a finished AIMessage into word-sized chunks for replay."""
+    content = message.content if isinstance(message.content, str) else ""
+    chunks = [AIMessageChunk(content=piece) for piece in _TOKENS.findall(content)]
+    if message.tool_calls:
+        chunks.append(
+            AIMessageChunk(
+                content="",
+                tool_call_chunks=[
+                    tool_call_chunk(
+                        name=call["name"], args=json.dumps(call["args"]), id=call["id"], index=i
+                    )
+                    for i, call in enumerate(message.tool_calls)
+                ],
+            )
+        )
+    if not chunks:
+        chunks.append(AIMessageChunk(content=message.content))
+    chunks[-1].response_metadata = dict(message.response_metadata)
+    return chunks
+
+
+class ReplayChatModel(BaseChatModel):
+    """Chat model that 'generates' a pre-recorded sequence of chunks."""
+
+    chunks: List[AIMessageChunk]
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        merged = self.chunks[0]
+        for chunk in self.chunks[1:]:
+            merged = merged + chunk
+        message = AIMessage(
+            content=merged.content,
+            tool_calls=merged.tool_calls,
+            response_metadata=merged.response_metadata,
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        for chunk in self.chunks:
+            generation = ChatGenerationChunk(message=chunk)
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.content, chunk=generation)
+            yield generation
+
+
+# -------------------
+# 2. Keys
+# -------------------
+def _normalize_text(content: Any) -> str:
+    if not isinstance(content, str):
+        content = json.dumps(content, sort_keys=True, default=str)
+    # Case is kept: code, tickers and names differ by case alone
+    return _WHITESPACE.sub(" ", content).strip()
+
+
+def _normalize_message(message: BaseMessage) -> dict:
+    normalized = {"type": message.type, "content": _normalize_text(message.content)}
+    if isinstance(message, AIMessage) and message.tool_calls:
+        normalized["tool_calls"] = [
+            {"name": call["name"], "args": call["args"]} for call in message.tool_calls
+        ]
+    if isinstance(message, ToolMessage):
+        normalized["name"] = message.name
+    return normalized
+
+
+def _hash(payload: Any) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _model_fingerprint(model) -> dict:
+    """Model name plus the tool schemas bound via `bind_tools`."""
+    bound = getattr(model, "bound", model)
+    kwargs = getattr(model, "kwargs", {}) or {}
+    return {
+        "model": getattr(bound, "model_name", None) or getattr(bound, "model", None) or type(bound).__name__,
+        "tools": kwargs.get("tools", []),
+    }
+
+
+def _current_turn(messages: Sequence[BaseMessage]) -> Sequence[BaseMessage]:
+    """Messages from the latest user message onwards."""
+    for index in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[index], HumanMessage):
+            return messages[index:]
+    return messages
+
+
+def _uses_live_tools(messages: Sequence[BaseMessage], live_tools: set) -> bool:
+    for message in messages:
+        if isinstance(message, AIMessage) and any(c["name"] in live_tools for c in message.tool_calls):
+            return True
+        if isinstance(message, ToolMessage) and message.name in live_tools:
+            return True
+    return False
+
+
+class _Probe:
+    """Everything computed for one lookup, reused when storing the response."""
+
+    def __init__(self, model, messages: Sequence[BaseMessage], document: Optional[str] = None):
+        # The same question gets a different answer from each attached document
+        fingerprint = {**_model_fingerprint(model), "document": document}
+        normalized = [_normalize_message(m) for m in messages]
+        self.context_key = _hash([fingerprint, normalized[:-1]])
+        self.key = _hash([self.context_key, normalized[-1:]])
+        self.question = normalized[-1]["content"] if isinstance(messages[-1], HumanMessage) else None
+        self.embedding: Optional[np.ndarray] = None
+
+
+# -------------------
+# 3. Cache
+# -------------------
+class ResponseCache:
+    """SQLite-backed exact + semantic cache of chat model responses."""
+
+    def __init__(
+        self,
+        path: str = "llm_cache.db",
+        ttl_seconds: float = 86400,
+        max_entries: int = 5000,
+        semantic_threshold: Optional[float] = None,
+        embeddings=None,
+        live_tools: Optional[set] = None,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.semantic_threshold = semantic_threshold
+        self.live_tools = set(LIVE_TOOLS if live_tools is None else live_tools)
+        self._embeddings = embeddings
+        self._lock = threading.Lock()
+        self._stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "bypassed": 0}
+
+        self.conn = sqlite3.connect(database=path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                context_key TEXT NOT NULL,
+                question TEXT,
+                embedding BLOB,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_responses_context ON responses(context_key);
+            CREATE INDEX IF NOT EXISTS idx_responses_access ON responses(last_access);
+            """
+        )
+
+    @property
+    def embeddings(self):
+        if self._embeddings is None:
+            from langchain_openai import OpenAIEmbeddings
+
+            self._embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
+        return self._embeddings
+
+    def _semantic_enabled(self, probe: _Probe) -> bool:
+        return self.semantic_threshold is not None and probe.question is not None
+
+    # Lookups
+    def _load(self, where: str, params: tuple) -> Optional[AIMessage]:
+        """Fetch one live entry and mark it as recently used."""
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            row = self.conn.execute(
+                f"SELECT key, response FROM responses WHERE {where} AND created_at >= ?",
+                (*params, cutoff),
+            ).fetchone()
+            if row is None:
+                return None
+            self.conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), row[0]))
+            self.conn.commit()
+        return messages_from_dict([json.loads(row[1])])[0]
+
+    def _find_exact(self, probe: _Probe) -> Optional[AIMessage]:
+        return self._load("key = ?", (probe.key,))
+
+    def _find_similar(self, probe: _Probe) -> Optional[AIMessage]:
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT key, embedding FROM responses "
+                "WHERE context_key = ? AND embedding IS NOT NULL AND created_at >= ?",
+                (probe.context_key, cutoff),
+            ).fetchall()
+        if not rows:
+            return None
+
+        matrix = np.stack([np.frombuffer(blob, dtype=np.float32) for _, blob in rows])
+        scores = matrix @ probe.embedding
+        best = int(np.argmax(scores))
+        if scores[best] < self.semantic_threshold:
+            return None
+        return self._load("key = ?", (rows[best][0],))
+
+    @staticmethod
+    def _unit(vector: Sequence[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm else array
+
+    # Storage
+    def _store(self, probe: _Probe, response: AIMessage) -> None:
+        if isinstance(response, AIMessage) and not response.content and not response.tool_calls:
+            return
+        if _uses_live_tools([response], self.live_tools):
+            return
+
+        stored = AIMessage(
+            content=response.content,
+            tool_calls=response.tool_calls,
+            response_metadata={k: v for k, v in response.response_metadata.items() if k == "model_name"},
+        )
+        now = time.time()
+        embedding = probe.embedding.tobytes() if probe.embedding is not None else None
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(key, context_key, question, embedding, response, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (probe.key, probe.context_key, probe.question, embedding,
+                 json.dumps(message_to_dict(stored)), now, now),
+            )
+            self._evict(now)
+            self.conn.commit()
+
+    def _evict(self, now: float) -> None:
+        self.conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+        (count,) = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+        if count > self.max_entries:
+            self.conn.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY last_access ASC LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def _replay(self, message: AIMessage, tier: str) -> ReplayChatModel:
+        self._bump(f"{tier}_hits")
+        message.response_metadata = {**message.response_metadata, "cache": tier}
+        # Fresh ids so a repeated answer never reuses a tool_call_id within a thread
+        message.tool_calls = [{**call, "id": f"call_{uuid.uuid4().hex[:24]}"} for call in message.tool_calls]
+        return ReplayChatModel(chunks=message_to_chunks(message))
+
+    def _bump(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            (stats["entries"],) = self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+        lookups = stats["exact_hits"] + stats["semantic_hits"] + stats["misses"]
+        stats["hit_ratio"] = (stats["exact_hits"] + stats["semantic_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    # -------------------
+    # Public API
+    # -------------------
+    def invoke(self, model, messages: Sequence[BaseMessage], config=None, document: Optional[str] = None) -> AIMessage:
+        if not messages or _uses_live_tools(_current_turn(messages), self.live_tools):
+            self._bump("bypassed")
+            return model.invoke(messages, config=config)
+
+        probe = _Probe(model, messages, document)
+        cached = self._find_exact(probe)
+        if cached is not None:
+            return self._replay(cached, "exact").invoke(messages, config=config)
+
+        if self._semantic_enabled(probe):
+            probe.embedding = self._unit(self.embeddings.embed_query(probe.question))
+            cached = self._find_similar(probe)
+            if cached is not None:
+                return self._replay(cached, "semantic").invoke(messages, config=config)
+
+        self._bump("misses")
+        response = model.invoke(messages, config=config)
+        self._store(probe, response)
+        return response
+
+    async def ainvoke(
+        self, model, messages: Sequence[BaseMessage], config=None, document: Optional[str] = None
+    ) -> AIMessage:
+        if not messages or _uses_live_tools(_current_turn(messages), self.live_tools):
+            self._bump("bypassed")
+            return await model.ainvoke(messages, config=config)
+
+        probe = _Probe(model, messages, document)
+        cached = self._find_exact(probe)
+        if cached is not None:
+            return await self._replay(cached, "exact").ainvoke(messages, config=config)
+
+        if self._semantic_enabled(probe):
+            probe.embedding = self._unit(await self.embeddings.aembed_query(probe.question))
+            cached = self._find_similar(probe)
+            if cached is not None:
+                return await self._replay(cached, "semantic").ainvoke(messages, config=config)
+
+        self._bump("misses")
+        response = await model.ainvoke(messages, config=config)
+        self._store(probe, response)
+        return response
+
+
+# -------------------
+# 4. Shared instance
+# -------------------
+_response_cache_instance = None
+_instance_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Return the process-wide cache, or None unless LLM_CACHE_ENABLED is set."""
+    global _response_cache_instance
+
+    if os.getenv("LLM_CACHE_ENABLED", "0").strip().lower() not in ("1", "true", "yes"):
+        return None
+
+    with _instance_lock:
+        if _response_cache_instance is None:
+            threshold = os.getenv("LLM_CACHE_SEMANTIC_THRESHOLD")
+            _response_cache_instance = ResponseCache(
+                path=os.getenv("LLM_CACHE_PATH", "llm_cache.db"),
+                ttl_seconds=float(os.getenv("LLM_CACHE_TTL", "86400")),
+                max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000")),
+                semantic_threshold=float(threshold) if threshold else None,
+            )
+        return _response_cache_instance
+
+
+def invoke_with_cache(
+    model, messages: Sequence[BaseMessage], config=None, document: Optional[str] = None
+) -> AIMessage:
+    """`model.invoke` that goes through the response cache when it is enabled.
+
+    `document` identifies the document the answer may draw on, so threads
+    with different uploads never share entries.
+    """
+    cache = get_response_cache()
+    if cache is None:
+        return model.invoke(messages, config=config)
+    return cache.invoke(model, messages, config=config, document=document)
+
+
+async def ainvoke_with_cache(
+    model, messages: Sequence[BaseMessage], config=None, document: Optional[str] = None
+) -> AIMessage:
+    cache = get_response_cache()
+    if cache is None:
+        return await model.ainvoke(messages, config=config)
+    return await cache.ainvoke(model, messages, config=config, document=document)
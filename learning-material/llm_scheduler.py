@@ -0,0 +1,504 @@
+"""
+Process-wide scheduler for chat model calls.
+
+Every Streamlit session drives its own graph, and each backend used to call
+`llm.invoke` / `ainvoke` with no coordination: a burst of sessions trips the
+provider's 429s, and the client's retries then add more load. All model calls
+in the process now go through one `LLMScheduler`:
+
+    - token buckets for requests per minute and tokens per minute
+      (prompt estimate + expected completion, settled with the real usage)
+    - a cap on calls in flight
+    - fair queuing: one FIFO queue per user/thread, served round-robin, so one
+      busy thread cannot starve the others
+    - backpressure: a 429 pauses dispatch for the provider's retry-after
+      (or an exponential backoff) and the call is re-queued at the front
+
+`schedule(llm)` wraps a chat model in `ScheduledChatModel`, which acquires a
+slot around `_generate` / `_stream` (and the async variants). A stream holds
+its slot until the last chunk and is re-queued after a 429 only while no
+chunk has been yielded yet. Tool binding, streaming and callbacks behave
+exactly as on the wrapped model. Queue depth and wait-time percentiles are
+available from `scheduler_stats()`, and each wait is reported to the metrics
+recorder as an `llm_queue` event.
+
+Environment Variables:
+    LLM_SCHEDULER_ENABLED: "1"/"true" to route model calls through the scheduler (default off)
+    LLM_RPM: requests per minute (default 500, 0 = unlimited)
+    LLM_TPM: tokens per minute (default 200000, 0 = unlimited)
+    LLM_MAX_IN_FLIGHT: concurrent model calls (default 8)
+    LLM_COMPLETION_TOKENS: expected completion size reserved per call (default 500)
+    LLM_MAX_RETRIES: re-queues after a 429 before the error is raised (default 2)
+"""
+from __future__ import annotations
+
+import asyncio
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, List, Optional
+
+from dotenv import load_dotenv
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableBinding
+from langchain_core.runnables.config import var_child_runnable_config
+
+from instrumentation import percentile, get_recorder
+
+load_dotenv()
+
+
+def _enabled() -> bool:
+    return os.getenv("LLM_SCHEDULER_ENABLED", "").strip().lower() in ("1", "true", "yes")
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    """Seconds to back off if `error` is a provider rate limit, else None."""
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if status != 429 and type(error).__name__ != "RateLimitError":
+        return None
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after", 0)) or 0.0
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class TokenBucket:
+    """Refills `per_minute` units per minute, up to one minute's worth."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """0 if `amount` is available now, else seconds until it will be."""
+        self._refill(now)
+        # A single request larger than the bucket waits for a full bucket
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def take(self, amount: float) -> None:
+        self.tokens -= amount
+
+    def give(self, amount: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class _Ticket:
+    __slots__ = ("key", "tokens", "used", "enqueued", "wait", "granted", "event", "future", "loop")
+
+    def __init__(self, key: str, tokens: int):
+        self.key = key
+        self.tokens = tokens
+        # Real total tokens, once known
+        self.used: Optional[int] = None
+        self.enqueued = time.monotonic()
+        self.wait = 0.0
+        self.granted = False
+        self.event: Optional[threading.Event] = None
+        self.future: Optional[asyncio.Future] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+class LLMScheduler:
+    """Admission control for model calls: rate buckets, in-flight cap, fair queues."""
+
+    def __init__(
+        self,
+        rpm: float = 500,
+        tpm: float = 200_000,
+        max_in_flight: int = 8,
+        completion_tokens: int = 500,
+        max_retries: int = 2,
+    ):
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self.max_in_flight = max_in_flight
+        self.completion_tokens = completion_tokens
+        self.max_retries = max_retries
+
+        self._lock = threading.Lock()
+        # key -> waiting tickets; `_ring` is the round-robin order of keys with waiters
+        self._queues: Dict[str, Deque[_Ticket]] = {}
+        self._ring: Deque[str] = deque()
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._backoff = 1.0
+        self._timer: Optional[threading.Timer] = None
+
+        self._granted = 0
+        self._throttled = 0
+        self._waits: Deque[float] = deque(maxlen=1000)
+
+    @classmethod
+    def from_env(cls) -> "LLMScheduler":
+        return cls(
+            rpm=float(os.getenv("LLM_RPM", "500")),
+            tpm=float(os.getenv("LLM_TPM", "200000")),
+            max_in_flight=int(os.getenv("LLM_MAX_IN_FLIGHT", "8")),
+            completion_tokens=int(os.getenv("LLM_COMPLETION_TOKENS", "500")),
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "2")),
+        )
+
+    def estimate(self, messages: List[BaseMessage]) -> int:
+        return count_tokens_approximately(messages) + self.completion_tokens
+
+    # -------------------
+    # Dispatch (call with the lock held)
+    # -------------------
+    def _enqueue(self, ticket: _Ticket, front: bool = False) -> None:
+        queue = self._queues.get(ticket.key)
+        if queue is None:
+            queue = self._queues[ticket.key] = deque()
+            self._ring.append(ticket.key)
+        if front:
+            queue.appendleft(ticket)
+        else:
+            queue.append(ticket)
+
+    def _drop_key_if_empty(self, key: str) -> None:
+        if not self._queues.get(key):
+            self._queues.pop(key, None)
+            try:
+                self._ring.remove(key)
+            except ValueError:
+                pass
+
+    def _wake_later(self, delay: float) -> None:
+        if self._timer is not None:
+            return
+        self._timer = threading.Timer(delay, self._on_timer)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _on_timer(self) -> None:
+        with self._lock:
+            self._timer = None
+            self._dispatch()
+
+    def _dispatch(self) -> None:
+        now = time.monotonic()
+        if now < self._paused_until:
+            self._wake_later(self._paused_until - now)
+            return
+        while self._ring and self._in_flight < self.max_in_flight:
+            key = self._ring[0]
+            ticket = self._queues[key][0]
+            wait = max(
+                self.requests.wait_time(1, now) if self.requests else 0.0,
+                self.tokens.wait_time(ticket.tokens, now) if self.tokens else 0.0,
+            )
+            if wait > 0:
+                self._wake_later(wait)
+                return
+
+            self._queues[key].popleft()
+            self._ring.rotate(-1)
+            self._drop_key_if_empty(key)
+
+            if self.requests:
+                self.requests.take(1)
+            if self.tokens:
+                self.tokens.take(ticket.tokens)
+            self._in_flight += 1
+            self._granted += 1
+            ticket.wait = now - ticket.enqueued
+            self._waits.append(ticket.wait)
+            ticket.granted = True
+            if ticket.event is not None:
+                ticket.event.set()
+            elif ticket.loop is not None:
+                ticket.loop.call_soon_threadsafe(self._resolve, ticket)
+
+    @staticmethod
+    def _resolve(ticket: _Ticket) -> None:
+        if ticket.future is not None and not ticket.future.done():
+            ticket.future.set_result(None)
+
+    # -------------------
+    # Slots
+    # -------------------
+    def _acquire(self, key: str, tokens: int, front: bool = False) -> _Ticket:
+        ticket = _Ticket(key, tokens)
+        ticket.event = threading.Event()
+        with self._lock:
+            self._enqueue(ticket, front)
+            self._dispatch()
+        ticket.event.wait()
+        return ticket
+
+    async def _aacquire(self, key: str, tokens: int, front: bool = False) -> _Ticket:
+        ticket = _Ticket(key, tokens)
+        ticket.loop = asyncio.get_running_loop()
+        ticket.future = ticket.loop.create_future()
+        with self._lock:
+            self._enqueue(ticket, front)
+            self._dispatch()
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            with self._lock:
+                if ticket.granted:
+                    self._release_locked(ticket, None)
+                else:
+                    queue = self._queues.get(key)
+                    if queue and ticket in queue:
+                        queue.remove(ticket)
+                    self._drop_key_if_empty(key)
+            raise
+        return ticket
+
+    def _release_locked(self, ticket: _Ticket, used_tokens: Optional[int]) -> None:
+        self._in_flight -= 1
+        if self.tokens and used_tokens is not None:
+            # Settle the estimate against the real usage
+            self.tokens.give(ticket.tokens - used_tokens)
+        self._dispatch()
+
+    def _release(self, ticket: _Ticket, used_tokens: Optional[int] = None) -> None:
+        with self._lock:
+            self._release_locked(ticket, used_tokens)
+        self._record(ticket)
+
+    def _rate_limited(self, ticket: _Ticket, retry_after: float) -> None:
+        """Free the slot and pause all dispatch for the provider's retry-after."""
+        with self._lock:
+            self._throttled += 1
+            delay = retry_after or self._backoff
+            self._backoff = min(self._backoff * 2, 60.0)
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            self._in_flight -= 1
+            self._dispatch()
+        self._record(ticket)
+
+    def _succeeded(self, ticket: _Ticket) -> None:
+        with self._lock:
+            self._backoff = 1.0
+        self._release(ticket, ticket.used)
+
+    def _failed(self, ticket: _Ticket, error: BaseException) -> None:
+        retry_after = _retry_after(error) if isinstance(error, Exception) else None
+        if retry_after is None:
+            self._release(ticket)
+        else:
+            self._rate_limited(ticket, retry_after)
+
+    def _record(self, ticket: _Ticket) -> None:
+        recorder = get_recorder()
+        if recorder is not None:
+            recorder.record({
+                "kind": "llm_queue",
+                "name": "wait",
+                "duration_ms": round(ticket.wait * 1000, 2),
+                "thread_id": ticket.key,
+            })
+
+    @contextmanager
+    def slot(self, key: str, tokens: int, front: bool = False) -> Iterator[_Ticket]:
+        """Hold one admission for the duration of the block (set `ticket.used` to settle tokens)."""
+        ticket = self._acquire(key, tokens, front)
+        try:
+            yield ticket
+        except BaseException as e:
+            self._failed(ticket, e)
+            raise
+        self._succeeded(ticket)
+
+    @asynccontextmanager
+    async def aslot(self, key: str, tokens: int, front: bool = False) -> AsyncIterator[_Ticket]:
+        ticket = await self._aacquire(key, tokens, front)
+        try:
+            yield ticket
+        except BaseException as e:
+            self._failed(ticket, e)
+            raise
+        self._succeeded(ticket)
+
+    # -------------------
+    # Calls, re-queued after a 429
+    # -------------------
+    def run(self, key: str, tokens: int, fn):
+        for attempt in itertools.count():
+            try:
+                with self.slot(key, tokens, front=attempt > 0) as ticket:
+                    result = fn()
+                    ticket.used = _usage_tokens(result)
+                return result
+            except Exception as e:
+                if _retry_after(e) is None or attempt >= self.max_retries:
+                    raise
+
+    async def arun(self, key: str, tokens: int, fn):
+        for attempt in itertools.count():
+            try:
+                async with self.aslot(key, tokens, front=attempt > 0) as ticket:
+                    result = await fn()
+                    ticket.used = _usage_tokens(result)
+                return result
+            except Exception as e:
+                if _retry_after(e) is None or attempt >= self.max_retries:
+                    raise
+
+    # A stream holds its slot until the last chunk. A 429 before the first
+    # chunk is re-queued like any other call; after it, the caller has seen
+    # output, so the error is raised.
+    def stream(self, key: str, tokens: int, fn) -> Iterator[ChatGenerationChunk]:
+        for attempt in itertools.count():
+            started = False
+            try:
+                with self.slot(key, tokens, front=attempt > 0) as ticket:
+                    for chunk in fn():
+                        started = True
+                        ticket.used = _chunk_tokens(chunk, ticket.used)
+                        yield chunk
+                return
+            except Exception as e:
+                if started or _retry_after(e) is None or attempt >= self.max_retries:
+                    raise
+
+    async def astream(self, key: str, tokens: int, fn) -> AsyncIterator[ChatGenerationChunk]:
+        for attempt in itertools.count():
+            started = False
+            try:
+                async with self.aslot(key, tokens, front=attempt > 0) as ticket:
+                    async for chunk in fn():
+                        started = True
+                        ticket.used = _chunk_tokens(chunk, ticket.used)
+                        yield chunk
+                return
+            except Exception as e:
+                if started or _retry_after(e) is None or attempt >= self.max_retries:
+                    raise
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            ordered = sorted(self._waits)
+            return {
+                "in_flight": self._in_flight,
+                "queue_depth": sum(len(queue) for queue in self._queues.values()),
+                "queued_by_key": {key: len(queue) for key, queue in self._queues.items()},
+                "granted": self._granted,
+                "rate_limited": self._throttled,
+                "paused_for_s": round(max(0.0, self._paused_until - time.monotonic()), 2),
+                "wait_mean_ms": round(sum(ordered) / len(ordered) * 1000, 2) if ordered else 0.0,
+                "wait_p50_ms": round(percentile(ordered, 50) * 1000, 2),
+                "wait_p95_ms": round(percentile(ordered, 95) * 1000, 2),
+            }
+
+
+def _usage_tokens(result: Any) -> Optional[int]:
+    for generation in getattr(result, "generations", None) or []:
+        usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+        if usage:
+            return usage.get("total_tokens")
+    return None
+
+
+def _chunk_tokens(chunk: ChatGenerationChunk, used: Optional[int]) -> Optional[int]:
+    usage = getattr(chunk.message, "usage_metadata", None)
+    return usage.get("total_tokens") if usage else used
+
+
+# -------------------
+# Chat model wrapper
+# -------------------
+def _queue_key(run_manager) -> str:
+    # _stream/_astream get no run manager; the current run's config is in a contextvar
+    metadata = getattr(run_manager, "metadata", None) or (var_child_runnable_config.get() or {}).get("metadata") or {}
+    key = metadata.get("user_id") or metadata.get("thread_id")
+    return str(key) if key is not None else "default"
+
+
+class ScheduledChatModel(BaseChatModel):
+    """Runs every call of `llm` through a scheduler slot."""
+
+    llm: BaseChatModel
+    scheduler: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return f"scheduled-{self.llm._llm_type}"
+
+    @property
+    def model_name(self) -> Optional[str]:
+        return getattr(self.llm, "model_name", None)
+
+    def _get_ls_params(self, stop=None, **kwargs):
+        return self.llm._get_ls_params(stop=stop, **kwargs)
+
+    def bind_tools(self, tools, **kwargs):
+        # Let the wrapped model format the tools, then bind them to the wrapper
+        bound = self.llm.bind_tools(tools, **kwargs)
+        return RunnableBinding(bound=self, kwargs=bound.kwargs, config=bound.config)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return self.scheduler.run(
+            _queue_key(run_manager),
+            self.scheduler.estimate(messages),
+            lambda: self.llm._generate(messages, stop=stop, run_manager=run_manager, **kwargs),
+        )
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return await self.scheduler.arun(
+            _queue_key(run_manager),
+            self.scheduler.estimate(messages),
+            lambda: self.llm._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs),
+        )
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        yield from self.scheduler.stream(
+            _queue_key(run_manager),
+            self.scheduler.estimate(messages),
+            lambda: self.llm._stream(messages, stop=stop, run_manager=run_manager, **kwargs),
+        )
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        async for chunk in self.scheduler.astream(
+            _queue_key(run_manager),
+            self.scheduler.estimate(messages),
+            lambda: self.llm._astream(messages, stop=stop, run_manager=run_manager, **kwargs),
+        ):
+            yield chunk
+
+
+# -------------------
+# Process-wide scheduler
+# -------------------
+_scheduler: Optional[LLMScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> Optional[LLMScheduler]:
+    """Process-wide scheduler, or None when LLM_SCHEDULER_ENABLED is off."""
+    global _scheduler
+
+    if not _enabled():
+        return None
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler.from_env()
+        return _scheduler
+
+
+def schedule(llm: BaseChatModel) -> BaseChatModel:
+    """Wrap a chat model so its calls share the process-wide limits (no-op when off)."""
+    scheduler = get_scheduler()
+    return ScheduledChatModel(llm=llm, scheduler=scheduler) if scheduler is not None else llm
+
+
+def scheduler_stats() -> Dict[str, Any]:
+    scheduler = get_scheduler()
+    return scheduler.stats() if scheduler is not None else {}
@@ -0,0 +1,257 @@
+"""
+Several event loops for the async backend, with conversations pinned to one.
+
+The MCP backend used to run every session's graph on one event loop thread,
+so any CPU-heavy step (message (de)serialization, checkpoint rows, tool
+output parsing) delayed every other session's stream. `LoopExecutor` runs
+ASYNC_LOOPS loops, each in its own thread:
+
+    - `submit(coro, thread_id)` / `run(coro, thread_id)` pin each
+      conversation to one loop (the least busy one when first seen), so a
+      thread's runs never interleave across loops
+    - work without a thread_id, and everything opened at startup
+      (checkpointer, MCP sessions, background refresh), lives on the home loop
+
+Objects bound to the loop they were opened on need care with more than one
+loop:
+
+    - `LoopBoundCheckpointSaver` runs every async checkpointer call on the
+      saver's home loop (aiosqlite connections and async pools are
+      loop-bound)
+    - `LoopLocalChatModel` keeps one chat model, and so one HTTP connection
+      pool, per loop
+
+With ASYNC_LOOPS=1 (the default) both wrappers are left out and behaviour is
+unchanged.
+
+Environment Variables:
+    ASYNC_LOOPS: event loops to spread conversations over (default 1)
+    ASYNC_UVLOOP: "1"/"true" to run the loops on uvloop when installed (default off)
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, AsyncIterator, Callable, Coroutine, Dict, Iterator, List, Optional
+
+from dotenv import load_dotenv
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableBinding
+from langgraph.checkpoint.base import BaseCheckpointSaver, CheckpointTuple
+from pydantic import PrivateAttr
+
+from checkpoint_cache import DelegatingCheckpointSaver
+
+load_dotenv()
+
+# Pinned conversations remembered before the oldest are forgotten (and re-pinned on return)
+_MAX_PINNED = 10_000
+
+
+def _new_loop(use_uvloop: bool) -> asyncio.AbstractEventLoop:
+    if use_uvloop:
+        try:
+            import uvloop
+
+            return uvloop.new_event_loop()
+        except ImportError:
+            print("⚠️ ASYNC_UVLOOP is set but uvloop is not installed; using asyncio loops")
+    return asyncio.new_event_loop()
+
+
+class LoopExecutor:
+    """N event loop threads; conversations are pinned to one of them."""
+
+    def __init__(self, loops: int = 1, use_uvloop: bool = False):
+        self.loops: List[asyncio.AbstractEventLoop] = []
+        self._threads: List[threading.Thread] = []
+        for index in range(max(1, loops)):
+            loop = _new_loop(use_uvloop)
+            thread = threading.Thread(target=loop.run_forever, name=f"async-loop-{index}", daemon=True)
+            thread.start()
+            self.loops.append(loop)
+            self._threads.append(thread)
+        self._pinned: "OrderedDict[str, int]" = OrderedDict()
+        self._load = [0] * len(self.loops)
+        # Submitted coroutines per loop that have not started running yet
+        self._queued = [0] * len(self.loops)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "LoopExecutor":
+        return cls(
+            loops=int(os.getenv("ASYNC_LOOPS", "1")),
+            use_uvloop=os.getenv("ASYNC_UVLOOP", "").strip().lower() in ("1", "true", "yes"),
+        )
+
+    @property
+    def home_loop(self) -> asyncio.AbstractEventLoop:
+        return self.loops[0]
+
+    def loop_for(self, thread_id: Optional[Any] = None) -> asyncio.AbstractEventLoop:
+        if thread_id is None or len(self.loops) == 1:
+            return self.home_loop
+        key = str(thread_id)
+        with self._lock:
+            index = self._pinned.get(key)
+            if index is None:
+                index = min(range(len(self.loops)), key=lambda i: self._load[i])
+                self._pinned[key] = index
+                self._load[index] += 1
+                if len(self._pinned) > _MAX_PINNED:
+                    _, evicted = self._pinned.popitem(last=False)
+                    self._load[evicted] -= 1
+            else:
+                self._pinned.move_to_end(key)
+        return self.loops[index]
+
+    def _dispatch(self, coro: Coroutine[Any, Any, Any], loop: asyncio.AbstractEventLoop) -> Future:
+        index = self.loops.index(loop)
+        started = False
+
+        async def run_started():
+            nonlocal started
+            started = True
+            with self._lock:
+                self._queued[index] -= 1
+            return await coro
+
+        def on_done(future: Future) -> None:
+            # Cancelled before the loop got to it
+            if not started:
+                with self._lock:
+                    self._queued[index] -= 1
+                coro.close()
+
+        with self._lock:
+            self._queued[index] += 1
+        future = asyncio.run_coroutine_threadsafe(run_started(), loop)
+        future.add_done_callback(on_done)
+        return future
+
+    def submit(self, coro: Coroutine[Any, Any, Any], thread_id: Optional[Any] = None) -> Future:
+        return self._dispatch(coro, self.loop_for(thread_id))
+
+    def run(self, coro: Coroutine[Any, Any, Any], thread_id: Optional[Any] = None) -> Any:
+        loop = self.loop_for(thread_id)
+        if _running_loop() is loop:
+            coro.close()
+            raise RuntimeError("run() called from its own event loop; await the coroutine instead")
+        return self._dispatch(coro, loop).result()
+
+    def queued(self, loop: asyncio.AbstractEventLoop) -> int:
+        """Coroutines submitted to `loop` that have not started yet."""
+        with self._lock:
+            return self._queued[self.loops.index(loop)]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pinned = list(self._load)
+        return {
+            "loops": len(self.loops),
+            "loop_type": type(self.home_loop).__module__.split(".")[0],
+            "pinned_threads": pinned,
+        }
+
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+async def on_loop(loop: asyncio.AbstractEventLoop, coro: Coroutine[Any, Any, Any]) -> Any:
+    """Await `coro` on `loop`, from that loop or any other."""
+    if _running_loop() is loop:
+        return await coro
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+
+# -------------------
+# Loop-bound checkpointer
+# -------------------
+class LoopBoundCheckpointSaver(DelegatingCheckpointSaver):
+    """Runs the async API of a loop-bound saver on the loop it was opened on."""
+
+    def __init__(self, saver: BaseCheckpointSaver, loop: asyncio.AbstractEventLoop):
+        super().__init__(saver)
+        self.home_loop = loop
+
+    async def aget_tuple(self, config) -> Optional[CheckpointTuple]:
+        return await on_loop(self.home_loop, self.saver.aget_tuple(config))
+
+    async def alist(self, config, **kwargs) -> AsyncIterator[CheckpointTuple]:
+        if _running_loop() is self.home_loop:
+            async for item in self.saver.alist(config, **kwargs):
+                yield item
+            return
+
+        # Listing is rare (history, thread list); it is collected on the home loop
+        async def collect() -> List[CheckpointTuple]:
+            return [item async for item in self.saver.alist(config, **kwargs)]
+
+        for item in await on_loop(self.home_loop, collect()):
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await on_loop(self.home_loop, self.saver.aput(config, checkpoint, metadata, new_versions))
+
+    async def aput_writes(self, config, writes, task_id, task_path: str = "") -> None:
+        return await on_loop(self.home_loop, self.saver.aput_writes(config, writes, task_id, task_path))
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        return await on_loop(self.home_loop, self.saver.adelete_thread(thread_id))
+
+
+# -------------------
+# Per-loop chat model
+# -------------------
+class LoopLocalChatModel(BaseChatModel):
+    """Builds one model per event loop, so HTTP connections never cross loops."""
+
+    factory: Callable[[], BaseChatModel]
+    _models: Dict[Optional[int], BaseChatModel] = PrivateAttr(default_factory=dict)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    def _model(self, async_call: bool = False) -> BaseChatModel:
+        # Sync calls share one model; its client is not tied to a loop
+        loop = _running_loop() if async_call else None
+        key = id(loop) if loop is not None else None
+        with self._lock:
+            model = self._models.get(key)
+            if model is None:
+                model = self._models[key] = self.factory()
+            return model
+
+    @property
+    def _llm_type(self) -> str:
+        return self._model()._llm_type
+
+    @property
+    def model_name(self) -> Optional[str]:
+        return getattr(self._model(), "model_name", None)
+
+    def _get_ls_params(self, stop=None, **kwargs):
+        return self._model()._get_ls_params(stop=stop, **kwargs)
+
+    def bind_tools(self, tools, **kwargs):
+        bound = self._model().bind_tools(tools, **kwargs)
+        return RunnableBinding(bound=self, kwargs=bound.kwargs, config=bound.config)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return self._model()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        return await self._model(async_call=True)._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        yield from self._model()._stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        async for chunk in self._model(async_call=True)._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+            yield chunk
@@ -0,0 +1,247 @@
+"""
+Health of the backend event loops.
+
+When a stream stutters, the cause is the LLM, an MCP server, or a loop that
+is too busy to run the callbacks that are ready. `LoopMonitor` watches one
+loop:
+
+    - scheduling lag: a watchdog thread schedules a callback on the loop
+      every LOOP_MONITOR_INTERVAL seconds and times how long it waits to run
+      (p50/p95/p99/max)
+    - slow callbacks: when that callback has not run after
+      LOOP_SLOW_CALLBACK_MS, the watchdog captures the loop thread's stack
+      at that moment, so the blocking code shows up by name
+    - tasks: all tasks on the loop, plus in-flight work per kind (stream,
+      tool, checkpoint) counted with `track_inflight(kind)`
+    - queue depth: coroutines handed over with `submit_async_task` that have
+      not started yet (from LoopExecutor) and callbacks ready to run (read
+      from asyncio's own loop; None on loops without that queue, e.g. uvloop,
+      where the lag figures still apply)
+
+`loop_snapshot()` returns all of this per loop. With
+LOOP_MONITOR_LOG_SECONDS set, a one-line summary per loop is printed (and,
+with metrics on, recorded as an `event_loop` event) periodically.
+
+Environment Variables:
+    LOOP_MONITOR_ENABLED: "1"/"true" to monitor the backend loops (default off)
+    LOOP_MONITOR_INTERVAL: seconds between lag probes (default 0.25)
+    LOOP_SLOW_CALLBACK_MS: loop stall that counts as a slow callback (default 100)
+    LOOP_MONITOR_LOG_SECONDS: periodic summary interval, 0 = off (default 0)
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from checkpoint_cache import DelegatingCheckpointSaver
+from instrumentation import percentile, get_recorder
+
+load_dotenv()
+
+# Slow-callback stacks kept per loop
+_MAX_STALLS = 20
+
+
+def monitoring_enabled() -> bool:
+    return os.getenv("LOOP_MONITOR_ENABLED", "").strip().lower() in ("1", "true", "yes")
+
+
+# -------------------
+# In-flight work per kind
+# -------------------
+_inflight: Dict[Tuple[int, str], int] = {}
+_inflight_lock = threading.Lock()
+
+
+class track_inflight:
+    """`with track_inflight("tool"):` counts the block as in-flight work on the running loop."""
+
+    __slots__ = ("kind", "_key")
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self._key: Optional[Tuple[int, str]] = None
+
+    def __enter__(self) -> "track_inflight":
+        try:
+            loop_id = id(asyncio.get_running_loop())
+        except RuntimeError:
+            loop_id = 0
+        self._key = (loop_id, self.kind)
+        with _inflight_lock:
+            _inflight[self._key] = _inflight.get(self._key, 0) + 1
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        with _inflight_lock:
+            _inflight[self._key] -= 1
+
+
+def inflight_counts(loop: asyncio.AbstractEventLoop) -> Dict[str, int]:
+    loop_id = id(loop)
+    with _inflight_lock:
+        return {kind: count for (lid, kind), count in _inflight.items() if lid == loop_id}
+
+
+class InflightCheckpointSaver(DelegatingCheckpointSaver):
+    """Counts async checkpointer calls as `checkpoint` work on the calling loop."""
+
+    async def aget_tuple(self, config):
+        with track_inflight("checkpoint"):
+            return await self.saver.aget_tuple(config)
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        with track_inflight("checkpoint"):
+            return await self.saver.aput(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path: str = ""):
+        with track_inflight("checkpoint"):
+            return await self.saver.aput_writes(config, writes, task_id, task_path)
+
+
+# -------------------
+# Monitor
+# -------------------
+class LoopMonitor:
+    """Watchdog thread that pings the loop, timing each answer and sampling stalls."""
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        name: str,
+        interval: float = 0.25,
+        slow_callback_ms: float = 100.0,
+        executor: Any = None,
+    ):
+        self.loop = loop
+        self.name = name
+        self.interval = interval
+        self.slow_callback = slow_callback_ms / 1000
+        # Optional LoopExecutor, for the submit queue depth
+        self.executor = executor
+        self._lags: deque = deque(maxlen=2000)
+        self._stalls: deque = deque(maxlen=_MAX_STALLS)
+        self._stall_count = 0
+        self._loop_thread: Optional[int] = None
+        self._lock = threading.Lock()
+        self._stopped = False
+
+    @classmethod
+    def from_env(cls, loop: asyncio.AbstractEventLoop, name: str, executor: Any = None) -> "LoopMonitor":
+        return cls(
+            loop,
+            name,
+            interval=float(os.getenv("LOOP_MONITOR_INTERVAL", "0.25")),
+            slow_callback_ms=float(os.getenv("LOOP_SLOW_CALLBACK_MS", "100")),
+            executor=executor,
+        )
+
+    def start(self) -> None:
+        threading.Thread(target=self._watch, name=f"loop-watchdog-{self.name}", daemon=True).start()
+
+    def stop(self) -> None:
+        self._stopped = True
+
+    def _answer(self, answered: threading.Event) -> None:
+        self._loop_thread = threading.get_ident()
+        answered.set()
+
+    def _watch(self) -> None:
+        # Off the loop: a stalled loop cannot report on itself
+        while not self._stopped and not self.loop.is_closed():
+            answered = threading.Event()
+            sent = time.monotonic()
+            try:
+                self.loop.call_soon_threadsafe(self._answer, answered)
+            except RuntimeError:
+                return  # loop closed
+            # The ping waits behind every callback already queued: its delay is the scheduling lag
+            if not answered.wait(self.slow_callback):
+                self._capture_stall(sent, answered)
+            with self._lock:
+                self._lags.append(time.monotonic() - sent)
+            time.sleep(self.interval)
+
+    def _capture_stall(self, sent: float, answered: threading.Event) -> None:
+        frame = sys._current_frames().get(self._loop_thread) if self._loop_thread else None
+        stall = {
+            "at": time.time(),
+            "duration_ms": None,
+            "stack": [line.rstrip() for line in traceback.format_stack(frame)[-12:]] if frame is not None else [],
+        }
+        with self._lock:
+            self._stall_count += 1
+            self._stalls.append(stall)
+        while not answered.wait(1.0):
+            if self._stopped or self.loop.is_closed():
+                return
+        stall["duration_ms"] = round((time.monotonic() - sent) * 1000, 1)
+
+    def _task_count(self) -> int:
+        # all_tasks() iterates a WeakSet the loop thread may be changing
+        for _ in range(3):
+            try:
+                return len(asyncio.all_tasks(self.loop))
+            except RuntimeError:
+                continue
+        return -1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            lags = sorted(self._lags)
+            stalls: List[Dict[str, Any]] = [dict(stall) for stall in self._stalls]
+            stall_count = self._stall_count
+        # Private to asyncio's pure-Python loops; uvloop has no such queue
+        ready = getattr(self.loop, "_ready", None)
+        snapshot = {
+            "lag_p50_ms": round(percentile(lags, 50) * 1000, 2),
+            "lag_p95_ms": round(percentile(lags, 95) * 1000, 2),
+            "lag_p99_ms": round(percentile(lags, 99) * 1000, 2),
+            "lag_max_ms": round((lags[-1] if lags else 0.0) * 1000, 2),
+            "slow_callbacks": stall_count,
+            "recent_stalls": stalls,
+            "tasks": self._task_count(),
+            "inflight": inflight_counts(self.loop),
+            "ready_callbacks": len(ready) if ready is not None else None,
+        }
+        if self.executor is not None:
+            snapshot["submit_queue"] = self.executor.queued(self.loop)
+        return snapshot
+
+    def summary(self) -> str:
+        s = self.snapshot()
+        inflight = " ".join(f"{kind}={count}" for kind, count in sorted(s["inflight"].items())) or "-"
+        return (
+            f"⏱️ loop {self.name}: lag p95 {s['lag_p95_ms']}ms max {s['lag_max_ms']}ms, "
+            f"slow callbacks {s['slow_callbacks']}, tasks {s['tasks']}, in flight {inflight}, "
+            f"submit queue {s.get('submit_queue', 0)}"
+        )
+
+
+async def log_periodically(monitors: List[LoopMonitor], seconds: float) -> None:
+    """Print (and record, with metrics on) a summary of every monitored loop."""
+    while True:
+        await asyncio.sleep(seconds)
+        recorder = get_recorder()
+        for monitor in monitors:
+            print(monitor.summary())
+            if recorder is not None:
+                snapshot = monitor.snapshot()
+                recorder.record({
+                    "kind": "event_loop",
+                    "name": monitor.name,
+                    "duration_ms": snapshot["lag_p95_ms"],
+                    "lag_max_ms": snapshot["lag_max_ms"],
+                    "slow_callbacks": snapshot["slow_callbacks"],
+                    "tasks": snapshot["tasks"],
+                    "inflight": snapshot["inflight"],
+                    "submit_queue": snapshot.get("submit_queue", 0),
+                })
@@ -0,0 +1,175 @@
+"""
+Alpha Vantage market-data client shared by every backend's stock tools.
+
+Popular tickers get asked for by many users within seconds of each other, so
+quotes are served from a short per-symbol TTL cache. Concurrent requests for
+the same symbol share one HTTP call, and all requests reuse a keep-alive
+connection pool with timeouts and retries on transient gateway errors.
+
+Tools:
+    get_stock_price: one symbol (same output as the original tool)
+    get_stock_prices: several symbols in one tool call, fetched in parallel
+
+Environment Variables:
+    ALPHA_VANTAGE_API_KEY: API key (defaults to the demo key the tools used before)
+    ALPHA_VANTAGE_BASE_URL: query endpoint, point it at a local fake server for
+        testing (default: https://www.alphavantage.co/query)
+    MARKET_DATA_TTL: seconds a quote is reused (default 60)
+    MARKET_DATA_TIMEOUT: per-request timeout in seconds (default 10)
+    MARKET_DATA_POOL_SIZE: keep-alive connections and parallel batch fetches (default 10)
+"""
+from __future__ import annotations
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import requests
+from dotenv import load_dotenv
+from langchain_core.tools import tool
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from caching import MISSING, SingleFlight, TTLCache
+
+load_dotenv()
+
+DEFAULT_BASE_URL = "https://www.alphavantage.co/query"
+DEFAULT_API_KEY = "C9PE94QUEW9VWGFM"
+
+# Alpha Vantage reports rate limits and bad symbols with HTTP 200 and one of these keys
+_ERROR_KEYS = ("Note", "Information", "Error Message")
+
+
+class MarketDataClient:
+    """Pooled, cached GLOBAL_QUOTE client."""
+
+    def __init__(
+        self,
+        base_url: str = DEFAULT_BASE_URL,
+        api_key: str = DEFAULT_API_KEY,
+        ttl_seconds: float = 60.0,
+        timeout: float = 10.0,
+        pool_size: int = 10,
+        max_entries: int = 1024,
+    ):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.timeout = timeout
+        self.pool_size = pool_size
+
+        self.session = requests.Session()
+        retry = Retry(
+            total=2,
+            backoff_factor=0.3,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=("GET",),
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._cache = TTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self._inflight = SingleFlight()
+        self._batch_pool = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="market-data")
+        self._requests = 0
+        self._requests_lock = threading.Lock()
+
+    @staticmethod
+    def normalize(symbol: str) -> str:
+        return symbol.strip().upper()
+
+    def _fetch(self, symbol: str) -> Dict[str, Any]:
+        # Tool calls run on several threads at once
+        with self._requests_lock:
+            self._requests += 1
+        response = self.session.get(
+            self.base_url,
+            params={"function": "GLOBAL_QUOTE", "symbol": symbol, "apikey": self.api_key},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        data = response.json()
+        # Only real quotes are cached; rate-limit notices must not stick for a TTL
+        if data.get("Global Quote") and not any(key in data for key in _ERROR_KEYS):
+            self._cache.set(symbol, data)
+        return data
+
+    def _load(self, symbol: str) -> Dict[str, Any]:
+        return self._inflight.do(symbol, lambda: self._fetch(symbol))
+
+    def quote(self, symbol: str) -> Dict[str, Any]:
+        """Latest quote for one symbol, as returned by Alpha Vantage."""
+        symbol = self.normalize(symbol)
+        cached = self._cache.get(symbol)
+        if cached is not MISSING:
+            return cached
+        return self._load(symbol)
+
+    def quotes(self, symbols: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Quotes for several symbols; cache misses are fetched in parallel."""
+        unique = list(dict.fromkeys(self.normalize(s) for s in symbols if s.strip()))
+        results: Dict[str, Dict[str, Any]] = {}
+        futures = {}
+        for symbol in unique:
+            cached = self._cache.get(symbol)
+            if cached is not MISSING:
+                results[symbol] = cached
+            else:
+                futures[symbol] = self._batch_pool.submit(self._load, symbol)
+        for symbol, future in futures.items():
+            try:
+                results[symbol] = future.result()
+            except Exception as e:
+                # One bad symbol should not hide the others
+                results[symbol] = {"error": str(e)}
+        return {symbol: results[symbol] for symbol in unique}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._requests_lock:
+            requests_made = self._requests
+        return {**self._cache.stats(), "coalesced": self._inflight.coalesced, "http_requests": requests_made}
+
+
+# -------------------
+# Shared client
+# -------------------
+_client: Optional[MarketDataClient] = None
+_client_lock = threading.Lock()
+
+
+def get_market_data_client() -> MarketDataClient:
+    global _client
+
+    with _client_lock:
+        if _client is None:
+            _client = MarketDataClient(
+                base_url=os.getenv("ALPHA_VANTAGE_BASE_URL", DEFAULT_BASE_URL),
+                api_key=os.getenv("ALPHA_VANTAGE_API_KEY", DEFAULT_API_KEY),
+                ttl_seconds=float(os.getenv("MARKET_DATA_TTL", "60")),
+                timeout=float(os.getenv("MARKET_DATA_TIMEOUT", "10")),
+                pool_size=int(os.getenv("MARKET_DATA_POOL_SIZE", "10")),
+            )
+        return _client
+
+
+# -------------------
+# Tools
+# -------------------
+@tool
+def get_stock_price(symbol: str) -> dict:
+    """
+    Fetch latest stock price for a given symbol (e.g. 'AAPL', 'TSLA')
+    using Alpha Vantage.
+    """
+    return get_market_data_client().quote(symbol)
+
+
+@tool
+def get_stock_prices(symbols: list[str]) -> dict:
+    """
+    Fetch latest stock prices for several symbols at once (e.g. ['AAPL', 'TSLA', 'MSFT']).
+    Prefer this over calling get_stock_price repeatedly.
+    """
+    return get_market_data_client().quotes(symbols)
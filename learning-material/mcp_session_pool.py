@@ -0,0 +1,292 @@
+"""
+Long-lived MCP sessions for tool calls.
+
+Without a session, every MCP tool call made by `langchain_mcp_adapters` opens
+a fresh session: a process spawn plus the initialize handshake for stdio
+servers, a new connection and handshake for HTTP ones. `MCPSessionPool`
+keeps a few sessions per server open on the backend event loop instead:
+
+    - MCP_POOL_SIZE sessions per server (overridable per server), each owned
+      by one task that opens it, keeps it alive and closes it
+    - keep-alive pings every MCP_POOL_PING_SECONDS; a session that fails a
+      ping, or whose call failed on the transport, is reopened, which
+      restarts a crashed stdio server, with exponential backoff
+    - least-loaded dispatch: a call goes to the ready session with the
+      fewest calls in flight (MCP sessions multiplex requests)
+
+`session_for(server)` returns an object with the `call_tool` method the
+adapter uses, so tools are built with
+`convert_mcp_tool_to_langchain_tool(pool.session_for(server), tool)`.
+Per-session counters are available from `stats()`.
+
+Environment Variables:
+    MCP_POOL_ENABLED: "1"/"true" to call MCP tools through pooled sessions (default off)
+    MCP_POOL_SIZE: sessions per server (default 2)
+    MCP_POOL_PING_SECONDS: keep-alive ping interval (default 30)
+    MCP_POOL_PING_TIMEOUT: seconds before a ping counts as failed (default 5)
+    MCP_POOL_ACQUIRE_TIMEOUT: seconds a call waits for a ready session (default 10)
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from collections import deque
+from datetime import timedelta
+from typing import Any, AsyncContextManager, Callable, Dict, Iterable, List, Optional
+
+from dotenv import load_dotenv
+
+from instrumentation import percentile, get_recorder
+from tool_executor import remaining_time
+
+load_dotenv()
+
+_MAX_BACKOFF = 30.0
+
+
+def pool_enabled() -> bool:
+    return os.getenv("MCP_POOL_ENABLED", "").strip().lower() in ("1", "true", "yes")
+
+
+class _PooledSession:
+    """One session slot; its owner task (re)opens the session."""
+
+    def __init__(self, server: str, index: int):
+        self.server = server
+        self.index = index
+        self.session: Any = None
+        self.ready = asyncio.Event()
+        self.suspect = asyncio.Event()
+        self.in_flight = 0
+        self.calls = 0
+        self.errors = 0
+        self.restarts = 0
+        self.pings = 0
+        self.latencies: deque = deque(maxlen=500)
+
+
+class _SessionHandle:
+    """Stands in for a ClientSession in converted tools; each call is dispatched by the pool."""
+
+    def __init__(self, pool: "MCPSessionPool", server: str):
+        self._pool = pool
+        self._server = server
+
+    async def call_tool(self, name: str, arguments: Optional[Dict[str, Any]] = None, **kwargs: Any) -> Any:
+        remaining = remaining_time()
+        if remaining is not None and kwargs.get("read_timeout_seconds") is None:
+            # The server-side request is abandoned when the tool call's deadline passes
+            kwargs["read_timeout_seconds"] = timedelta(seconds=remaining)
+        return await self._pool.call_tool(self._server, name, arguments, **kwargs)
+
+
+class MCPSessionPool:
+    """Fixed-size pools of MCP sessions per server, health-checked by pings."""
+
+    def __init__(
+        self,
+        open_session: Callable[[str], AsyncContextManager[Any]],
+        servers: Iterable[str],
+        size: int = 2,
+        sizes: Optional[Dict[str, int]] = None,
+        ping_interval: float = 30.0,
+        ping_timeout: float = 5.0,
+        acquire_timeout: float = 10.0,
+    ):
+        # `open_session(server)` yields an initialized session, e.g. MultiServerMCPClient.session
+        self.open_session = open_session
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        self.acquire_timeout = acquire_timeout
+        sizes = sizes or {}
+        self._slots: Dict[str, List[_PooledSession]] = {
+            server: [_PooledSession(server, i) for i in range(max(1, sizes.get(server, size)))]
+            for server in servers
+        }
+        self._ready_changed: Dict[str, asyncio.Condition] = {server: asyncio.Condition() for server in self._slots}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: List[asyncio.Future] = []
+        self._closed = False
+
+    @classmethod
+    def from_env(
+        cls,
+        open_session: Callable[[str], AsyncContextManager[Any]],
+        servers: Iterable[str],
+        sizes: Optional[Dict[str, int]] = None,
+    ) -> "MCPSessionPool":
+        return cls(
+            open_session,
+            servers,
+            size=int(os.getenv("MCP_POOL_SIZE", "2")),
+            sizes=sizes,
+            ping_interval=float(os.getenv("MCP_POOL_PING_SECONDS", "30")),
+            ping_timeout=float(os.getenv("MCP_POOL_PING_TIMEOUT", "5")),
+            acquire_timeout=float(os.getenv("MCP_POOL_ACQUIRE_TIMEOUT", "10")),
+        )
+
+    # -------------------
+    # Lifecycle
+    # -------------------
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Open every session in the background on `loop`; callable from any thread."""
+        if self._loop is not None:
+            return
+        self._loop = loop
+        self._tasks = [
+            asyncio.run_coroutine_threadsafe(self._own(slot), loop)
+            for slots in self._slots.values()
+            for slot in slots
+        ]
+
+    async def close(self) -> None:
+        self._closed = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*(asyncio.wrap_future(task) for task in self._tasks), return_exceptions=True)
+
+    async def _set_ready(self, slot: _PooledSession, ready: bool) -> None:
+        if ready:
+            slot.ready.set()
+        else:
+            slot.ready.clear()
+        condition = self._ready_changed[slot.server]
+        async with condition:
+            condition.notify_all()
+
+    async def _own(self, slot: _PooledSession) -> None:
+        backoff = 1.0
+        while not self._closed:
+            try:
+                # Entered and exited in this task, as the transports' task groups require
+                async with self.open_session(slot.server) as session:
+                    slot.session = session
+                    await self._set_ready(slot, True)
+                    pings = slot.pings
+                    await self._keep_alive(slot)
+                    # Stop dispatching before the (possibly slow) close
+                    await self._set_ready(slot, False)
+                    if slot.pings > pings:
+                        backoff = 1.0  # it was healthy for a while; not a crash loop
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ MCP session {slot.server}#{slot.index} failed: {str(e)}")
+            finally:
+                slot.session = None
+                if not self._closed:
+                    await self._set_ready(slot, False)
+            if self._closed:
+                return
+            slot.restarts += 1
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, _MAX_BACKOFF)
+
+    async def _keep_alive(self, slot: _PooledSession) -> None:
+        """Returns when the session stops answering pings."""
+        while True:
+            try:
+                # A failed call wakes this up early to check the session right away
+                await asyncio.wait_for(slot.suspect.wait(), timeout=self.ping_interval)
+            except asyncio.TimeoutError:
+                pass
+            slot.suspect.clear()
+            try:
+                await asyncio.wait_for(slot.session.send_ping(), timeout=self.ping_timeout)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ MCP session {slot.server}#{slot.index} did not answer a ping, reopening: {str(e) or type(e).__name__}")
+                return
+            slot.pings += 1
+
+    # -------------------
+    # Calls
+    # -------------------
+    async def _acquire(self, server: str) -> _PooledSession:
+        slots = self._slots[server]
+        condition = self._ready_changed[server]
+
+        def least_loaded() -> Optional[_PooledSession]:
+            ready = [slot for slot in slots if slot.ready.is_set()]
+            return min(ready, key=lambda slot: (slot.in_flight, slot.calls)) if ready else None
+
+        slot = least_loaded()
+        if slot is None:
+            try:
+                async with condition:
+                    await asyncio.wait_for(condition.wait_for(lambda: least_loaded() is not None), self.acquire_timeout)
+            except asyncio.TimeoutError:
+                raise RuntimeError(f"No MCP session for {server!r} became ready within {self.acquire_timeout:g}s") from None
+            slot = least_loaded()
+        return slot
+
+    async def call_tool(self, server: str, name: str, arguments: Optional[Dict[str, Any]] = None, **kwargs: Any) -> Any:
+        """`session.call_tool` on the least-loaded ready session of `server`."""
+        if self._loop is None:
+            raise RuntimeError("MCPSessionPool.start() has not been called")
+        if asyncio.get_running_loop() is not self._loop:
+            # The sessions belong to the pool's loop
+            future = asyncio.run_coroutine_threadsafe(self.call_tool(server, name, arguments, **kwargs), self._loop)
+            return await asyncio.wrap_future(future)
+
+        slot = await self._acquire(server)
+        slot.in_flight += 1
+        slot.calls += 1
+        start = time.perf_counter()
+        error = False
+        try:
+            return await slot.session.call_tool(name, arguments, **kwargs)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Could be a dead transport; the owner pings and reopens if so
+            error = True
+            slot.errors += 1
+            slot.suspect.set()
+            raise
+        finally:
+            slot.in_flight -= 1
+            elapsed = time.perf_counter() - start
+            slot.latencies.append(elapsed)
+            self._record(server, name, elapsed, error)
+
+    def session_for(self, server: str) -> _SessionHandle:
+        if server not in self._slots:
+            raise KeyError(f"Unknown MCP server {server!r}")
+        return _SessionHandle(self, server)
+
+    def _record(self, server: str, name: str, elapsed: float, error: bool) -> None:
+        recorder = get_recorder()
+        if recorder is not None:
+            recorder.record({
+                "kind": "mcp_call",
+                "name": f"{server}.{name}",
+                "duration_ms": round(elapsed * 1000, 2),
+                "error": error,
+            })
+
+    # -------------------
+    # Stats
+    # -------------------
+    def stats(self) -> Dict[str, Any]:
+        servers: Dict[str, Any] = {}
+        for server, slots in self._slots.items():
+            ordered = sorted(latency for slot in slots for latency in slot.latencies)
+            servers[server] = {
+                "ready": sum(slot.ready.is_set() for slot in slots),
+                "size": len(slots),
+                "in_flight": sum(slot.in_flight for slot in slots),
+                "calls": sum(slot.calls for slot in slots),
+                "errors": sum(slot.errors for slot in slots),
+                "restarts": sum(slot.restarts for slot in slots),
+                "pings": sum(slot.pings for slot in slots),
+                "call_p50_ms": round(percentile(ordered, 50) * 1000, 2),
+                "call_p95_ms": round(percentile(ordered, 95) * 1000, 2),
+                "sessions": [
+                    {"ready": slot.ready.is_set(), "in_flight": slot.in_flight, "calls": slot.calls}
+                    for slot in slots
+                ],
+            }
+        return servers
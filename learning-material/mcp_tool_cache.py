@@ -0,0 +1,131 @@
+"""
+On-disk cache of MCP tool schemas for the MCP backend.
+
+Discovering tools means starting every configured MCP server (a process
+spawn for stdio servers, a network round trip for HTTP ones) and listing its
+tools before the LLM can be bound. The schemas rarely change, so they are kept
+in a JSON file per server with the time they were fetched and a fingerprint
+of the server's connection settings:
+
+    - startup builds the tools straight from the cache, whatever its age, and
+      only contacts servers that have no cached entry yet
+    - a background task re-lists the tools of servers whose entry is older
+      than the TTL and reports whether any schema actually changed, so the
+      backend can rebind the LLM and the tool node
+    - a server that cannot be reached keeps serving its last known tools and
+      is retried sooner than the TTL
+
+Changing a server's connection settings invalidates its entry.
+
+Environment Variables:
+    MCP_TOOL_CACHE_PATH: JSON cache file (default mcp_tools_cache.json)
+    MCP_TOOL_CACHE_TTL: seconds before a server's tools are re-listed (default 3600)
+    MCP_TOOL_RETRY_SECONDS: retry delay for servers that failed to list (default 60)
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _fingerprint(value: Any) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+async def fetch_tool_schemas(client, server: str) -> List[Dict[str, Any]]:
+    """List every tool of one server (following pagination) as plain JSON."""
+    schemas: List[Dict[str, Any]] = []
+    async with client.session(server) as session:
+        cursor = None
+        while True:
+            page = await session.list_tools(cursor=cursor)
+            schemas.extend(tool.model_dump(mode="json", exclude_none=True) for tool in page.tools)
+            cursor = page.nextCursor
+            if not cursor:
+                return schemas
+
+
+class ToolSchemaCache:
+    """Per-server tool schemas persisted to one JSON file."""
+
+    def __init__(self, path: str = "mcp_tools_cache.json", ttl_seconds: float = 3600.0, retry_seconds: float = 60.0):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.retry_seconds = retry_seconds
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = self._read()
+
+    @classmethod
+    def from_env(cls) -> "ToolSchemaCache":
+        return cls(
+            path=os.getenv("MCP_TOOL_CACHE_PATH", "mcp_tools_cache.json"),
+            ttl_seconds=float(os.getenv("MCP_TOOL_CACHE_TTL", "3600")),
+            retry_seconds=float(os.getenv("MCP_TOOL_RETRY_SECONDS", "60")),
+        )
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Ignoring unreadable MCP tool cache {self.path}: {str(e)}")
+            return {}
+
+    def _write(self) -> None:
+        # Write-then-rename so a crash never leaves a half-written cache
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def get(self, server: str, connection: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+        """Cached schemas for the server, at any age, if its connection is unchanged."""
+        with self._lock:
+            entry = self._entries.get(server)
+            if entry is None or entry.get("connection") != _fingerprint(connection):
+                return None
+            return entry["tools"]
+
+    def is_stale(self, server: str) -> bool:
+        with self._lock:
+            entry = self._entries.get(server)
+        return entry is None or time.time() - entry.get("fetched_at", 0) >= self.ttl_seconds
+
+    def put(self, server: str, connection: Dict[str, Any], tools: List[Dict[str, Any]]) -> bool:
+        """Store freshly listed schemas; True if they differ from the cached ones."""
+        with self._lock:
+            previous = self._entries.get(server) or {}
+            schemas = _fingerprint(tools)
+            changed = (
+                previous.get("schemas") != schemas
+                or previous.get("connection") != _fingerprint(connection)
+            )
+            self._entries[server] = {
+                "connection": _fingerprint(connection),
+                "schemas": schemas,
+                "fetched_at": time.time(),
+                "tools": tools,
+            }
+            try:
+                self._write()
+            except OSError as e:
+                print(f"⚠️ Could not write MCP tool cache {self.path}: {str(e)}")
+            return changed
+
+    def next_refresh_in(self, servers: Iterable[str]) -> float:
+        """Seconds until the first of the given servers goes stale."""
+        with self._lock:
+            fetched = [self._entries[s].get("fetched_at", 0) for s in servers if s in self._entries]
+        if not fetched:
+            return self.retry_seconds
+        return max(0.0, min(fetched) + self.ttl_seconds - time.time())
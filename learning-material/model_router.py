@@ -0,0 +1,347 @@
+"""
+Cost/latency-aware model routing for `chat_node`.
+
+Every turn used to go to one model. `ModelRouter` picks a tier per call from
+cheap local signals, before any tokens are spent:
+
+    - length of the latest user message
+    - tools the message likely needs (keyword hints per tool)
+    - whether the thread has a document attached
+    - conversation depth (user turns so far)
+    - whether the call is writing up tool results, and from which tools
+
+Greetings, arithmetic and stock lookups stay on the small tier; long
+questions, document questions and deep conversations go to the large tier.
+With MODEL_ROUTER_ESCALATE on, a small-tier answer that looks unsure (empty,
+cut off, or hedging) and made no tool call is re-sent to the next tier up.
+Calls that may still escalate are tagged `nostream`, so the unsure answer is
+never streamed into the same bubble as the escalated one; the graph emits
+the kept answer as one message when the node finishes.
+
+Per-tier calls, latency, tokens and estimated cost are kept in `stats()`,
+including what the same calls would have cost on the top tier. Each call is
+also reported to the metrics recorder as a `route` event.
+
+With routing off (the default) the router has a single tier, the backend's
+existing model, so behaviour is unchanged and the stats still work.
+
+Environment Variables:
+    MODEL_ROUTER_ENABLED: "1"/"true" to route between tiers (default off)
+    MODEL_ROUTER_SMALL: small-tier model (default gpt-4o-mini)
+    MODEL_ROUTER_LARGE: large-tier model (default gpt-4o)
+    MODEL_ROUTER_LONG_MESSAGE_CHARS: messages at least this long go large (default 800)
+    MODEL_ROUTER_DEEP_TURNS: conversations with this many user turns go large (default 12)
+    MODEL_ROUTER_ESCALATE: "1"/"true" to escalate unsure answers (default off)
+"""
+from __future__ import annotations
+
+import os
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+from dotenv import load_dotenv
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.runnables.config import merge_configs
+
+from instrumentation import percentile, thread_id_of, estimate_cost, get_recorder
+from lazy import Lazy
+
+load_dotenv()
+
+# Keyword hints for the tools a message will probably need
+TOOL_HINTS: Dict[str, re.Pattern] = {
+    "calculator": re.compile(
+        r"\d\s*[-+*/x^]\s*\d|\b(add|sum|plus|minus|subtract|multiply|times|divide|calculate|compute)\b", re.I
+    ),
+    "get_stock_price": re.compile(r"\b(stocks?|share price|ticker|quote)\b|\$[A-Z]{1,5}\b", re.I),
+    "duckduckgo_search": re.compile(r"\b(latest|news|today|current|search|look up|who is|what happened)\b", re.I),
+    "rag_tool": re.compile(r"\b(document|pdf|page|section|chapter|paper|file|uploaded)\b", re.I),
+}
+
+# Tools that are cheap to call and whose results are easy to relay
+SIMPLE_TOOLS = frozenset({"calculator", "get_stock_price", "get_stock_prices"})
+
+_SMALL_TALK = re.compile(r"^\s*(hi|hello|hey|thanks|thank you|ok|okay|bye|good (morning|evening))\b", re.I)
+_HEDGES = re.compile(
+    r"\b(i'?m not sure|i am not sure|i don'?t know|i do not know|i'?m unable to|i am unable to|"
+    r"i cannot (determine|answer|be certain)|not enough information)\b",
+    re.I,
+)
+
+# Calls that may be replaced by an escalated answer are kept out of stream_mode="messages"
+_NOSTREAM_CONFIG = {"tags": ["nostream"]}
+
+
+def _text(message: BaseMessage) -> str:
+    content = message.content
+    if isinstance(content, str):
+        return content
+    return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+
+
+@dataclass(frozen=True)
+class RouteSignals:
+    chars: int = 0
+    likely_tools: FrozenSet[str] = frozenset()
+    has_document: bool = False
+    depth: int = 0
+    small_talk: bool = False
+    # Tools whose results this call will write up (empty on a fresh question)
+    tool_results: FrozenSet[str] = frozenset()
+
+    @classmethod
+    def from_messages(cls, messages: Sequence[BaseMessage], has_document: bool = False) -> "RouteSignals":
+        depth = sum(1 for message in messages if isinstance(message, HumanMessage))
+        tool_results = set()
+        for message in reversed(messages):
+            if not isinstance(message, ToolMessage):
+                break
+            tool_results.add(message.name or "")
+        question = next((_text(m) for m in reversed(messages) if isinstance(m, HumanMessage)), "")
+        return cls(
+            chars=len(question),
+            likely_tools=frozenset(name for name, hint in TOOL_HINTS.items() if hint.search(question)),
+            has_document=has_document,
+            depth=depth,
+            small_talk=len(question) < 60 and bool(_SMALL_TALK.match(question)),
+            tool_results=frozenset(tool_results),
+        )
+
+
+def low_confidence(response: BaseMessage) -> bool:
+    """True when a final answer looks unsure enough to retry on a bigger model."""
+    if not isinstance(response, AIMessage) or response.tool_calls:
+        return False
+    if (response.response_metadata or {}).get("finish_reason") == "length":
+        return True
+    text = _text(response).strip()
+    return not text or bool(_HEDGES.search(text[:300]))
+
+
+def _model_name(model: Any) -> Optional[str]:
+    # Tool-bound models are RunnableBindings around the chat model
+    return getattr(getattr(model, "bound", model), "model_name", None)
+
+
+def _invoke(model, messages, config=None):
+    return model.invoke(messages, config=config)
+
+
+async def _ainvoke(model, messages, config=None):
+    return await model.ainvoke(messages, config=config)
+
+
+@dataclass
+class _TierStats:
+    calls: int = 0
+    escalations: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost_usd: float = 0.0
+    top_tier_cost_usd: float = 0.0
+    total_ms: float = 0.0
+    samples: deque = field(default_factory=lambda: deque(maxlen=1000))
+    reasons: Dict[str, int] = field(default_factory=dict)
+
+
+class ModelRouter:
+    """Chooses a model tier per call and escalates unsure answers."""
+
+    def __init__(
+        self,
+        tiers: Dict[str, Callable[[], Any]],
+        models: Optional[Dict[str, str]] = None,
+        long_message_chars: int = 800,
+        deep_turns: int = 12,
+        escalate: bool = False,
+    ):
+        # Cheapest first; each value returns the (tool-bound) model for the tier
+        self.order: List[str] = list(tiers)
+        self.tiers = tiers
+        self.models = dict(models or {})
+        self.long_message_chars = long_message_chars
+        self.deep_turns = deep_turns
+        self.escalate = escalate
+        self._stats: Dict[str, _TierStats] = {tier: _TierStats() for tier in self.order}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, default: Callable[[], Any], build: Callable[[str], Any]) -> "ModelRouter":
+        """`default` returns the backend's current model; `build(model_name)` makes a tier model."""
+        if os.getenv("MODEL_ROUTER_ENABLED", "").strip().lower() not in ("1", "true", "yes"):
+            return cls({"default": default}, escalate=False)
+
+        small = os.getenv("MODEL_ROUTER_SMALL", "gpt-4o-mini")
+        large = os.getenv("MODEL_ROUTER_LARGE", "gpt-4o")
+        return cls(
+            {"small": Lazy(lambda: build(small)).get, "large": Lazy(lambda: build(large)).get},
+            models={"small": small, "large": large},
+            long_message_chars=int(os.getenv("MODEL_ROUTER_LONG_MESSAGE_CHARS", "800")),
+            deep_turns=int(os.getenv("MODEL_ROUTER_DEEP_TURNS", "12")),
+            escalate=os.getenv("MODEL_ROUTER_ESCALATE", "").strip().lower() in ("1", "true", "yes"),
+        )
+
+    # -------------------
+    # Routing
+    # -------------------
+    def choose(self, signals: RouteSignals) -> Tuple[str, str]:
+        """(tier, reason) for one call."""
+        if len(self.order) == 1:
+            return self.order[0], "single tier"
+        small, large = self.order[0], self.order[-1]
+
+        if signals.tool_results:
+            if signals.tool_results <= SIMPLE_TOOLS:
+                return small, "simple tool results"
+            return large, "tool results need synthesis"
+        if signals.small_talk:
+            return small, "small talk"
+        if signals.has_document:
+            return large, "document attached"
+        if "rag_tool" in signals.likely_tools:
+            return large, "document question"
+        if signals.chars >= self.long_message_chars:
+            return large, "long message"
+        if signals.depth >= self.deep_turns:
+            return large, "deep conversation"
+        if signals.likely_tools and signals.likely_tools <= SIMPLE_TOOLS:
+            return small, "simple tool call"
+        return small, "default"
+
+    def model_for(self, tier: str) -> Any:
+        return self.tiers[tier]()
+
+    def refresh(self) -> None:
+        """Rebuild lazily built tier models on next use (e.g. after the tool set changed)."""
+        for factory in self.tiers.values():
+            owner = getattr(factory, "__self__", None)
+            if isinstance(owner, Lazy):
+                owner.reset()
+
+    def _next_tier(self, tier: str) -> Optional[str]:
+        index = self.order.index(tier)
+        return self.order[index + 1] if index + 1 < len(self.order) else None
+
+    def _call_config(self, tier: str, config):
+        """`config` for a tier call; tagged `nostream` while a higher tier could still replace the answer."""
+        if self.escalate and self._next_tier(tier) is not None:
+            return merge_configs(config, _NOSTREAM_CONFIG)
+        return config
+
+    # -------------------
+    # Calls
+    # -------------------
+    def invoke(
+        self,
+        messages: Sequence[BaseMessage],
+        *,
+        history: Optional[Sequence[BaseMessage]] = None,
+        has_document: bool = False,
+        config=None,
+        call: Callable = _invoke,
+    ) -> BaseMessage:
+        """Route `messages` (the prompt) using signals from `history` (the full thread)."""
+        signals = RouteSignals.from_messages(history if history is not None else messages, has_document)
+        tier, reason = self.choose(signals)
+        while True:
+            model = self.model_for(tier)
+            start = time.perf_counter()
+            response = call(model, messages, config=self._call_config(tier, config))
+            next_tier = self._finish(tier, reason, model, response, start, config)
+            if next_tier is None:
+                return response
+            tier, reason = next_tier, f"escalated from {tier}"
+
+    async def ainvoke(
+        self,
+        messages: Sequence[BaseMessage],
+        *,
+        history: Optional[Sequence[BaseMessage]] = None,
+        has_document: bool = False,
+        config=None,
+        call: Callable = _ainvoke,
+    ) -> BaseMessage:
+        signals = RouteSignals.from_messages(history if history is not None else messages, has_document)
+        tier, reason = self.choose(signals)
+        while True:
+            model = self.model_for(tier)
+            start = time.perf_counter()
+            response = await call(model, messages, config=self._call_config(tier, config))
+            next_tier = self._finish(tier, reason, model, response, start, config)
+            if next_tier is None:
+                return response
+            tier, reason = next_tier, f"escalated from {tier}"
+
+    def _finish(self, tier: str, reason: str, model: Any, response: BaseMessage, start: float, config) -> Optional[str]:
+        """Record the call; return the tier to retry on, if any."""
+        duration_ms = (time.perf_counter() - start) * 1000
+        next_tier = self._next_tier(tier) if self.escalate and low_confidence(response) else None
+
+        usage = getattr(response, "usage_metadata", None) or {}
+        prompt_tokens = usage.get("input_tokens", 0)
+        completion_tokens = usage.get("output_tokens", 0)
+        model_name = self.models.get(tier) or _model_name(model)
+        top_model = self.models.get(self.order[-1]) or model_name
+        cost = estimate_cost(model_name, prompt_tokens, completion_tokens) or 0.0
+        top_cost = estimate_cost(top_model, prompt_tokens, completion_tokens) or 0.0
+
+        with self._lock:
+            stats = self._stats[tier]
+            stats.calls += 1
+            stats.escalations += 1 if next_tier else 0
+            stats.prompt_tokens += prompt_tokens
+            stats.completion_tokens += completion_tokens
+            stats.cost_usd += cost
+            stats.top_tier_cost_usd += top_cost
+            stats.total_ms += duration_ms
+            stats.samples.append(duration_ms)
+            stats.reasons[reason] = stats.reasons.get(reason, 0) + 1
+
+        recorder = get_recorder()
+        if recorder is not None:
+            recorder.record({
+                "kind": "route",
+                "name": tier,
+                "duration_ms": round(duration_ms, 2),
+                "thread_id": thread_id_of((config or {}).get("configurable")),
+                "model": model_name,
+                "reason": reason,
+                "escalated": bool(next_tier),
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "cost_usd": cost,
+            })
+        return next_tier
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-tier calls, latency, tokens and cost, and the saving against the top tier."""
+        with self._lock:
+            tiers = {}
+            cost = top_cost = 0.0
+            for tier in self.order:
+                stats = self._stats[tier]
+                ordered = sorted(stats.samples)
+                tiers[tier] = {
+                    "model": self.models.get(tier),
+                    "calls": stats.calls,
+                    "escalations": stats.escalations,
+                    "mean_ms": round(stats.total_ms / stats.calls, 2) if stats.calls else 0.0,
+                    "p50_ms": round(percentile(ordered, 50), 2),
+                    "p95_ms": round(percentile(ordered, 95), 2),
+                    "prompt_tokens": stats.prompt_tokens,
+                    "completion_tokens": stats.completion_tokens,
+                    "cost_usd": round(stats.cost_usd, 6),
+                    "reasons": dict(stats.reasons),
+                }
+                cost += stats.cost_usd
+                top_cost += stats.top_tier_cost_usd
+            return {
+                "tiers": tiers,
+                "cost_usd": round(cost, 6),
+                "top_tier_cost_usd": round(top_cost, 6),
+                "saved_usd": round(top_cost - cost, 6),
+            }
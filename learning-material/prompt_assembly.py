@@ -0,0 +1,64 @@
+"""
+Prompt assembly ordered for provider-side prefix caching.
+
+OpenAI (and most providers) reuse the computation for the longest prompt
+prefix they have seen recently, which shows up as `cache_read` tokens in the
+response's usage metadata. A prefix only matches if it is byte-for-byte the
+same, so anything per-thread or per-turn near the top of the prompt (a
+thread_id in the system prompt, a timestamp, retrieved excerpts) makes every
+call a miss.
+
+`PromptAssembler` always builds the message list in the same order, from most
+to least stable:
+
+    1. fixed system prompt   (identical for every thread; tool schemas are
+                              sent ahead of it and are fixed per backend)
+    2. long-lived context    (thread-level blocks that rarely change)
+    3. history window        (rolling summary, then the recent turns)
+    4. turn context          (this call only, never persisted)
+
+Per-thread values such as the thread_id do not go in the prompt at all: tools
+read them from the RunnableConfig (see `config_thread_id`).
+
+The share of prompt tokens served from the provider cache is reported by
+`instrumentation.metrics_snapshot()` (totals and per thread).
+"""
+from __future__ import annotations
+
+from typing import List, Optional, Sequence
+
+from langchain_core.messages import BaseMessage, SystemMessage
+from langchain_core.runnables import RunnableConfig
+
+
+def config_thread_id(config: Optional[RunnableConfig]) -> Optional[str]:
+    """thread_id of the current run, as injected into nodes and tools."""
+    thread_id = ((config or {}).get("configurable") or {}).get("thread_id")
+    return str(thread_id) if thread_id is not None else None
+
+
+class PromptAssembler:
+    """Builds the message list for one call in stable-first order."""
+
+    def __init__(self, system_prompt: Optional[str] = None):
+        self.system_message = SystemMessage(content=system_prompt) if system_prompt else None
+
+    def assemble(
+        self,
+        history: Sequence[BaseMessage],
+        *,
+        context: Sequence[str] = (),
+        turn_context: Sequence[BaseMessage] = (),
+    ) -> List[BaseMessage]:
+        """
+        Args:
+            history: the ContextWindow output (summary first, then recent turns)
+            context: long-lived, thread-level text blocks
+            turn_context: messages for this call only; placed last so the
+                prefix up to the user's question can still be reused
+        """
+        messages: List[BaseMessage] = [self.system_message] if self.system_message else []
+        messages.extend(SystemMessage(content=block) for block in context)
+        messages.extend(history)
+        messages.extend(turn_context)
+        return messages
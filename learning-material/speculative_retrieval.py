@@ -0,0 +1,132 @@
+"""
+Speculative document retrieval for the RAG backend.
+
+A document question normally costs two serial LLM calls with the retrieval in
+between: chat_node decides to call `rag_tool`, the tool embeds the query and
+searches FAISS, then chat_node runs again with the context. When the thread
+has a document, retrieval for the user's message can start *before* the first
+LLM call returns:
+
+    prefetch: retrieval runs alongside the first LLM call; if the model then
+              calls rag_tool with the user's question, the tool answers from
+              the prefetched result instead of searching again
+    inject:   the first LLM call waits for the retrieval and gets the excerpts
+              in its prompt, so the model can answer without the tool round trip
+
+Environment Variables:
+    RAG_SPECULATIVE_MODE: "off" (default), "prefetch" or "inject"
+    RAG_PREFETCH_WAIT: seconds chat_node (inject) or rag_tool (prefetch) waits
+        for a speculative result before falling back (default 5)
+    RAG_PREFETCH_WORKERS: retrieval threads (default 4)
+"""
+from __future__ import annotations
+
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MODES = ("off", "prefetch", "inject")
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def speculative_mode() -> str:
+    mode = os.getenv("RAG_SPECULATIVE_MODE", "off").strip().lower()
+    return mode if mode in MODES else "off"
+
+
+def _normalize(query: str) -> str:
+    return _WHITESPACE.sub(" ", query).strip().lower().rstrip("?.! ")
+
+
+class RetrievalPrefetcher:
+    """Holds at most one speculative retrieval per thread (the current turn's)."""
+
+    def __init__(
+        self,
+        retrieve: Callable[[str, str], Dict[str, Any]],
+        max_workers: int = 4,
+        wait_seconds: float = 5.0,
+    ):
+        self.retrieve = retrieve
+        self.wait_seconds = wait_seconds
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rag-prefetch")
+        # thread_id -> (normalized query, future of (result, seconds))
+        self._pending: Dict[str, Tuple[str, Future]] = {}
+        self._lock = threading.Lock()
+        self._started = 0
+        self._used = 0
+        self._injected = 0
+        self._seconds_overlapped = 0.0
+
+    def _timed_retrieve(self, thread_id: str, query: str) -> Tuple[Dict[str, Any], float]:
+        start = time.perf_counter()
+        result = self.retrieve(thread_id, query)
+        return result, time.perf_counter() - start
+
+    def start(self, thread_id: str, query: str) -> None:
+        """Begin retrieval for the user's message; replaces any older speculation for the thread."""
+        future = self._pool.submit(self._timed_retrieve, thread_id, query)
+        with self._lock:
+            self._pending[thread_id] = (_normalize(query), future)
+            self._started += 1
+
+    def _result(self, future: Future) -> Optional[Tuple[Dict[str, Any], float]]:
+        try:
+            return future.result(timeout=self.wait_seconds)
+        except FutureTimeoutError:
+            return None
+        except Exception:
+            # Speculation failing is never fatal; the normal path retrieves again
+            return None
+
+    def take(self, thread_id: str, query: str) -> Optional[Dict[str, Any]]:
+        """Prefetched result for exactly this query, or None (called from rag_tool)."""
+        with self._lock:
+            pending = self._pending.get(thread_id)
+            if pending is None or pending[0] != _normalize(query):
+                return None
+            del self._pending[thread_id]
+        outcome = self._result(pending[1])
+        if outcome is None:
+            return None
+        result, seconds = outcome
+        with self._lock:
+            self._used += 1
+            self._seconds_overlapped += seconds
+        return result
+
+    def wait(self, thread_id: str) -> Optional[Dict[str, Any]]:
+        """Current speculative result for the thread (inject mode); stays available to take()."""
+        with self._lock:
+            pending = self._pending.get(thread_id)
+        if pending is None:
+            return None
+        outcome = self._result(pending[1])
+        if outcome is None:
+            return None
+        with self._lock:
+            self._injected += 1
+        return outcome[0]
+
+    def discard(self, thread_id: str) -> None:
+        with self._lock:
+            self._pending.pop(thread_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "started": self._started,
+                "used_by_tool": self._used,
+                "injected": self._injected,
+                "hit_ratio": (self._used + self._injected) / self._started if self._started else 0.0,
+                "retrieval_seconds_overlapped": self._seconds_overlapped,
+            }
@@ -0,0 +1,129 @@
+"""
+Consume an async stream from synchronous code (e.g. a Streamlit script).
+
+The async backends run their graph on a dedicated event loop thread, while
+Streamlit iterates with plain `for`. `AsyncStreamBridge` runs the async
+iterable as a task on that loop and hands its items over through a queue:
+
+    - bounded: the task pauses once `maxsize` items are waiting, so a reader
+      that stops reading also stops the producer (and the LLM calls behind it)
+    - cancellable: `close()` (also run by `with`, by closing a generator that
+      iterates the bridge, and on garbage collection) cancels the task and
+      closes the async generator
+    - errors: an exception raised by the stream is re-raised by the reader's
+      `next()` with its original traceback
+
+    with AsyncStreamBridge(chatbot.astream(...), loop) as events:
+        for chunk, metadata in events:
+            ...
+
+Environment Variables:
+    STREAM_BRIDGE_MAXSIZE: items buffered ahead of the reader (default 64)
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import queue
+from typing import Any, AsyncIterable, Generic, Iterator, Optional, TypeVar
+
+from dotenv import load_dotenv
+
+from loop_monitor import track_inflight
+
+load_dotenv()
+
+T = TypeVar("T")
+
+_ITEM, _ERROR, _DONE = "item", "error", "done"
+
+
+class AsyncStreamBridge(Generic[T]):
+    """Iterator over an async iterable that is consumed on another thread's loop."""
+
+    def __init__(
+        self,
+        aiterable: AsyncIterable[T],
+        loop: asyncio.AbstractEventLoop,
+        maxsize: Optional[int] = None,
+        timeout: Optional[float] = None,
+    ):
+        self.maxsize = maxsize if maxsize is not None else int(os.getenv("STREAM_BRIDGE_MAXSIZE", "64"))
+        # Seconds to wait for each item before giving up on the stream (None = no limit)
+        self.timeout = timeout
+        self._loop = loop
+        self._aiterable = aiterable
+        # Unbounded so the end/error markers always fit; the credits bound the items
+        self._queue: "queue.Queue[tuple[str, Any]]" = queue.Queue()
+        self._credits = asyncio.Semaphore(self.maxsize)
+        self._finished = False
+        self._future = asyncio.run_coroutine_threadsafe(self._pump(), loop)
+
+    async def _pump(self) -> None:
+        with track_inflight("stream"):
+            await self._pump_items()
+
+    async def _pump_items(self) -> None:
+        iterator = self._aiterable.__aiter__()
+        try:
+            while True:
+                # Backpressure: wait until the reader has taken an earlier item
+                await self._credits.acquire()
+                try:
+                    item = await iterator.__anext__()
+                except StopAsyncIteration:
+                    break
+                self._queue.put((_ITEM, item))
+        except asyncio.CancelledError:
+            raise
+        except BaseException as e:
+            self._queue.put((_ERROR, e))
+        finally:
+            self._queue.put((_DONE, None))
+            aclose = getattr(iterator, "aclose", None)
+            if aclose is not None:
+                try:
+                    await aclose()
+                except Exception as e:
+                    print(f"⚠️ Closing the stream failed: {str(e)}")
+
+    def __iter__(self) -> Iterator[T]:
+        return self
+
+    def __next__(self) -> T:
+        if self._finished:
+            raise StopIteration
+        try:
+            kind, value = self._queue.get(timeout=self.timeout)
+        except queue.Empty:
+            self.close()
+            raise TimeoutError(f"No stream item within {self.timeout:g}s") from None
+
+        if kind == _ITEM:
+            self._loop.call_soon_threadsafe(self._credits.release)
+            return value
+        self._finished = True
+        if kind == _ERROR:
+            raise value
+        raise StopIteration
+
+    def close(self) -> None:
+        """Stop reading; cancels the stream if it is still running."""
+        if not self._finished:
+            self._finished = True
+            self._future.cancel()
+
+    @property
+    def done(self) -> bool:
+        return self._future.done()
+
+    def __enter__(self) -> "AsyncStreamBridge[T]":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def __del__(self) -> None:
+        # A reader that is dropped without close() (e.g. a Streamlit rerun) still stops the task
+        if not getattr(self, "_finished", True) and not self._loop.is_closed():
+            self.close()
@@ -0,0 +1,171 @@
+"""
+Coalesce per-token chat chunks before they reach the Streamlit frontend.
+
+`stream_mode="messages"` yields one AIMessageChunk per token. `st.write_stream`
+re-renders the whole answer as markdown for every string it receives, so each
+token costs a websocket delta plus a re-render, and a long answer costs
+quadratically more than a short one. `coalesce_messages` wraps the
+`(message_chunk, metadata)` stream and merges text chunks of the same
+message:
+
+    - the first text of every message passes through at once, so the time to
+      the first visible token does not change
+    - later text is held until STREAM_COALESCE_MS have passed since the last
+      flush or STREAM_COALESCE_CHARS characters are waiting
+    - anything else (tool messages, tool-call chunks, another message or
+      node) flushes the held text first and then passes through unchanged,
+      so tool status updates are never delayed
+
+The wrapped stream is consumed synchronously, so held text is flushed when the
+next chunk arrives (or at the end); a model that pauses mid-sentence shows the
+tail after the pause. Frontends keep their loops, only the stream is wrapped:
+
+    for message_chunk, metadata in coalesce_messages(chatbot.stream(...)):
+        ...
+
+`acoalesce_messages` does the same for an async stream (`chatbot.astream`).
+
+With metrics on, every response records `stream` events: `first_token` (time
+to the first visible text) and `response` (total time, plus chunks in, deltas
+out and the CPU time the consuming thread spent, rendering included).
+
+Environment Variables:
+    STREAM_COALESCE_MS: time window for merging chunks, 0 = pass through (default 50)
+    STREAM_COALESCE_CHARS: flush once this much text is waiting (default 64)
+"""
+from __future__ import annotations
+
+import os
+import time
+from typing import Any, AsyncIterable, AsyncIterator, Iterable, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from langchain_core.messages import AIMessageChunk
+
+from instrumentation import get_recorder
+
+load_dotenv()
+
+
+def _mergeable(message: Any) -> bool:
+    return (
+        isinstance(message, AIMessageChunk)
+        and isinstance(message.content, str)
+        and not message.tool_call_chunks
+    )
+
+
+def _merge(chunks: List[AIMessageChunk]) -> AIMessageChunk:
+    return chunks[0] if len(chunks) == 1 else chunks[0] + chunks[1:]
+
+
+class _Coalescer:
+    """Merging state for one response, shared by the sync and async wrappers."""
+
+    def __init__(self, window_ms: Optional[float], max_chars: Optional[int], thread_id: Optional[str]):
+        window_ms = window_ms if window_ms is not None else float(os.getenv("STREAM_COALESCE_MS", "50"))
+        self.window = window_ms / 1000
+        self.max_chars = max_chars if max_chars is not None else int(os.getenv("STREAM_COALESCE_CHARS", "64"))
+        self.thread_id = thread_id
+        self.start = self.last_flush = time.perf_counter()
+        self.first_token: Optional[float] = None
+        self.chunks_in = self.deltas = 0
+        self.held: List[AIMessageChunk] = []
+        self.held_metadata: dict = {}
+        self.held_chars = 0
+        # (message id, node) of the text being held, and of the last text already shown
+        self.held_key: Any = None
+        self.shown_key: Any = None
+
+    def flush(self) -> List[Tuple[Any, dict]]:
+        if not self.held:
+            return []
+        merged = _merge(self.held)
+        if self.first_token is None and merged.content:
+            self.first_token = time.perf_counter() - self.start
+        self.shown_key = self.held_key
+        self.held, self.held_chars = [], 0
+        self.last_flush = time.perf_counter()
+        self.deltas += 1
+        return [(merged, self.held_metadata)]
+
+    def push(self, message: Any, metadata: dict) -> List[Tuple[Any, dict]]:
+        """Take one event; returns the events to emit now."""
+        self.chunks_in += 1
+        if not _mergeable(message) or self.window <= 0:
+            out = self.flush()
+            if self.first_token is None and _mergeable(message) and message.content:
+                self.first_token = time.perf_counter() - self.start
+            self.deltas += 1
+            return out + [(message, metadata)]
+
+        key = (message.id, metadata.get("langgraph_node"))
+        out = self.flush() if self.held and key != self.held_key else []
+        if not self.held:
+            self.held_key, self.held_metadata = key, metadata
+        self.held.append(message)
+        self.held_chars += len(message.content)
+        if message.content and (
+            key != self.shown_key
+            or self.held_chars >= self.max_chars
+            or time.perf_counter() - self.last_flush >= self.window
+        ):
+            out += self.flush()
+        return out
+
+    def record(self, cpu_ms: Optional[float] = None) -> None:
+        recorder = get_recorder()
+        if recorder is None or not self.chunks_in:
+            return
+        recorder.record({
+            "kind": "stream",
+            "name": "first_token",
+            "duration_ms": round((self.first_token if self.first_token is not None else 0.0) * 1000, 2),
+            "thread_id": self.thread_id,
+        })
+        event = {
+            "kind": "stream",
+            "name": "response",
+            "duration_ms": round((time.perf_counter() - self.start) * 1000, 2),
+            "thread_id": self.thread_id,
+            "chunks_in": self.chunks_in,
+            "deltas": self.deltas,
+        }
+        if cpu_ms is not None:
+            event["cpu_ms"] = round(cpu_ms, 2)
+        recorder.record(event)
+
+
+def coalesce_messages(
+    events: Iterable[Tuple[Any, dict]],
+    window_ms: Optional[float] = None,
+    max_chars: Optional[int] = None,
+    thread_id: Optional[str] = None,
+) -> Iterator[Tuple[Any, dict]]:
+    """Merge consecutive text chunks of `stream_mode="messages"` events."""
+    coalescer = _Coalescer(window_ms, max_chars, thread_id)
+    cpu_start = time.thread_time()
+    try:
+        for message, metadata in events:
+            yield from coalescer.push(message, metadata)
+        yield from coalescer.flush()
+    finally:
+        coalescer.record(cpu_ms=(time.thread_time() - cpu_start) * 1000)
+
+
+async def acoalesce_messages(
+    events: AsyncIterable[Tuple[Any, dict]],
+    window_ms: Optional[float] = None,
+    max_chars: Optional[int] = None,
+    thread_id: Optional[str] = None,
+) -> AsyncIterator[Tuple[Any, dict]]:
+    """`coalesce_messages` for an async stream (without the CPU measurement: the loop is shared)."""
+    coalescer = _Coalescer(window_ms, max_chars, thread_id)
+    try:
+        async for message, metadata in events:
+            for event in coalescer.push(message, metadata):
+                yield event
+        for event in coalescer.flush():
+            yield event
+    finally:
+        coalescer.record()
@@ -1,6 +1,7 @@
 import streamlit as st
 from langgraph_database_backend import chatbot, retrieve_all_threads
 from langchain_core.messages import HumanMessage
+from stream_coalescing import coalesce_messages
 import uuid
 
 # **************************************** utility functions *************************
@@ -94,11 +95,11 @@ if user_input:
     with st.chat_message('assistant'):
 
         ai_message = st.write_stream(
-            message_chunk.content for message_chunk, metadata in chatbot.stream(
+            message_chunk.content for message_chunk, metadata in coalesce_messages(chatbot.stream(
                 {'messages': [HumanMessage(content=user_input)]},
                 config= CONFIG,
                 stream_mode= 'messages'
-            )
+            ), thread_id=str(st.session_state["thread_id"]))
         )
 
     st.session_state['message_history'].append({'role': 'assistant', 'content': ai_message})
\ No newline at end of file
@@ -1,8 +1,8 @@
-import queue
 import uuid
 
 import streamlit as st
-from langgraph_mcp_backend import chatbot, retrieve_all_threads, submit_async_task
+from langgraph_mcp_backend import chatbot, retrieve_all_threads, stream_sync
+from stream_coalescing import coalesce_messages
 from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
 
 # =========================== Utilities ===========================
@@ -85,48 +85,33 @@ if user_input:
         status_holder = {"box": None}
 
         def ai_only_stream():
-            event_queue: queue.Queue = queue.Queue()
-
-            async def run_stream():
-                try:
-                    async for message_chunk, metadata in chatbot.astream(
-                        {"messages": [HumanMessage(content=user_input)]},
-                        config=CONFIG,
-                        stream_mode="messages",
-                    ):
-                        event_queue.put((message_chunk, metadata))
-                except Exception as exc:
-                    event_queue.put(("error", exc))
-                finally:
-                    event_queue.put(None)
-
-            submit_async_task(run_stream())
-
-            while True:
-                item = event_queue.get()
-                if item is None:
-                    break
-                message_chunk, metadata = item
-                if message_chunk == "error":
-                    raise metadata
-
-                # Lazily create & update the SAME status container when any tool runs
-                if isinstance(message_chunk, ToolMessage):
-                    tool_name = getattr(message_chunk, "name", "tool")
-                    if status_holder["box"] is None:
-                        status_holder["box"] = st.status(
-                            f"🔧 Using `{tool_name}` …", expanded=True
-                        )
-                    else:
-                        status_holder["box"].update(
-                            label=f"🔧 Using `{tool_name}` …",
-                            state="running",
-                            expanded=True,
-                        )
-
-                # Stream ONLY assistant tokens
-                if isinstance(message_chunk, AIMessage):
-                    yield message_chunk.content
+            # Leaving the page or a rerun closes this generator, which cancels the stream
+            with stream_sync(
+                chatbot.astream(
+                    {"messages": [HumanMessage(content=user_input)]},
+                    config=CONFIG,
+                    stream_mode="messages",
+                ),
+                thread_id=st.session_state["thread_id"],
+            ) as events:
+                for message_chunk, metadata in coalesce_messages(events, thread_id=str(st.session_state["thread_id"])):
+                    # Lazily create & update the SAME status container when any tool runs
+                    if isinstance(message_chunk, ToolMessage):
+                        tool_name = getattr(message_chunk, "name", "tool")
+                        if status_holder["box"] is None:
+                            status_holder["box"] = st.status(
+                                f"🔧 Using `{tool_name}` …", expanded=True
+                            )
+                        else:
+                            status_holder["box"].update(
+                                label=f"🔧 Using `{tool_name}` …",
+                                state="running",
+                                expanded=True,
+                            )
+
+                    # Stream ONLY assistant tokens
+                    if isinstance(message_chunk, AIMessage):
+                        yield message_chunk.content
 
         ai_message = st.write_stream(ai_only_stream())
 
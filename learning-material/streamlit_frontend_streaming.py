@@ -1,6 +1,7 @@
 import streamlit as st
 from langgraph_backend import chatbot
 from langchain_core.messages import HumanMessage
+from stream_coalescing import coalesce_messages
 
 # st.session_state -> dict -> 
 CONFIG = {'configurable': {'thread_id': 'thread-1'}}
@@ -29,11 +30,11 @@ if user_input:
     with st.chat_message('assistant'):
 
         ai_message = st.write_stream(
-            message_chunk.content for message_chunk, metadata in chatbot.stream(
+            message_chunk.content for message_chunk, metadata in coalesce_messages(chatbot.stream(
                 {'messages': [HumanMessage(content=user_input)]},
                 config= {'configurable': {'thread_id': 'thread-1'}},
                 stream_mode= 'messages'
-            )
+            ))
         )
 
     st.session_state['message_history'].append({'role': 'assistant', 'content': ai_message})
\ No newline at end of file
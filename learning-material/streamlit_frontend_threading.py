@@ -1,6 +1,7 @@
 import streamlit as st
 from langgraph_tool_backend import chatbot
 from langchain_core.messages import HumanMessage, AIMessage
+from stream_coalescing import coalesce_messages
 import uuid
 
 # **************************************** utility functions *************************
@@ -85,11 +86,11 @@ if user_input:
      # first add the message to message_history
     with st.chat_message("assistant"):
         def ai_only_stream():
-            for message_chunk, metadata in chatbot.stream(
+            for message_chunk, metadata in coalesce_messages(chatbot.stream(
                 {"messages": [HumanMessage(content=user_input)]},
                 config=CONFIG,
                 stream_mode="messages"
-            ):
+            )):
                 if isinstance(message_chunk, AIMessage):
                     # yield only assistant tokens
                     yield message_chunk.content
@@ -1,6 +1,7 @@
 import streamlit as st
 from langgraph_tool_backend import chatbot, retrieve_all_threads
 from langchain_core.messages import HumanMessage, AIMessage, ToolMessage
+from stream_coalescing import coalesce_messages
 import uuid
 
 # =========================== Utilities ===========================
@@ -79,10 +80,13 @@ if user_input:
         status_holder = {"box": None}
 
         def ai_only_stream():
-            for message_chunk, metadata in chatbot.stream(
-                {"messages": [HumanMessage(content=user_input)]},
-                config=CONFIG,
-                stream_mode="messages",
+            for message_chunk, metadata in coalesce_messages(
+                chatbot.stream(
+                    {"messages": [HumanMessage(content=user_input)]},
+                    config=CONFIG,
+                    stream_mode="messages",
+                ),
+                thread_id=str(st.session_state["thread_id"]),
             ):
                 # Lazily create & update the SAME status container when any tool runs
                 if isinstance(message_chunk, ToolMessage):
@@ -3,6 +3,8 @@ import uuid
 import streamlit as st
 from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
 
+from stream_coalescing import coalesce_messages
+
 from langgraph_rag_backend import (
     chatbot,
     ingest_pdf,
@@ -117,10 +119,13 @@ if user_input:
         status_holder = {"box": None}
 
         def ai_only_stream():
-            for message_chunk, _ in chatbot.stream(
-                {"messages": [HumanMessage(content=user_input)]},
-                config=CONFIG,
-                stream_mode="messages",
+            for message_chunk, _ in coalesce_messages(
+                chatbot.stream(
+                    {"messages": [HumanMessage(content=user_input)]},
+                    config=CONFIG,
+                    stream_mode="messages",
+                ),
+                thread_id=thread_key,
             ):
                 if isinstance(message_chunk, ToolMessage):
                     tool_name = getattr(message_chunk, "name", "tool")
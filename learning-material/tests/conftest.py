@@ -0,0 +1,14 @@
+"""
+Focused checks for the concurrency pieces of learning-material.
+
+Run from the repository root or from learning-material:
+
+    python -m pytest learning-material/tests -q
+
+No API keys or servers are needed: models are LangChain fakes and
+checkpoints live in memory.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
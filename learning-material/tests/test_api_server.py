@@ -0,0 +1,179 @@
+import asyncio
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.graph import END, START, MessagesState, StateGraph
+from starlette.testclient import TestClient
+
+import api_server
+
+ANSWER = "Paris is the capital of France"
+
+
+def _graph():
+    model = GenericFakeChatModel(messages=iter([AIMessage(content=ANSWER)] * 10))
+
+    def chat_node(state):
+        return {"messages": [model.invoke(state["messages"])]}
+
+    graph = StateGraph(MessagesState)
+    graph.add_node("chat_node", chat_node)
+    graph.add_edge(START, "chat_node")
+    graph.add_edge("chat_node", END)
+    return graph.compile(checkpointer=InMemorySaver())
+
+
+@pytest.fixture
+def host(monkeypatch):
+    """A host serving the fake graph, without importing a backend."""
+    graph_host = api_server.GraphHost("fake_backend:chatbot", max_streams=1)
+    graph_host.module = object()
+    graph_host.graph = _graph()
+    monkeypatch.setattr(api_server, "host", graph_host)
+    yield graph_host
+    graph_host.close()
+
+
+@pytest.fixture
+def client(host):
+    # No `with`: the lifespan would import API_GRAPH
+    return TestClient(api_server.api)
+
+
+def _events(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_message_streams_tokens_then_done(client, host):
+    response = client.post("/threads/t1/messages", json={"message": "Capital of France?"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = _events(response.text)
+    tokens = [data["content"] for event, data in events if event == "token"]
+    assert "".join(tokens) == ANSWER
+    assert events[-1] == ("done", {"thread_id": "t1", "interrupted": False})
+    assert host.active_streams == 0
+
+    history = client.get("/threads/t1/messages").json()
+    assert [m["role"] for m in history["messages"]] == ["user", "assistant"]
+    assert history["messages"][1]["content"] == ANSWER
+
+
+def test_streams_beyond_the_limit_get_429(client, host):
+    release = host.claim_stream()
+    response = client.post("/threads/t1/messages", json={"message": "hi"})
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "1"
+
+    release()
+    release()  # releasing twice must not free a second slot
+    assert host.active_streams == 0
+    assert client.post("/threads/t1/messages", json={"message": "hi"}).status_code == 200
+
+
+@pytest.mark.parametrize("body, error", [
+    ({"message": " "}, '"message"'),
+    ({"message": "hi", "state": [1]}, '"state" must be an object'),
+    ({"message": "hi", "state": {"messages": []}}, "not accepted: messages"),
+])
+def test_invalid_message_bodies_get_400(client, host, body, error):
+    response = client.post("/threads/t1/messages", json=body)
+    assert response.status_code == 400
+    assert error in response.json()["error"]
+    assert host.active_streams == 0
+
+
+def test_failed_turn_ends_with_an_error_event(client, host):
+    def broken(state):
+        raise RuntimeError("model unavailable")
+
+    graph = StateGraph(MessagesState)
+    graph.add_node("chat_node", broken)
+    graph.add_edge(START, "chat_node")
+    graph.add_edge("chat_node", END)
+    host.graph = graph.compile(checkpointer=InMemorySaver())
+
+    events = _events(client.post("/threads/t1/messages", json={"message": "hi"}).text)
+    assert events[-1] == ("error", {"message": "model unavailable"})
+    assert host.active_streams == 0
+
+
+def test_sync_producer_stays_at_most_buffered_items_ahead():
+    produced = 0
+    closed = threading.Event()
+
+    def items():
+        nonlocal produced
+        try:
+            for index in range(10 * api_server._BUFFERED):
+                produced += 1
+                yield index
+        finally:
+            closed.set()
+
+    async def consume():
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            iterator = api_server._iterate_in_thread(items(), pool)
+            first = await iterator.__anext__()
+            # Give the worker time to run ahead as far as it may
+            await asyncio.sleep(0.2)
+            ahead = produced
+            # The client leaves: the worker stops and closes the source
+            await iterator.aclose()
+            return first, ahead
+
+    first, ahead = asyncio.run(consume())
+    assert first == 0
+    assert ahead <= api_server._BUFFERED + 2
+    assert closed.wait(timeout=2)
+    assert produced < 10 * api_server._BUFFERED
+
+
+def test_async_producer_on_another_loop_is_closed_when_the_client_leaves():
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    produced = 0
+    closed = threading.Event()
+
+    async def items():
+        nonlocal produced
+        try:
+            for index in range(10 * api_server._BUFFERED):
+                produced += 1
+                yield index
+                await asyncio.sleep(0)
+        finally:
+            closed.set()
+
+    # Held here, so only an explicit close (not garbage collection) can finish it
+    source = items()
+
+    async def consume():
+        iterator = api_server._iterate_on_loop(source, loop)
+        first = await iterator.__anext__()
+        await asyncio.sleep(0.2)
+        ahead = produced
+        await iterator.aclose()
+        return first, ahead
+
+    try:
+        first, ahead = asyncio.run(consume())
+        assert first == 0
+        assert ahead <= api_server._BUFFERED + 2
+        # The graph run is closed right away, not whenever the generator is collected
+        assert closed.wait(timeout=2)
+        assert produced < 10 * api_server._BUFFERED
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=2)
@@ -0,0 +1,154 @@
+import operator
+from typing import Annotated, TypedDict
+
+from langgraph.checkpoint.base import empty_checkpoint
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.graph import END, START, StateGraph
+from langgraph.types import Command, interrupt
+
+from checkpoint_cache import CachedCheckpointSaver
+
+
+class CountingSaver(InMemorySaver):
+    """In-memory saver that counts the reads reaching it."""
+
+    def __init__(self):
+        super().__init__()
+        self.reads = 0
+
+    def get_tuple(self, config):
+        self.reads += 1
+        return super().get_tuple(config)
+
+
+def _config(thread_id="t1"):
+    return {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+
+
+def _put(saver, config, value, version=1):
+    checkpoint = empty_checkpoint()
+    checkpoint["channel_values"] = {"value": value}
+    checkpoint["channel_versions"] = {"value": version}
+    return saver.put(config, checkpoint, {"source": "loop", "step": version - 1}, {"value": version})
+
+
+def test_put_is_write_through():
+    inner = CountingSaver()
+    saver = CachedCheckpointSaver(inner)
+    saved = _put(saver, _config(), "first")
+
+    cached = saver.get_tuple(_config())
+    assert inner.reads == 0
+    assert cached.config["configurable"]["checkpoint_id"] == saved["configurable"]["checkpoint_id"]
+    assert cached.checkpoint["channel_values"] == {"value": "first"}
+    assert saver.stats()["hits"] == 1
+
+
+def test_hits_are_copies_the_caller_may_mutate():
+    saver = CachedCheckpointSaver(CountingSaver())
+    _put(saver, _config(), "first")
+
+    saver.get_tuple(_config()).checkpoint["channel_versions"]["value"] = 99
+    assert saver.get_tuple(_config()).checkpoint["channel_versions"]["value"] == 1
+
+
+def test_put_writes_invalidates_the_cached_checkpoint():
+    inner = CountingSaver()
+    saver = CachedCheckpointSaver(inner)
+    saved = _put(saver, _config(), "first")
+
+    saver.put_writes(saved, [("value", "pending")], task_id="task-1")
+    fresh = saver.get_tuple(_config())
+    # The pending write is only known to the saver
+    assert inner.reads == 1
+    assert [(task, channel, value) for task, channel, value in fresh.pending_writes] == [
+        ("task-1", "value", "pending")
+    ]
+    # ...and the re-read entry is cached again
+    saver.get_tuple(_config())
+    assert inner.reads == 1
+
+
+def test_put_writes_on_an_older_checkpoint_keeps_the_entry():
+    inner = CountingSaver()
+    saver = CachedCheckpointSaver(inner)
+    older = _put(saver, _config(), "first")
+    _put(saver, older, "second", version=2)
+
+    saver.put_writes(older, [("value", "late")], task_id="task-1")
+    assert saver.get_tuple(_config()).checkpoint["channel_values"] == {"value": "second"}
+    assert inner.reads == 0
+
+
+def test_delete_thread_drops_only_that_thread():
+    inner = CountingSaver()
+    saver = CachedCheckpointSaver(inner)
+    _put(saver, _config("t1"), "one")
+    _put(saver, _config("t2"), "two")
+
+    saver.delete_thread("t1")
+    assert saver.get_tuple(_config("t1")) is None
+    assert saver.get_tuple(_config("t2")).checkpoint["channel_values"] == {"value": "two"}
+    assert inner.reads == 1
+
+
+def test_explicit_older_checkpoint_reads_bypass_the_cache():
+    inner = CountingSaver()
+    saver = CachedCheckpointSaver(inner)
+    older = _put(saver, _config(), "first")
+    _put(saver, older, "second", version=2)
+
+    assert saver.get_tuple(older).checkpoint["channel_values"] == {"value": "first"}
+    assert inner.reads == 1
+
+
+def test_lru_evicts_the_least_recently_used_thread():
+    saver = CachedCheckpointSaver(CountingSaver(), max_entries=2)
+    _put(saver, _config("t1"), "one")
+    _put(saver, _config("t2"), "two")
+    saver.get_tuple(_config("t1"))
+    _put(saver, _config("t3"), "three")
+
+    assert saver.stats()["entries"] == 2
+    assert saver.stats()["evictions"] == 1
+    inner_reads = saver.saver.reads
+    saver.get_tuple(_config("t2"))
+    assert saver.saver.reads == inner_reads + 1
+
+
+class _State(TypedDict):
+    steps: Annotated[list, operator.add]
+
+
+def _review_graph(checkpointer):
+    def draft(state):
+        return {"steps": ["draft"]}
+
+    def review(state):
+        return {"steps": [f"review:{interrupt('approve?')}"]}
+
+    graph = StateGraph(_State)
+    graph.add_node("draft", draft)
+    graph.add_node("review", review)
+    graph.add_edge(START, "draft")
+    graph.add_edge("draft", "review")
+    graph.add_edge("review", END)
+    return graph.compile(checkpointer=checkpointer)
+
+
+def test_graph_state_matches_the_uncached_saver_across_an_interrupt():
+    config = {"configurable": {"thread_id": "review"}}
+    cached = _review_graph(CachedCheckpointSaver(InMemorySaver()))
+    plain = _review_graph(InMemorySaver())
+
+    for graph in (cached, plain):
+        graph.invoke({"steps": []}, config)
+    # The interrupt is stored as a pending write on the latest checkpoint
+    assert [i.value for i in cached.get_state(config).interrupts] == ["approve?"]
+    assert cached.get_state(config).next == plain.get_state(config).next == ("review",)
+
+    for graph in (cached, plain):
+        graph.invoke(Command(resume="yes"), config)
+    assert cached.get_state(config).values == plain.get_state(config).values == {
+        "steps": ["draft", "review:yes"]
+    }
@@ -0,0 +1,109 @@
+import asyncio
+import time
+
+import pytest
+from langchain_core.tools import StructuredTool, ToolException
+
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, breaker_tools
+
+
+def _breaker(**kwargs):
+    """A fast breaker and the list of states it changes to."""
+    breaker = CircuitBreaker("server", **{"failure_threshold": 2, "reset_seconds": 0.05, **kwargs})
+    transitions = []
+    breaker.on_change(lambda b: transitions.append(b.state))
+    return breaker, transitions
+
+
+def _fail(breaker, times=1):
+    for _ in range(times):
+        breaker.before_call()
+        breaker.record_failure()
+
+
+def test_opens_after_consecutive_failures_and_rejects_calls():
+    breaker, transitions = _breaker()
+    _fail(breaker)
+    assert breaker.state == CLOSED
+    _fail(breaker)
+    assert breaker.state == OPEN
+
+    with pytest.raises(ToolException, match="unavailable"):
+        breaker.before_call()
+    stats = breaker.stats()
+    assert stats["rejected"] == 1
+    assert stats["opened"] == 1
+    assert transitions == [OPEN]
+
+
+def test_success_resets_the_failure_count():
+    breaker, transitions = _breaker()
+    _fail(breaker)
+    breaker.before_call()
+    breaker.record_success()
+    _fail(breaker)
+    assert breaker.state == CLOSED
+
+
+def test_half_open_lets_one_probe_through_and_closes_on_success():
+    breaker, transitions = _breaker()
+    _fail(breaker, 2)
+    time.sleep(0.06)
+
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+    # Only the probe goes through while it is running
+    with pytest.raises(ToolException):
+        breaker.before_call()
+
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert transitions == [OPEN, HALF_OPEN, CLOSED]
+    breaker.before_call()
+
+
+def test_failed_probe_opens_the_breaker_again():
+    breaker, transitions = _breaker()
+    _fail(breaker, 2)
+    time.sleep(0.06)
+
+    _fail(breaker)
+    assert breaker.state == OPEN
+    assert transitions == [OPEN, HALF_OPEN, OPEN]
+    assert breaker.stats()["opened"] == 2
+    assert breaker.retry_in() > 0
+    with pytest.raises(ToolException):
+        breaker.before_call()
+
+
+def _tool(coroutine):
+    return StructuredTool.from_function(coroutine=coroutine, name="remote", description="Remote tool.")
+
+
+def test_wrapped_tool_counts_server_errors_but_not_tool_errors():
+    breaker, transitions = _breaker()
+
+    async def answered_with_error(query: str) -> str:
+        raise ToolException("no results")
+
+    async def unreachable(query: str) -> str:
+        raise ConnectionError("refused")
+
+    # The server answered: a ToolException is a success for the breaker
+    (tool,) = breaker_tools([_tool(answered_with_error)], breaker)
+    for _ in range(3):
+        with pytest.raises(ToolException):
+            asyncio.run(tool.coroutine(query="x"))
+    assert breaker.state == CLOSED
+
+    (tool,) = breaker_tools([_tool(unreachable)], breaker)
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            asyncio.run(tool.coroutine(query="x"))
+    assert breaker.state == OPEN
+
+    # Rebinding after the change marks the tool unavailable for the model
+    (tool,) = breaker_tools([_tool(unreachable)], breaker)
+    assert tool.description.startswith("[Currently unavailable")
+    with pytest.raises(ToolException, match="unavailable"):
+        asyncio.run(tool.coroutine(query="x"))
@@ -0,0 +1,104 @@
+import asyncio
+import threading
+import time
+from typing import Any
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessageChunk
+from langchain_core.outputs import ChatGenerationChunk
+
+from hedging import HedgedChatModel, Hedger
+
+
+class _Stalling(BaseChatModel):
+    """Answers "answer <n>" for call n; calls in `stall` wait for `release` before their first chunk."""
+
+    stall: set = set()
+    release: Any
+    calls: list = []
+    closed: list = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "stalling"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        raise NotImplementedError
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        call = len(self.calls)
+        self.calls.append(call)
+        try:
+            if call in self.stall:
+                self.release.wait(5)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=f"answer {call}"))
+        finally:
+            self.closed.append(call)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        call = len(self.calls)
+        self.calls.append(call)
+        try:
+            if call in self.stall:
+                await asyncio.sleep(5)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=f"answer {call}"))
+        finally:
+            self.closed.append(call)
+
+
+def _hedged(stall, max_abandoned=4):
+    llm = _Stalling(stall=set(stall), release=threading.Event(), calls=[], closed=[])
+    hedger = Hedger("stalling", initial_deadline=0.05, min_deadline=0.01, budget=1.0,
+                    max_abandoned=max_abandoned)
+    return llm, hedger, HedgedChatModel(llm=llm, hedger=hedger)
+
+
+def _wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_sync_hedge_wins_and_a_stalled_loser_is_released_when_it_returns():
+    llm, hedger, model = _hedged(stall={0})
+    threads = threading.active_count()
+
+    assert model.invoke("hi").content == "answer 1"
+    stats = hedger.stats()
+    assert stats["hedged"] == 1 and stats["hedge_won"] == 1
+    # The loser is still blocked before its first chunk
+    assert stats["abandoned"] == 1
+    assert 0 not in llm.closed
+
+    llm.release.set()
+    assert _wait_for(lambda: hedger.stats()["abandoned"] == 0)
+    assert _wait_for(lambda: 0 in llm.closed)
+    assert _wait_for(lambda: threading.active_count() <= threads)
+
+
+def test_no_hedge_while_the_abandoned_cap_is_reached():
+    llm, hedger, model = _hedged(stall={0, 2}, max_abandoned=1)
+    assert model.invoke("hi").content == "answer 1"
+    assert hedger.stats()["abandoned"] == 1
+
+    # Call 2 stalls too, but another duplicate would exceed the cap
+    threading.Timer(0.2, llm.release.set).start()
+    assert model.invoke("hi").content == "answer 2"
+    stats = hedger.stats()
+    assert stats["hedged"] == 1
+    assert stats["abandoned_denied"] == 1
+    assert _wait_for(lambda: hedger.stats()["abandoned"] == 0)
+
+
+def test_async_stalled_loser_is_cancelled_and_closed_at_once():
+    llm, hedger, model = _hedged(stall={0})
+
+    async def scenario():
+        return "".join([chunk.content async for chunk in model.astream("hi")])
+
+    start = time.monotonic()
+    assert asyncio.run(scenario()) == "answer 1"
+    assert time.monotonic() - start < 1
+    assert sorted(llm.closed) == [0, 1]
+    assert hedger.stats()["hedge_won"] == 1
@@ -0,0 +1,31 @@
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import HumanMessage
+
+from llm_cache import ResponseCache
+
+
+def _model(*answers):
+    return FakeListChatModel(responses=list(answers))
+
+
+def test_different_documents_never_share_an_entry(tmp_path):
+    cache = ResponseCache(path=str(tmp_path / "cache.db"))
+    model = _model("from report A", "from report B")
+    question = [HumanMessage(content="What is the total revenue?")]
+
+    assert cache.invoke(model, question, document="sha-a").content == "from report A"
+    assert cache.invoke(model, question, document="sha-b").content == "from report B"
+    assert cache.stats()["misses"] == 2
+
+
+def test_the_same_document_in_another_thread_hits(tmp_path):
+    cache = ResponseCache(path=str(tmp_path / "cache.db"))
+    model = _model("from report A", "second call")
+    question = [HumanMessage(content="What is the total revenue?")]
+
+    cache.invoke(model, question, document="sha-a")
+    assert cache.invoke(model, question, document="sha-a").content == "from report A"
+    # Without a document the question is a different entry
+    assert cache.invoke(model, question).content == "second call"
+    stats = cache.stats()
+    assert stats["exact_hits"] == 1 and stats["misses"] == 2
@@ -0,0 +1,248 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessageChunk
+from langchain_core.outputs import ChatGenerationChunk
+
+from llm_scheduler import LLMScheduler, ScheduledChatModel
+
+
+def _scheduler(**kwargs):
+    # Only the in-flight cap limits dispatch unless a test asks for buckets
+    return LLMScheduler(**{"rpm": 0, "tpm": 0, "max_in_flight": 1, **kwargs})
+
+
+async def _enqueue(scheduler, key, name, order, gate=None):
+    async with scheduler.aslot(key, 1):
+        order.append(name)
+        if gate is not None:
+            await gate.wait()
+
+
+async def _start_in_order(coros):
+    tasks = []
+    for coro in coros:
+        tasks.append(asyncio.ensure_future(coro))
+        # Let each task reach the scheduler queue before the next is created
+        await asyncio.sleep(0)
+    return tasks
+
+
+def test_queues_are_served_round_robin_not_fifo():
+    async def scenario():
+        scheduler = _scheduler()
+        order = []
+        gate = asyncio.Event()
+        tasks = await _start_in_order([
+            _enqueue(scheduler, "a", "a1", order, gate),
+            _enqueue(scheduler, "a", "a2", order),
+            _enqueue(scheduler, "a", "a3", order),
+            _enqueue(scheduler, "b", "b1", order),
+        ])
+        assert order == ["a1"]
+        assert scheduler.stats()["queued_by_key"] == {"a": 2, "b": 1}
+        gate.set()
+        await asyncio.gather(*tasks)
+        return order, scheduler.stats()
+
+    order, stats = asyncio.run(scenario())
+    # A busy thread cannot starve another one queued behind it
+    assert order == ["a1", "a2", "b1", "a3"]
+    assert stats["in_flight"] == 0
+    assert stats["queue_depth"] == 0
+    assert stats["granted"] == 4
+
+
+def test_cancelled_waiter_leaves_the_queue_and_frees_no_slot():
+    async def scenario():
+        scheduler = _scheduler()
+        order = []
+        gate = asyncio.Event()
+        holder, waiter, other = await _start_in_order([
+            _enqueue(scheduler, "a", "holder", order, gate),
+            _enqueue(scheduler, "b", "cancelled", order),
+            _enqueue(scheduler, "c", "other", order),
+        ])
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert scheduler.stats()["queued_by_key"] == {"c": 1}
+        gate.set()
+        await asyncio.gather(holder, other)
+        return order, scheduler.stats()
+
+    order, stats = asyncio.run(scenario())
+    assert order == ["holder", "other"]
+    assert stats["in_flight"] == 0
+    assert stats["queue_depth"] == 0
+
+
+def test_cancelling_a_granted_call_releases_its_slot():
+    async def scenario():
+        scheduler = _scheduler()
+        started = asyncio.Event()
+
+        async def slow():
+            async with scheduler.aslot("a", 1):
+                started.set()
+                await asyncio.sleep(10)
+
+        task = asyncio.ensure_future(slow())
+        await started.wait()
+        assert scheduler.stats()["in_flight"] == 1
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # The next caller gets the slot at once
+        await asyncio.wait_for(_enqueue(scheduler, "b", "next", []), timeout=1)
+        return scheduler.stats()
+
+    assert asyncio.run(scenario())["in_flight"] == 0
+
+
+def test_sync_slots_respect_the_in_flight_cap():
+    scheduler = _scheduler(max_in_flight=2)
+    running = peak = 0
+    lock = threading.Lock()
+
+    def call(key):
+        nonlocal running, peak
+        with scheduler.slot(key, 1):
+            with lock:
+                running += 1
+                peak = max(peak, running)
+            time.sleep(0.02)
+            with lock:
+                running -= 1
+
+    threads = [threading.Thread(target=call, args=(f"user-{i % 3}",)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert peak == 2
+    assert scheduler.stats()["granted"] == 8
+    assert scheduler.stats()["in_flight"] == 0
+
+
+class _RateLimited(Exception):
+    status_code = 429
+
+    class response:
+        status_code = 429
+        headers = {"retry-after": "0.05"}
+
+
+def test_rate_limit_pauses_dispatch_and_requeues_the_call():
+    scheduler = _scheduler(max_retries=2)
+    attempts = []
+
+    def call():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise _RateLimited()
+        return "ok"
+
+    assert scheduler.run("a", 1, call) == "ok"
+    assert len(attempts) == 2
+    # The retry waited out the provider's retry-after
+    assert attempts[1] - attempts[0] >= 0.04
+    stats = scheduler.stats()
+    assert stats["rate_limited"] == 1
+    assert stats["in_flight"] == 0
+
+
+def test_rate_limit_error_is_raised_after_max_retries():
+    scheduler = _scheduler(max_retries=1)
+
+    def call():
+        raise _RateLimited()
+
+    with pytest.raises(_RateLimited):
+        scheduler.run("a", 1, call)
+    assert scheduler.stats()["rate_limited"] == 2
+    assert scheduler.stats()["in_flight"] == 0
+
+
+def test_request_bucket_delays_calls_beyond_the_rate():
+    # 1200 rpm = one request every 50 ms once the burst is spent
+    scheduler = _scheduler(rpm=1200, max_in_flight=10)
+    scheduler.requests.tokens = 1
+    start = time.monotonic()
+    for _ in range(3):
+        with scheduler.slot("a", 1):
+            pass
+    assert time.monotonic() - start >= 0.09
+
+
+class _FlakyStream(BaseChatModel):
+    """Streams "a", "b"; the attempts listed in `fail_at` raise a 429 after `fail_after` chunks."""
+
+    fail_at: tuple = (0,)
+    fail_after: int = 0
+    attempts: list = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "flaky-stream"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        raise NotImplementedError
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        attempt = len(self.attempts)
+        self.attempts.append(time.monotonic())
+        for index, text in enumerate("ab"):
+            if attempt in self.fail_at and index == self.fail_after:
+                raise _RateLimited()
+            yield ChatGenerationChunk(message=AIMessageChunk(content=text))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        for chunk in self._stream(messages, stop=stop, **kwargs):
+            yield chunk
+
+
+def test_rate_limited_stream_is_requeued_before_its_first_chunk():
+    scheduler = _scheduler(max_retries=2)
+    llm = _FlakyStream(attempts=[])
+    model = ScheduledChatModel(llm=llm, scheduler=scheduler)
+
+    assert "".join(chunk.content for chunk in model.stream("hi")) == "ab"
+    assert len(llm.attempts) == 2
+    assert llm.attempts[1] - llm.attempts[0] >= 0.04
+    stats = scheduler.stats()
+    assert stats["rate_limited"] == 1
+    assert stats["in_flight"] == 0
+
+
+def test_async_rate_limited_stream_is_requeued_before_its_first_chunk():
+    async def scenario():
+        llm = _FlakyStream(attempts=[])
+        model = ScheduledChatModel(llm=llm, scheduler=_scheduler(max_retries=2))
+        text = "".join([chunk.content async for chunk in model.astream("hi")])
+        return text, llm, model.scheduler.stats()
+
+    text, llm, stats = asyncio.run(scenario())
+    assert text == "ab"
+    assert len(llm.attempts) == 2
+    assert stats["rate_limited"] == 1
+    assert stats["in_flight"] == 0
+
+
+def test_rate_limit_after_the_first_chunk_is_raised():
+    scheduler = _scheduler(max_retries=2)
+    llm = _FlakyStream(attempts=[], fail_after=1)
+    model = ScheduledChatModel(llm=llm, scheduler=scheduler)
+    received = []
+
+    with pytest.raises(_RateLimited):
+        for chunk in model.stream("hi"):
+            received.append(chunk.content)
+    # Retrying would repeat output the caller already has
+    assert received == ["a"]
+    assert len(llm.attempts) == 1
+    assert scheduler.stats()["in_flight"] == 0
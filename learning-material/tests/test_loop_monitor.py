@@ -0,0 +1,46 @@
+import asyncio
+import threading
+import time
+
+from loop_monitor import LoopMonitor
+
+
+def test_ready_queue_depth_on_the_default_loop():
+    loop = asyncio.new_event_loop()
+    try:
+        loop.call_soon(lambda: None)
+        assert LoopMonitor(loop, "default").snapshot()["ready_callbacks"] == 1
+    finally:
+        loop.close()
+
+
+def test_queue_depth_is_unavailable_on_loops_without_a_ready_queue():
+    class UvloopLike:
+        """Like uvloop.Loop: no asyncio `_ready` deque."""
+
+        def is_closed(self):
+            return False
+
+    snapshot = LoopMonitor(UvloopLike(), "uv").snapshot()
+    assert snapshot["ready_callbacks"] is None
+    assert snapshot["tasks"] == 0
+
+
+def test_lag_is_measured_on_a_running_loop():
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    monitor = LoopMonitor(loop, "running", interval=0.01)
+    monitor.start()
+    try:
+        deadline = time.monotonic() + 2
+        while not monitor.snapshot()["lag_max_ms"] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        snapshot = monitor.snapshot()
+        assert snapshot["lag_max_ms"] > 0
+        assert snapshot["slow_callbacks"] == 0
+    finally:
+        monitor.stop()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=2)
+        loop.close()
@@ -0,0 +1,111 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+import market_data
+from market_data import MarketDataClient, get_stock_prices
+
+
+class _FakeAlphaVantage(BaseHTTPRequestHandler):
+    # Keep-alive, so a pooled client can reuse its connection
+    protocol_version = "HTTP/1.1"
+    delay = 0.0
+    requests: list = []
+    connections: set = set()
+    lock = threading.Lock()
+
+    def do_GET(self):
+        symbol = parse_qs(urlparse(self.path).query)["symbol"][0]
+        with self.lock:
+            self.requests.append(symbol)
+            self.connections.add(self.client_address)
+        time.sleep(self.delay)
+        if symbol == "LIMIT":
+            data = {"Note": "API call frequency exceeded"}
+        else:
+            data = {"Global Quote": {"01. symbol": symbol, "05. price": "100.00"}}
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    _FakeAlphaVantage.delay = 0.0
+    _FakeAlphaVantage.requests = []
+    _FakeAlphaVantage.connections = set()
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _FakeAlphaVantage)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+    yield _FakeAlphaVantage, f"http://127.0.0.1:{httpd.server_address[1]}/query"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_sequential_quotes_reuse_one_connection(server):
+    fake, url = server
+    client = MarketDataClient(base_url=url, api_key="test")
+    for symbol in ("aapl", "MSFT", " tsla "):
+        assert client.quote(symbol)["Global Quote"]["01. symbol"] == symbol.strip().upper()
+    assert fake.requests == ["AAPL", "MSFT", "TSLA"]
+    assert len(fake.connections) == 1
+    assert client.stats()["http_requests"] == 3
+
+
+def test_cached_quotes_make_no_request_but_rate_limit_notices_are_not_cached(server):
+    fake, url = server
+    client = MarketDataClient(base_url=url, api_key="test")
+    client.quote("AAPL")
+    client.quote("aapl")
+    assert fake.requests == ["AAPL"]
+    assert client.stats()["hits"] == 1
+
+    assert "Note" in client.quote("LIMIT")
+    client.quote("LIMIT")
+    assert fake.requests == ["AAPL", "LIMIT", "LIMIT"]
+    assert client.stats()["http_requests"] == 3
+
+
+def test_concurrent_requests_for_one_symbol_share_a_call(server):
+    fake, url = server
+    fake.delay = 0.1
+    client = MarketDataClient(base_url=url, api_key="test")
+    threads = [threading.Thread(target=client.quote, args=("AAPL",)) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+    assert fake.requests == ["AAPL"]
+    assert client.stats()["coalesced"] == 4
+
+
+def test_get_stock_prices_fans_out_over_the_pool(server, monkeypatch):
+    fake, url = server
+    fake.delay = 0.1
+    client = MarketDataClient(base_url=url, api_key="test", pool_size=4)
+    monkeypatch.setattr(market_data, "_client", client)
+
+    start = time.monotonic()
+    prices = get_stock_prices.invoke({"symbols": ["aapl", "MSFT", "AAPL", " tsla ", ""]})
+    # Three 100 ms fetches in parallel, not one after another
+    assert time.monotonic() - start < 0.25
+    assert list(prices) == ["AAPL", "MSFT", "TSLA"]
+    assert all(prices[s]["Global Quote"]["01. symbol"] == s for s in prices)
+    assert sorted(fake.requests) == ["AAPL", "MSFT", "TSLA"]
+    assert len(fake.connections) <= 3
+
+    # Only the miss goes out; the other two come from the cache
+    prices = get_stock_prices.invoke({"symbols": ["AAPL", "IBM", "TSLA"]})
+    assert list(prices) == ["AAPL", "IBM", "TSLA"]
+    assert sorted(fake.requests) == ["AAPL", "IBM", "MSFT", "TSLA"]
+    assert client.stats()["http_requests"] == 4
@@ -0,0 +1,119 @@
+import asyncio
+import threading
+import time
+from typing import Annotated
+
+from langchain_core.messages import AIMessage
+from langchain_core.tools import tool
+from langgraph.prebuilt import InjectedState
+
+from tool_executor import ConcurrentToolNode, remaining_time, tool_pool_stats
+
+# These drive the node through ToolNode.invoke/ainvoke, so they exercise the
+# overridden internals against whichever langgraph-prebuilt is installed.
+
+
+@tool
+def slow_echo(text: str) -> str:
+    """Echo text after a short delay."""
+    time.sleep(0.2)
+    return f"echo {text}"
+
+
+@tool
+async def aslow_echo(text: str) -> str:
+    """Echo text after a short async delay."""
+    await asyncio.sleep(0.2)
+    return f"echo {text}"
+
+
+@tool
+def time_left() -> str:
+    """Seconds left for this call."""
+    return f"{remaining_time():.2f}"
+
+
+@tool
+def count_messages(state: Annotated[dict, InjectedState]) -> str:
+    """Number of messages in the graph state."""
+    return str(len(state["messages"]))
+
+
+def _calls(*calls):
+    return {"messages": [AIMessage(content="", tool_calls=[
+        {"name": name, "args": args, "id": f"call-{index}", "type": "tool_call"}
+        for index, (name, args) in enumerate(calls)
+    ])]}
+
+
+def _contents(result):
+    return [(message.tool_call_id, message.status, message.content) for message in result["messages"]]
+
+
+def test_sync_calls_run_concurrently_and_keep_their_order():
+    node = ConcurrentToolNode([slow_echo])
+    start = time.monotonic()
+    result = node.invoke(_calls(("slow_echo", {"text": "a"}), ("slow_echo", {"text": "b"})))
+    assert time.monotonic() - start < 0.35
+    assert _contents(result) == [("call-0", "success", "echo a"), ("call-1", "success", "echo b")]
+
+
+def test_async_calls_run_concurrently_and_keep_their_order():
+    node = ConcurrentToolNode([aslow_echo])
+    start = time.monotonic()
+    result = asyncio.run(node.ainvoke(_calls(("aslow_echo", {"text": "a"}), ("aslow_echo", {"text": "b"}))))
+    assert time.monotonic() - start < 0.35
+    assert _contents(result) == [("call-0", "success", "echo a"), ("call-1", "success", "echo b")]
+
+
+def test_injected_state_reaches_the_tool():
+    # The ToolNode internals that inject tool arguments differ across 0.6 releases
+    state = _calls(("count_messages", {}))
+    assert _contents(ConcurrentToolNode([count_messages]).invoke(state)) == [("call-0", "success", "1")]
+    assert _contents(asyncio.run(ConcurrentToolNode([count_messages]).ainvoke(state))) == [("call-0", "success", "1")]
+
+
+def test_a_call_past_its_timeout_becomes_an_error_message():
+    node = ConcurrentToolNode([slow_echo, time_left], timeouts={"slow_echo": 0.05, "time_left": 5})
+    result = node.invoke(_calls(("slow_echo", {"text": "a"}), ("time_left", {})))
+    (_, status, content), (_, left_status, left) = _contents(result)
+    assert status == "error" and "did not respond within 0.05s" in content
+    assert left_status == "success" and 4 < float(left) <= 5
+
+    result = asyncio.run(ConcurrentToolNode([aslow_echo], timeouts={"aslow_echo": 0.05}).ainvoke(
+        _calls(("aslow_echo", {"text": "a"}))
+    ))
+    assert _contents(result)[0][1] == "error"
+
+
+def test_a_spent_turn_deadline_fails_calls_at_once():
+    node = ConcurrentToolNode([slow_echo], deadline_key="deadline")
+    state = {**_calls(("slow_echo", {"text": "a"})), "deadline": time.time() - 1}
+    start = time.monotonic()
+    (_, status, content), = _contents(node.invoke(state))
+    assert time.monotonic() - start < 0.1
+    assert status == "error" and "no time left" in content
+
+
+def test_a_tool_with_stuck_calls_fails_fast_until_they_return(monkeypatch):
+    monkeypatch.setenv("TOOL_MAX_STUCK", "1")
+    release = threading.Event()
+
+    @tool
+    def hang() -> str:
+        """Block until released."""
+        release.wait(5)
+        return "done"
+
+    node = ConcurrentToolNode([hang], timeouts={"hang": 0.05})
+    try:
+        assert _contents(node.invoke(_calls(("hang", {}))))[0][1] == "error"
+        assert tool_pool_stats()["stuck"]["hang"] == 1
+        (_, status, content), = _contents(node.invoke(_calls(("hang", {}))))
+        assert status == "error" and "still busy" in content
+    finally:
+        release.set()
+    deadline = time.monotonic() + 2
+    while "hang" in tool_pool_stats()["stuck"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert "hang" not in tool_pool_stats()["stuck"]
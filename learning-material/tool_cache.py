@@ -0,0 +1,204 @@
+"""
+Result caching for deterministic tools.
+
+Mark a tool as cacheable where it is defined, then pass the tools list through
+`cached_tools()` before it goes to `llm.bind_tools` and the tool node:
+
+    @cacheable(ttl_seconds=3600)
+    @tool
+    def calculator(...): ...
+
+    tools = cached_tools([search_tool, calculator, ...])
+
+Tools defined elsewhere (e.g. loaded from an MCP server) get a policy with
+`register_policy(name, ToolCachePolicy(...))`. Only mark tools whose result
+depends on their arguments alone; anything that writes (MCP expense tools) or
+reads live data must stay uncached. Live tools with their own caches
+(market_data, web_search) are not routed through here.
+
+Each policy sets a TTL, an LRU size bound, an optional key function (default:
+the call arguments as canonical JSON) and an optional `cache_if` predicate for
+results that must not stick (e.g. "no document uploaded yet"). Concurrent calls
+with the same key share one execution. `tool_cache_stats()` reports hits,
+misses, coalesced calls and the time saved per tool.
+"""
+from __future__ import annotations
+
+import functools
+import json
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from langchain_core.tools import BaseTool, StructuredTool
+
+from caching import MISSING, AsyncSingleFlight, SingleFlight, TTLCache
+
+# Arguments StructuredTool may inject that are not part of the call itself
+_NON_KEY_ARGS = {"config", "callbacks", "run_manager"}
+
+
+@dataclass
+class ToolCachePolicy:
+    ttl_seconds: float = 300.0
+    max_entries: int = 256
+    key: Optional[Callable[[Dict[str, Any]], Any]] = None
+    cache_if: Optional[Callable[[Any], bool]] = None
+
+
+def _default_key(kwargs: Dict[str, Any]) -> str:
+    return json.dumps(
+        {k: v for k, v in kwargs.items() if k not in _NON_KEY_ARGS},
+        sort_keys=True,
+        default=str,
+    )
+
+
+class ToolCache:
+    """Cache, single-flight and counters for one tool."""
+
+    def __init__(self, name: str, policy: ToolCachePolicy):
+        self.name = name
+        self.policy = policy
+        self._cache = TTLCache(max_entries=policy.max_entries, ttl_seconds=policy.ttl_seconds)
+        self._inflight = SingleFlight()
+        self._ainflight = AsyncSingleFlight()
+        self._lock = threading.Lock()
+        self._calls = 0
+        self._call_seconds = 0.0
+
+    def key(self, kwargs: Dict[str, Any]) -> Any:
+        return (self.policy.key or _default_key)(kwargs)
+
+    def _store(self, key: Any, result: Any, elapsed: float) -> None:
+        with self._lock:
+            self._calls += 1
+            self._call_seconds += elapsed
+        if self.policy.cache_if is None or self.policy.cache_if(result):
+            self._cache.set(key, result)
+
+    def wrap(self, func: Callable[..., Any]) -> Callable[..., Any]:
+        # wraps() keeps the signature/annotations StructuredTool inspects to inject config
+        @functools.wraps(func)
+        def cached_func(*args: Any, **kwargs: Any) -> Any:
+            key = self.key(kwargs)
+            result = self._cache.get(key)
+            if result is not MISSING:
+                return result
+
+            def call() -> Any:
+                start = time.perf_counter()
+                value = func(*args, **kwargs)
+                self._store(key, value, time.perf_counter() - start)
+                return value
+
+            return self._inflight.do(key, call)
+
+        return cached_func
+
+    def awrap(self, coroutine: Callable[..., Any]) -> Callable[..., Any]:
+        @functools.wraps(coroutine)
+        async def cached_coroutine(*args: Any, **kwargs: Any) -> Any:
+            key = self.key(kwargs)
+            result = self._cache.get(key)
+            if result is not MISSING:
+                return result
+
+            async def call() -> Any:
+                start = time.perf_counter()
+                value = await coroutine(*args, **kwargs)
+                self._store(key, value, time.perf_counter() - start)
+                return value
+
+            return await self._ainflight.do(key, call)
+
+        return cached_coroutine
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        cache = self._cache.stats()
+        with self._lock:
+            avg = self._call_seconds / self._calls if self._calls else 0.0
+            coalesced = self._inflight.coalesced + self._ainflight.coalesced
+            return {
+                **cache,
+                "coalesced": coalesced,
+                "executions": self._calls,
+                "avg_call_seconds": avg,
+                # Every hit or coalesced call skipped one execution of average length
+                "seconds_saved": (cache["hits"] + coalesced) * avg,
+            }
+
+
+# -------------------
+# Registry
+# -------------------
+_policies: Dict[str, ToolCachePolicy] = {}
+_caches: Dict[str, ToolCache] = {}
+_registry_lock = threading.Lock()
+
+
+def register_policy(name: str, policy: ToolCachePolicy) -> None:
+    with _registry_lock:
+        _policies[name] = policy
+
+
+def cacheable(
+    ttl_seconds: float = 300.0,
+    max_entries: int = 256,
+    key: Optional[Callable[[Dict[str, Any]], Any]] = None,
+    cache_if: Optional[Callable[[Any], bool]] = None,
+):
+    """Decorator for a `@tool`: registers a cache policy under the tool's name."""
+
+    def decorate(tool: BaseTool) -> BaseTool:
+        register_policy(tool.name, ToolCachePolicy(ttl_seconds, max_entries, key, cache_if))
+        return tool
+
+    return decorate
+
+
+def _cache_for(name: str) -> Optional[ToolCache]:
+    with _registry_lock:
+        policy = _policies.get(name)
+        if policy is None:
+            return None
+        if name not in _caches:
+            _caches[name] = ToolCache(name, policy)
+        return _caches[name]
+
+
+def cached_tools(tools: Sequence[BaseTool]) -> List[BaseTool]:
+    """Return the tools with a registered policy wrapped in their cache; others unchanged."""
+    result = []
+    for tool in tools:
+        cache = _cache_for(tool.name)
+        if cache is None:
+            result.append(tool)
+        elif isinstance(tool, StructuredTool):
+            update = {}
+            if tool.func is not None:
+                update["func"] = cache.wrap(tool.func)
+            if tool.coroutine is not None:
+                update["coroutine"] = cache.awrap(tool.coroutine)
+            result.append(tool.model_copy(update=update))
+        else:
+            print(f"⚠️ Tool cache supports function tools only; {tool.name} runs uncached")
+            result.append(tool)
+    return result
+
+
+def clear_tool_cache(name: str) -> None:
+    """Drop cached results of one tool, e.g. after the data it reads changed."""
+    cache = _cache_for(name)
+    if cache is not None:
+        cache.clear()
+
+
+def tool_cache_stats() -> Dict[str, Dict[str, Any]]:
+    with _registry_lock:
+        caches = list(_caches.values())
+    return {cache.name: cache.stats() for cache in caches}
@@ -0,0 +1,286 @@
+"""
+Tool execution stage with per-tool timeouts.
+
+`ConcurrentToolNode` is a drop-in replacement for `ToolNode`: when the model
+asks for several tools in one message, the calls run concurrently (on a shared,
+bounded thread pool for sync graphs, as asyncio tasks for async graphs). Each
+call gets a deadline, and a call that misses it comes back as an error
+ToolMessage so the model can answer with what it has instead of the whole turn
+stalling on one slow API.
+
+Timeout per tool, first match wins:
+    1. the `timeouts` mapping passed to the node
+    2. `tool.metadata["timeout"]`
+    3. TOOL_TIMEOUT_SECONDS
+
+With `deadline_key`, the node also honours a whole-turn deadline stored in
+the graph state (epoch seconds): each call gets at most the time left in the
+turn, and once it is spent calls fail immediately. Inside a tool,
+`remaining_time()` returns the seconds left for the current call so it can
+pass the deadline on to the service it calls.
+
+A timed-out sync tool cannot be interrupted; its thread keeps the pool slot
+until the underlying call returns, so tools should still set their own network
+timeouts. Calls still queued when their deadline passes are cancelled. To keep
+one hanging tool from slowly taking the whole pool, a tool with
+TOOL_MAX_STUCK timed-out calls still running gets no new slot: further calls
+to it fail at once until one of them returns. `tool_pool_stats()` reports the
+stuck calls per tool. (In async graphs a sync tool runs in the loop's default
+executor, which the same caveat applies to.)
+
+The node overrides ToolNode internals (`_func`, `_afunc`, `_run_one`,
+`_arun_one`, `_parse_input`, `_combine_tool_outputs`). requirements.txt pins
+langgraph-prebuilt 0.6.1; later 0.6 releases pass the store to `_parse_input`,
+which then injects tool arguments itself, and both forms are handled.
+Importing this module fails loudly if any of them is gone, and
+tests/test_tool_executor.py runs the node against whichever version is
+installed.
+
+Environment Variables:
+    TOOL_TIMEOUT_SECONDS: default per-tool timeout (default 20)
+    TOOL_MAX_WORKERS: size of the shared tool thread pool (default 8)
+    TOOL_MAX_STUCK: timed-out calls of one tool that may keep running before
+        new calls to it fail fast (default 2)
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import inspect
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Dict, Optional, Sequence
+
+from dotenv import load_dotenv
+from langchain_core.messages import ToolCall, ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import get_config_list
+from langgraph.prebuilt import ToolNode
+from langgraph.store.base import BaseStore
+
+from loop_monitor import track_inflight
+
+load_dotenv()
+
+_TOOL_NODE_INTERNALS = (
+    "_func", "_afunc", "_run_one", "_arun_one", "_parse_input", "_combine_tool_outputs", "inject_tool_args",
+)
+_missing = [name for name in _TOOL_NODE_INTERNALS if not hasattr(ToolNode, name)]
+if _missing:
+    raise ImportError(
+        f"ConcurrentToolNode needs ToolNode.{', '.join(_missing)}; "
+        "install the langgraph-prebuilt version pinned in requirements.txt"
+    )
+# 0.6.1: _parse_input(input), tool args injected by the caller; later: _parse_input(input, store)
+_PARSE_TAKES_STORE = "store" in inspect.signature(ToolNode._parse_input).parameters
+
+# time.monotonic() deadline of the tool call running in this context
+_call_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("tool_call_deadline", default=None)
+
+
+def remaining_time() -> Optional[float]:
+    """Seconds left for the current tool call, or None outside a ConcurrentToolNode call."""
+    deadline = _call_deadline.get()
+    return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+
+# Shared by every node and turn so concurrent users cannot multiply threads
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_tool_pool() -> ThreadPoolExecutor:
+    global _pool
+
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=int(os.getenv("TOOL_MAX_WORKERS", "8")),
+                thread_name_prefix="tool",
+            )
+        return _pool
+
+
+# Timed-out sync calls still holding a pool thread, per tool
+_stuck: Dict[str, int] = {}
+_stuck_lock = threading.Lock()
+
+
+def _max_stuck() -> int:
+    return int(os.getenv("TOOL_MAX_STUCK", "2"))
+
+
+def _is_stuck(name: str) -> bool:
+    with _stuck_lock:
+        return _stuck.get(name, 0) >= _max_stuck()
+
+
+def _abandon(name: str, future: Future) -> None:
+    """Count a timed-out call until its thread is free again."""
+    with _stuck_lock:
+        _stuck[name] = _stuck.get(name, 0) + 1
+
+    def release(_: Future) -> None:
+        with _stuck_lock:
+            _stuck[name] -= 1
+            if not _stuck[name]:
+                del _stuck[name]
+
+    future.add_done_callback(release)
+
+
+def tool_pool_stats() -> Dict[str, Any]:
+    """Timed-out calls still holding a pool thread, per tool."""
+    with _stuck_lock:
+        return {"stuck": dict(_stuck)}
+
+
+def _timeout_message(call: ToolCall, timeout: float) -> ToolMessage:
+    return ToolMessage(
+        content=f"Error: {call['name']} did not respond within {timeout:.3g}s. "
+                "Answer without this result or try again later.",
+        name=call["name"],
+        tool_call_id=call["id"],
+        status="error",
+    )
+
+
+def _stuck_message(call: ToolCall) -> ToolMessage:
+    return ToolMessage(
+        content=f"Error: {call['name']} is still busy with earlier calls that timed out. "
+                "Answer without this result or try again later.",
+        name=call["name"],
+        tool_call_id=call["id"],
+        status="error",
+    )
+
+
+def _out_of_time_message(call: ToolCall) -> ToolMessage:
+    return ToolMessage(
+        content=f"Error: no time left in this turn to run {call['name']}. "
+                "Answer with what you have.",
+        name=call["name"],
+        tool_call_id=call["id"],
+        status="error",
+    )
+
+
+class ConcurrentToolNode(ToolNode):
+    """ToolNode that runs tool calls concurrently, each under its own timeout."""
+
+    def __init__(
+        self,
+        tools: Sequence[Any],
+        *,
+        timeouts: Optional[Dict[str, float]] = None,
+        default_timeout: Optional[float] = None,
+        deadline_key: Optional[str] = None,
+        **kwargs: Any,
+    ):
+        super().__init__(tools, **kwargs)
+        self.timeouts = dict(timeouts or {})
+        self.deadline_key = deadline_key
+        self.default_timeout = (
+            default_timeout
+            if default_timeout is not None
+            else float(os.getenv("TOOL_TIMEOUT_SECONDS", "20"))
+        )
+
+    def set_tools(self, tools: Sequence[Any]) -> None:
+        """Swap the tool set in place, e.g. after MCP servers changed their tools.
+
+        The node stays the same object, so a compiled graph picks the new
+        tools up on its next step.
+        """
+        template = ToolNode(tools)
+        # Replace whole dicts so in-flight steps keep a consistent view
+        self.tool_to_state_args = template.tool_to_state_args
+        self.tool_to_store_arg = template.tool_to_store_arg
+        self.tools_by_name = template.tools_by_name
+
+    def timeout_for(self, name: str) -> float:
+        if name in self.timeouts:
+            return self.timeouts[name]
+        tool = self.tools_by_name.get(name)
+        metadata = getattr(tool, "metadata", None) or {}
+        return float(metadata.get("timeout", self.default_timeout))
+
+    def _turn_remaining(self, input: Any) -> Optional[float]:
+        if self.deadline_key is None or not isinstance(input, dict):
+            return None
+        deadline = input.get(self.deadline_key)
+        return None if deadline is None else deadline - time.time()
+
+    def _tool_calls(self, input: Any, store: Optional[BaseStore]):
+        if _PARSE_TAKES_STORE:
+            return self._parse_input(input, store)
+        tool_calls, input_type = self._parse_input(input)
+        return [self.inject_tool_args(call, input, store) for call in tool_calls], input_type
+
+    def _run_before(self, deadline: float, call: ToolCall, input_type, config: RunnableConfig):
+        _call_deadline.set(deadline)
+        return self._run_one(call, input_type, config)
+
+    # -------------------
+    # Sync graphs
+    # -------------------
+    def _func(self, input, config: RunnableConfig, *, store: Optional[BaseStore]) -> Any:
+        turn_remaining = self._turn_remaining(input)
+        tool_calls, input_type = self._tool_calls(input, store)
+        config_list = get_config_list(config, len(tool_calls))
+        pool = get_tool_pool()
+
+        start = time.monotonic()
+        timeouts = [self.timeout_for(call["name"]) for call in tool_calls]
+        if turn_remaining is not None:
+            timeouts = [min(timeout, turn_remaining) for timeout in timeouts]
+        futures: list[Optional[Future]] = [
+            # copy_context keeps callbacks/tracing attached to this run
+            pool.submit(contextvars.copy_context().run, self._run_before, start + timeout, call, input_type, call_config)
+            if timeout > 0 and not _is_stuck(call["name"]) else None
+            for call, call_config, timeout in zip(tool_calls, config_list, timeouts)
+        ]
+
+        outputs = []
+        for call, future, timeout in zip(tool_calls, futures, timeouts):
+            if future is None:
+                outputs.append(_out_of_time_message(call) if timeout <= 0 else _stuck_message(call))
+                continue
+            remaining = max(0.0, start + timeout - time.monotonic())
+            try:
+                outputs.append(future.result(timeout=remaining))
+            except FutureTimeoutError:
+                if not future.cancel():
+                    # Already running: the thread stays busy until the tool returns
+                    _abandon(call["name"], future)
+                outputs.append(_timeout_message(call, timeout))
+
+        return self._combine_tool_outputs(outputs, input_type)
+
+    # -------------------
+    # Async graphs
+    # -------------------
+    async def _arun_with_timeout(self, call: ToolCall, input_type, config: RunnableConfig, turn_remaining: Optional[float] = None):
+        timeout = self.timeout_for(call["name"])
+        if turn_remaining is not None:
+            if turn_remaining <= 0:
+                return _out_of_time_message(call)
+            timeout = min(timeout, turn_remaining)
+        # Set before wait_for so the tool's task inherits it
+        _call_deadline.set(time.monotonic() + timeout)
+        try:
+            with track_inflight("tool"):
+                return await asyncio.wait_for(self._arun_one(call, input_type, config), timeout)
+        except asyncio.TimeoutError:
+            return _timeout_message(call, timeout)
+
+    async def _afunc(self, input, config: RunnableConfig, *, store: Optional[BaseStore]) -> Any:
+        turn_remaining = self._turn_remaining(input)
+        tool_calls, input_type = self._tool_calls(input, store)
+        outputs = await asyncio.gather(
+            *(self._arun_with_timeout(call, input_type, config, turn_remaining) for call in tool_calls)
+        )
+        return self._combine_tool_outputs(list(outputs), input_type)
@@ -0,0 +1,188 @@
+"""
+Cached, deduplicated web search tool for the tool, RAG and MCP backends.
+
+`DuckDuckGoSearchRun` is called live on every search, so the same question
+asked by several users pays the full network round trip each time and a burst
+of searches gets us throttled. `get_search_tool()` returns a drop-in tool
+(same name "duckduckgo_search", same input) that:
+    - normalizes the query (case, whitespace) and serves repeats from a TTL
+      cache in memory, optionally backed by a SQLite file shared across restarts
+    - lets concurrent identical queries share one search (single-flight)
+    - caps the number of searches in flight at once
+
+Environment Variables:
+    SEARCH_REGION: DuckDuckGo region (default us-en)
+    SEARCH_CACHE_TTL: seconds a result is reused (default 900)
+    SEARCH_CACHE_MAX_ENTRIES: in-memory entries (default 512)
+    SEARCH_CACHE_PATH: optional SQLite file for a persistent second tier
+    SEARCH_MAX_CONCURRENCY: searches allowed in flight (default 2)
+"""
+from __future__ import annotations
+
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from dotenv import load_dotenv
+from langchain_core.tools import BaseTool, StructuredTool
+from pydantic import BaseModel, Field
+
+from caching import MISSING, SingleFlight, TTLCache
+
+load_dotenv()
+
+SEARCH_TOOL_NAME = "duckduckgo_search"
+SEARCH_TOOL_DESCRIPTION = (
+    "A wrapper around DuckDuckGo Search. "
+    "Useful for when you need to answer questions about current events. "
+    "Input should be a search query."
+)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+class SearchInput(BaseModel):
+    query: str = Field(description="search query to look up")
+
+
+def normalize_query(query: str) -> str:
+    return _WHITESPACE.sub(" ", query).strip().lower()
+
+
+class SearchCache:
+    """Two-tier TTL cache with single-flight and a concurrency cap around a search function."""
+
+    def __init__(
+        self,
+        search: Callable[[str], str],
+        ttl_seconds: float = 900.0,
+        max_entries: int = 512,
+        db_path: Optional[str] = None,
+        max_concurrency: int = 2,
+    ):
+        self.search = search
+        self.ttl_seconds = ttl_seconds
+        self._memory = TTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self._inflight = SingleFlight()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._disk_hits = 0
+        self._searches = 0
+        self._search_seconds = 0.0
+
+        self._conn: Optional[sqlite3.Connection] = None
+        if db_path:
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS search_cache ("
+                "key TEXT PRIMARY KEY, result TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+
+    # -------------------
+    # Persistent tier
+    # -------------------
+    def _disk_get(self, key: str) -> Any:
+        if self._conn is None:
+            return MISSING
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result, created_at FROM search_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or time.time() - row[1] > self.ttl_seconds:
+                return MISSING
+            self._disk_hits += 1
+        return row[0]
+
+    def _disk_set(self, key: str, result: str) -> None:
+        if self._conn is None:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO search_cache (key, result, created_at) VALUES (?, ?, ?)",
+                (key, result, time.time()),
+            )
+            self._conn.execute("DELETE FROM search_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+            self._conn.commit()
+
+    # -------------------
+    # Lookup
+    # -------------------
+    def _search_live(self, key: str, query: str) -> str:
+        # Another caller may have filled the disk tier while we queued
+        result = self._disk_get(key)
+        if result is MISSING:
+            with self._slots:
+                start = time.perf_counter()
+                result = self.search(query)
+                elapsed = time.perf_counter() - start
+            with self._lock:
+                self._searches += 1
+                self._search_seconds += elapsed
+            self._disk_set(key, result)
+        self._memory.set(key, result)
+        return result
+
+    def run(self, query: str) -> str:
+        key = normalize_query(query)
+        result = self._memory.get(key)
+        if result is not MISSING:
+            return result
+        return self._inflight.do(key, lambda: self._search_live(key, query))
+
+    def stats(self) -> Dict[str, Any]:
+        memory = self._memory.stats()
+        lookups = memory["hits"] + memory["misses"]
+        served_locally = lookups - self._searches
+        return {
+            "lookups": lookups,
+            "memory_hits": memory["hits"],
+            "disk_hits": self._disk_hits,
+            "coalesced": self._inflight.coalesced,
+            "searches": self._searches,
+            "hit_ratio": served_locally / lookups if lookups else 0.0,
+            "avg_search_seconds": self._search_seconds / self._searches if self._searches else 0.0,
+        }
+
+
+# -------------------
+# Shared tool
+# -------------------
+_search_cache: Optional[SearchCache] = None
+_search_lock = threading.Lock()
+
+
+def get_search_cache() -> SearchCache:
+    global _search_cache
+
+    with _search_lock:
+        if _search_cache is None:
+            from langchain_community.tools import DuckDuckGoSearchRun
+
+            runner = DuckDuckGoSearchRun(region=os.getenv("SEARCH_REGION", "us-en"))
+            _search_cache = SearchCache(
+                search=runner.run,
+                ttl_seconds=float(os.getenv("SEARCH_CACHE_TTL", "900")),
+                max_entries=int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "512")),
+                db_path=os.getenv("SEARCH_CACHE_PATH") or None,
+                max_concurrency=int(os.getenv("SEARCH_MAX_CONCURRENCY", "2")),
+            )
+        return _search_cache
+
+
+def _search(query: str) -> str:
+    return get_search_cache().run(query)
+
+
+def get_search_tool() -> BaseTool:
+    """Drop-in replacement for `DuckDuckGoSearchRun(region="us-en")`."""
+    return StructuredTool.from_function(
+        func=_search,
+        name=SEARCH_TOOL_NAME,
+        description=SEARCH_TOOL_DESCRIPTION,
+        args_schema=SearchInput,
+    )
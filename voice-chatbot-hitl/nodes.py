@@ -1,4 +1,5 @@
 import os
+import sys
 import uuid
 from typing import List
 from dotenv import load_dotenv
@@ -7,17 +8,22 @@ from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
 from langchain_core.runnables import RunnableConfig
 from langgraph.store.base import BaseStore
+from langgraph.types import interrupt
 from state import ChatState
 from voice_integration import voice_integration
 
+# Hedged model calls are shared with learning-material rather than copied
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "learning-material"))
+from hedging import hedge
+
 load_dotenv()
 
 # Initialize LLMs
-llm = ChatGoogleGenerativeAI(
+llm = hedge(ChatGoogleGenerativeAI(
     model="gemini-2.5-flash",
     temperature=0.7,
     api_key=os.getenv("GOOGLE_API_KEY")
-)
+))
 
 # Memory extraction LLM (lower temperature for consistent extraction)
 memory_llm = ChatGoogleGenerativeAI(
@@ -210,12 +216,32 @@ def chat_node(state: ChatState, config: RunnableConfig = None, *, store: BaseSto
             "messages": [error_response]
         }
 
+def _review_result(pending_response: str, approved: bool, changes: str = ""):
+    """State update for a reviewed response."""
+    if approved:
+        return {
+            "human_approval": True,
+            "approved_responses": [pending_response]
+        }
+    if changes:
+        # Create improved prompt for regeneration
+        improved_prompt = f"Previous answer: {pending_response}\n\nUser feedback: {changes}\n\nPlease improve the answer based on this feedback."
+        
+        return {
+            "human_approval": False,
+            "rejected_responses": [pending_response],
+            "human_feedback": changes,
+            "improvement_request": improved_prompt
+        }
+    # Just regenerate without specific feedback
+    return {
+        "human_approval": False,
+        "rejected_responses": [pending_response],
+        "human_feedback": "User not satisfied, regenerating response"
+    }
+
 def human_review_node(state: ChatState):
     """Simplified Human-in-the-Loop review of AI response."""
-    print("\n" + "="*50)
-    print("👤 HUMAN REVIEW")
-    print("="*50)
-    
     pending_response = state.get("pending_response")
     if not pending_response:
         return {
@@ -223,6 +249,20 @@ def human_review_node(state: ChatState):
             "human_feedback": "No response to review"
         }
     
+    if os.getenv("HUMAN_REVIEW_MODE", "console").strip().lower() == "interrupt":
+        # Headless (e.g. the API server): pause the graph until it is resumed with
+        # Command(resume={"approved": bool, "feedback": str})
+        decision = interrupt({"pending_response": pending_response})
+        return _review_result(
+            pending_response,
+            approved=bool(decision.get("approved")),
+            changes=str(decision.get("feedback") or "").strip(),
+        )
+    
+    print("\n" + "="*50)
+    print("👤 HUMAN REVIEW")
+    print("="*50)
+    
     print(f"\n🤖 AI Response:")
     print(f"{pending_response}")
     print("-" * 50)
@@ -245,31 +285,11 @@ def human_review_node(state: ChatState):
         happy = input("\n😊 Are you happy with this result? (y/n): ").lower().strip()
         
         if happy == 'y':
-            return {
-                "human_approval": True,
-                "approved_responses": [pending_response]
-            }
+            return _review_result(pending_response, approved=True)
         elif happy == 'n':
             # Ask what to change/add
             changes = input("💭 What would you like to change or add to the answer? ").strip()
-            
-            if changes:
-                # Create improved prompt for regeneration
-                improved_prompt = f"Previous answer: {pending_response}\n\nUser feedback: {changes}\n\nPlease improve the answer based on this feedback."
-                
-                return {
-                    "human_approval": False,
-                    "rejected_responses": [pending_response],
-                    "human_feedback": changes,
-                    "improvement_request": improved_prompt
-                }
-            else:
-                # Just regenerate without specific feedback
-                return {
-                    "human_approval": False,
-                    "rejected_responses": [pending_response],
-                    "human_feedback": "User not satisfied, regenerating response"
-                }
+            return _review_result(pending_response, approved=False, changes=changes)
         else:
             print("Please enter 'y' for yes or 'n' for no")
 